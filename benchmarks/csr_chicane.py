@@ -0,0 +1,72 @@
+"""
+Benchmark of the CSR calculation in a four-dipole chicane.
+
+The time needed to track a bunch through the chicane with CSR is measured
+for a different number of histogram bins, both with an empty kernel cache
+and when tracking again through the same chicane (where all CSR kernels
+are taken from the cache). The CSR kernels along the trajectory are
+computed in parallel, so that the tracking time decreases with the number
+of threads. Run as
+
+    WAKET_NUM_THREADS=8 python csr_chicane.py
+
+"""
+
+import time
+
+import numpy as np
+
+from wake_t import Beamline, Drift, Dipole
+from wake_t.physics_models.collective_effects.csr import (
+    get_csr_calculator, reset_csr_calculator, set_csr_settings)
+from wake_t.utilities.bunch_generation import get_gaussian_bunch_from_twiss
+from wake_t.utilities.numba import num_threads, set_num_threads
+
+
+# Chicane parameters.
+theta = 0.05
+l_dipole = 0.5
+l_drift = 0.2
+
+# CSR parameters.
+csr_step = 0.05
+n_part = 20000
+
+
+def track_chicane(bunch, **csr_settings):
+    """Track a bunch through the chicane and return the tracking time."""
+    chicane = Beamline([
+        Dipole(l_dipole, theta, csr_on=True),
+        Drift(l_drift, csr_on=True),
+        Dipole(l_dipole, -theta, csr_on=True),
+        Drift(l_drift, csr_on=True),
+        Dipole(l_dipole, -theta, csr_on=True),
+        Drift(l_drift, csr_on=True),
+        Dipole(l_dipole, theta, csr_on=True),
+    ])
+    reset_csr_calculator()
+    set_csr_settings(csr_step=csr_step, **csr_settings)
+    t_start = time.perf_counter()
+    chicane.track(bunch, show_progress_bar=False)
+    return time.perf_counter() - t_start
+
+
+set_num_threads(num_threads)
+np.random.seed(0)
+bunch = get_gaussian_bunch_from_twiss(
+    en_x=1e-6, en_y=1e-6, a_x=0, a_y=0, b_x=10, b_y=10, ene=1000,
+    ene_sp=0.1, s_t=30, xi_c=0, q_tot=300, n_part=n_part)
+csr_calculator = get_csr_calculator()
+
+# Compile all methods.
+track_chicane(bunch.copy(), n_bins=100, kernel_cache_size=10)
+
+print(f'Particles: {n_part}, threads: {num_threads}')
+print(f'{"n_bins":>6} {"no cache [s]":>13} {"cached [s]":>11}')
+for n_bins in [500, 1000, 2000]:
+    csr_calculator.clear_kernel_cache()
+    t_no_cache = track_chicane(
+        bunch.copy(), n_bins=n_bins, kernel_cache_size=100000)
+    t_cached = track_chicane(
+        bunch.copy(), n_bins=n_bins, kernel_cache_size=100000)
+    print(f'{n_bins:>6} {t_no_cache:>13.2f} {t_cached:>11.2f}')
@@ -0,0 +1,71 @@
+"""
+Benchmark of the parallel (pipelined) laser envelope solver against the
+serial one.
+
+The time per call is measured for a different number of substeps `nt`. The
+parallel solver computes all substeps simultaneously, so that its speed-up
+grows with `nt` up to the number of available threads. Run as
+
+    WAKET_NUM_THREADS=8 python laser_envelope_solver.py
+
+"""
+
+import time
+
+import numpy as np
+import scipy.constants as ct
+
+from wake_t import GaussianPulse
+from wake_t.utilities.numba import num_threads, set_num_threads
+from wake_t.physics_models.laser.envelope_solver import evolve_envelope
+from wake_t.physics_models.laser.envelope_solver_pipelined import (
+    evolve_envelope_pipelined)
+
+
+# Grid and plasma parameters.
+xi_min = -100e-6
+xi_max = 20e-6
+r_max = 150e-6
+n_xi = 600
+n_r = 200
+n_p = 1e23
+dz = 20e-6
+
+# Number of calls per measurement.
+n_calls = 5
+
+
+def get_time_per_call(solver, a, a_old, chi, k_0, k_p, **params):
+    """Get the time per call of an envelope solver (after compilation)."""
+    solver(a.copy(), a_old.copy(), chi, k_0, k_p, **params)
+    t_start = time.perf_counter()
+    for i in range(n_calls):
+        solver(a, a_old, chi, k_0, k_p, **params)
+    return (time.perf_counter() - t_start) / n_calls
+
+
+set_num_threads(num_threads)
+np.random.seed(0)
+laser = GaussianPulse(0., l_0=800e-9, w_0=30e-6, a_0=2, tau=25e-15,
+                      z_foc=0.)
+laser.set_envelope_solver_params(
+    xi_min, xi_max, r_max, n_xi, n_r, dz / ct.c)
+laser.initialize_envelope()
+chi = 0.05 * np.random.rand(n_xi, n_r)
+k_0 = 2 * np.pi / laser.l_0
+k_p = np.sqrt(ct.e**2 * n_p / (ct.m_e*ct.epsilon_0)) / ct.c
+
+print(f'Grid: {n_xi} x {n_r}, threads: {num_threads}')
+print(f'{"nt":>4} {"serial [ms]":>12} {"parallel [ms]":>14} {"speed-up":>9}')
+for nt in [1, 2, 4, 8, 16]:
+    params = dict(laser.solver_params)
+    params['nt'] = nt
+    params['dt'] = dz / ct.c / nt
+    t_serial = get_time_per_call(
+        evolve_envelope, laser._a_env, laser._a_env_old, chi, k_0, k_p,
+        **params)
+    t_parallel = get_time_per_call(
+        evolve_envelope_pipelined, laser._a_env, laser._a_env_old, chi, k_0,
+        k_p, **params)
+    print(f'{nt:>4} {t_serial*1e3:>12.2f} {t_parallel*1e3:>14.2f} '
+          f'{t_serial/t_parallel:>9.2f}')
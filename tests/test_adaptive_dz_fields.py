@@ -0,0 +1,75 @@
+import copy
+
+import numpy as np
+import scipy.constants as ct
+
+from wake_t import PlasmaStage, GaussianPulse
+from wake_t.utilities.bunch_generation import get_matched_bunch
+
+
+def test_adaptive_dz_fields_laser():
+    """
+    Test that an adaptive update interval evolves a laser pulse with the
+    same accuracy as a fine fixed interval, but with fewer updates.
+    """
+    stage_params = dict(
+        length=5e-3, density=1e23, wakefield_model='quasistatic_2d',
+        xi_max=30e-6, xi_min=-50e-6, r_max=100e-6, n_r=100, n_xi=160,
+        n_out=2
+    )
+    a_max = []
+    stages = []
+    for dz_fields in [20e-6, 'auto']:
+        laser = GaussianPulse(
+            xi_c=0., l_0=800e-9, w_0=30e-6, a_0=2, tau=25e-15, z_foc=0.)
+        stage = PlasmaStage(laser=laser, dz_fields=dz_fields, **stage_params)
+        stage.track(show_progress_bar=False)
+        a_max.append(np.max(np.abs(laser.get_envelope())))
+        stages.append(stage)
+
+    # Check history of the update intervals.
+    wakefield = stages[1].wakefield
+    dz_history = np.array(wakefield.dt_update_history) * ct.c
+    box_length = stage_params['xi_max'] - stage_params['xi_min']
+    assert np.all(dz_history >= 0.1 * box_length * (1 - 1e-12))
+    assert np.all(dz_history <= 10 * box_length * (1 + 1e-12))
+    assert len(dz_history) < 0.3 * stage_params['length'] / 20e-6
+
+    # Check that the last update took place at the end of the stage.
+    np.testing.assert_allclose(
+        wakefield.t * ct.c, stage_params['length'], rtol=1e-12)
+
+    # Check accuracy.
+    np.testing.assert_allclose(a_max[1], a_max[0], rtol=1e-2)
+
+
+def test_adaptive_dz_fields_ramp():
+    """
+    Test that the update interval becomes shorter when the plasma density
+    starts to change.
+    """
+    np.random.seed(1)
+    n_p = 1e23
+
+    def density(z):
+        return n_p * np.where(z < 5e-3, 1, 1 + 60 * (z - 5e-3))
+
+    driver = get_matched_bunch(
+        en_x=10e-6, en_y=10e-6, ene=2000, ene_sp=1, s_t=10, xi_c=0,
+        q_tot=500, n_part=1e4, n_p=n_p)
+    stage = PlasmaStage(
+        length=1e-2, density=density, wakefield_model='quasistatic_2d',
+        xi_max=20e-6, xi_min=-120e-6, r_max=70e-6, n_xi=280, n_r=70,
+        dz_fields='auto')
+    stage.track(copy.deepcopy(driver), show_progress_bar=False)
+
+    dz_history = np.array(stage.wakefield.dt_update_history) * ct.c
+    z_updates = np.cumsum(dz_history) - dz_history
+    dz_flat = np.mean(dz_history[(z_updates > 1e-3) & (z_updates < 5e-3)])
+    dz_ramp = np.mean(dz_history[(z_updates > 6e-3) & (z_updates < 9e-3)])
+    assert dz_ramp < 0.5 * dz_flat
+
+
+if __name__ == '__main__':
+    test_adaptive_dz_fields_laser()
+    test_adaptive_dz_fields_ramp()
@@ -0,0 +1,83 @@
+import copy
+
+import numpy as np
+
+from wake_t import PlasmaRamp
+from wake_t.utilities.bunch_generation import get_gaussian_bunch_from_twiss
+from wake_t.particles import particle_bunch
+from wake_t.particles.push import adaptive_boris_pusher
+from wake_t.particles.push.boris_pusher import apply_boris_pusher
+
+
+def track_and_count_pushes(bunch, element):
+    """
+    Track a bunch through an element and return the number of Boris pushes
+    applied to it, including those of the steps estimated (and possibly
+    rejected) by the error-controlled pusher.
+    """
+    n_pushes = 0
+
+    def counting_boris_pusher(*args, **kwargs):
+        nonlocal n_pushes
+        n_pushes += 1
+        return apply_boris_pusher(*args, **kwargs)
+
+    modules = [particle_bunch, adaptive_boris_pusher]
+    for module in modules:
+        module.apply_boris_pusher = counting_boris_pusher
+    try:
+        element.track(bunch, show_progress_bar=False)
+    finally:
+        for module in modules:
+            module.apply_boris_pusher = apply_boris_pusher
+    return n_pushes
+
+
+def test_adaptive_time_step_ramp():
+    """
+    Test that the error-controlled Boris pusher tracks a bunch through a
+    plasma downramp with fewer Boris pushes than the default adaptive time
+    step, even when including the pushes needed to estimate the error, and
+    that the accuracy improves when reducing the tolerance.
+    """
+    np.random.seed(0)
+    bunch = get_gaussian_bunch_from_twiss(
+        en_x=1e-6, en_y=1e-6, a_x=0, a_y=0, b_x=1e-3, b_y=1e-3, ene=600,
+        ene_sp=2, s_t=3, xi_c=0e-6, q_tot=100, n_part=1e4)
+    ramp_params = dict(
+        length=1e-2, ramp_type='downramp', profile='inverse_square',
+        plasma_dens_top=1e23, plasma_dens_down=1e21,
+        wakefield_model='focusing_blowout', n_out=3
+    )
+
+    # Reference with a very small time step.
+    bunch_ref = copy.deepcopy(bunch)
+    PlasmaRamp(dt_bunch=1e-15, **ramp_params).track(
+        bunch_ref, show_progress_bar=False)
+
+    # Default adaptive time step.
+    bunch_auto = copy.deepcopy(bunch)
+    n_auto = track_and_count_pushes(
+        bunch_auto, PlasmaRamp(dt_bunch='auto', **ramp_params))
+
+    # Error-controlled time step with two different tolerances.
+    errors = []
+    n_pushes = []
+    for tolerance in [1e-3, 1e-4]:
+        bunch_adaptive = copy.deepcopy(bunch)
+        ramp = PlasmaRamp(
+            dt_bunch='auto', bunch_pusher='boris_adaptive',
+            pusher_tolerance=tolerance, **ramp_params)
+        n_pushes.append(track_and_count_pushes(bunch_adaptive, ramp))
+        errors.append(
+            np.max(np.abs(bunch_adaptive.x - bunch_ref.x)) /
+            np.std(bunch_ref.x))
+        np.testing.assert_allclose(
+            bunch_adaptive.prop_distance, bunch_ref.prop_distance)
+
+    assert n_pushes[0] < n_pushes[1] < n_auto
+    assert errors[1] < errors[0] < 5e-3
+
+
+if __name__ == '__main__':
+    test_adaptive_time_step_ramp()
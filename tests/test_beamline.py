@@ -1,8 +1,11 @@
 import os
 from copy import deepcopy
-from numpy.testing import assert_array_equal
-from wake_t import Beamline, Drift, PlasmaStage
-from wake_t.utilities.bunch_generation import get_gaussian_bunch_from_size
+import numpy as np
+from numpy.testing import assert_array_equal, assert_allclose
+from wake_t import (
+    Beamline, Drift, Dipole, Quadrupole, Sextupole, PlasmaStage)
+from wake_t.utilities.bunch_generation import (
+    get_gaussian_bunch_from_size, get_gaussian_bunch_from_twiss)
 
 
 tests_output_folder = './tests_output'
@@ -114,6 +117,111 @@ def test_multiple_element():
     assert n_files_1 == n_files_2
 
 
+def test_fused_tm_elements():
+    """
+    This test checks that tracking consecutive transfer-matrix elements with
+    a single (fused) transfer map agrees with tracking them one by one, and
+    that elements with outputs are not fused.
+
+    """
+    np.random.seed(0)
+    bunch = get_gaussian_bunch_from_twiss(
+        en_x=1e-6, en_y=1e-6, a_x=0, a_y=0, b_x=5, b_y=5, ene=1000,
+        ene_sp=0.5, s_t=10, xi_c=0, q_tot=100, n_part=10000)
+
+    def get_elements():
+        return [
+            Drift(0.5), Quadrupole(0.1, 10.), Drift(0.3),
+            Sextupole(0.1, 100.), Quadrupole(0.1, -10.), Dipole(0.5, 0.05),
+            Drift(0.5, n_out=2), Dipole(0.5, -0.02), Drift(0.2)
+        ]
+
+    bunch_1 = bunch.copy()
+    bunch_2 = bunch.copy()
+    bl_1 = Beamline(get_elements(), fuse_tm_elements=False)
+    bl_2 = Beamline(get_elements())
+    out_1 = bl_1.track(bunch_1, show_progress_bar=False)
+    out_2 = bl_2.track(bunch_2, show_progress_bar=False)
+
+    # The element with `n_out=2` is tracked separately.
+    assert len(out_1) == len(out_2) == 2
+
+    # The difference between both beams comes from the truncation of the
+    # fused map at second order.
+    for attr in ['x', 'y', 'xi', 'px', 'py', 'pz']:
+        assert_allclose(
+            getattr(bunch_2, attr), getattr(bunch_1, attr), rtol=0,
+            atol=1e-2*np.std(getattr(bunch_1, attr)))
+    assert_allclose(bunch_2.theta_ref, bunch_1.theta_ref, rtol=1e-12)
+    assert_allclose(bunch_2.x_ref, bunch_1.x_ref, rtol=1e-12)
+    assert_allclose(bunch_2.prop_distance, bunch_1.prop_distance, rtol=1e-12)
+
+    # Without sextupoles and energy spread, the maps are exact at first
+    # order.
+    bunch.pz[:] = np.mean(bunch.pz)
+    bunch_1 = bunch.copy()
+    bunch_2 = bunch.copy()
+    elements = [Drift(0.5), Quadrupole(0.1, 10.), Drift(0.3),
+                Quadrupole(0.1, -10.), Drift(0.5)]
+    Beamline(deepcopy(elements), fuse_tm_elements=False).track(
+        bunch_1, show_progress_bar=False)
+    Beamline(deepcopy(elements)).track(bunch_2, show_progress_bar=False)
+    for attr in ['x', 'y', 'px', 'py']:
+        assert_allclose(
+            getattr(bunch_2, attr), getattr(bunch_1, attr), rtol=0,
+            atol=1e-8*np.std(getattr(bunch_1, attr)))
+
+
+def test_multibunch_tm_elements():
+    """
+    This test checks that tracking several bunches together through
+    transfer-matrix elements gives the same result as tracking them
+    separately, both with fused and non-fused elements.
+
+    """
+    np.random.seed(0)
+    bunch_1 = get_gaussian_bunch_from_twiss(
+        en_x=1e-6, en_y=1e-6, a_x=0, a_y=0, b_x=5, b_y=5, ene=1000,
+        ene_sp=0.5, s_t=10, xi_c=0, q_tot=100, n_part=10000)
+    bunch_2 = get_gaussian_bunch_from_twiss(
+        en_x=2e-6, en_y=2e-6, a_x=1, a_y=1, b_x=2, b_y=2, ene=1010,
+        ene_sp=0.2, s_t=5, xi_c=-50e-6, q_tot=50, n_part=5000)
+    bunch_2.x_ref = 1e-3
+    bunch_2.theta_ref = 1e-2
+
+    def get_elements():
+        return [
+            Drift(0.5, gamma_ref=1000), Quadrupole(0.1, 10., gamma_ref=1000),
+            Dipole(0.5, 0.05, gamma_ref=1000, n_out=2),
+            Drift(0.2, gamma_ref=1000)
+        ]
+
+    for fuse in [True, False]:
+        bunches_1 = [bunch_1.copy(), bunch_2.copy()]
+        bunches_2 = [bunch_1.copy(), bunch_2.copy()]
+        out_1 = Beamline(get_elements(), fuse_tm_elements=fuse).track(
+            bunches_1, show_progress_bar=False)
+        out_2 = [
+            Beamline(get_elements(), fuse_tm_elements=fuse).track(
+                bunch, show_progress_bar=False)
+            for bunch in bunches_2
+        ]
+
+        # One list of outputs per bunch.
+        assert len(out_1) == 2
+        for i in range(2):
+            assert len(out_1[i]) == len(out_2[i]) == 2
+            for b_1, b_2 in zip(
+                    out_1[i] + [bunches_1[i]], out_2[i] + [bunches_2[i]]):
+                for attr in ['x', 'y', 'xi', 'px', 'py', 'pz']:
+                    assert_array_equal(getattr(b_1, attr), getattr(b_2, attr))
+                assert b_1.x_ref == b_2.x_ref
+                assert b_1.theta_ref == b_2.theta_ref
+                assert b_1.prop_distance == b_2.prop_distance
+
+
 if __name__ == '__main__':
     test_single_element()
     test_multiple_element()
+    test_fused_tm_elements()
+    test_multibunch_tm_elements()
@@ -0,0 +1,106 @@
+import os
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from wake_t import PlasmaStage
+from wake_t.utilities.bunch_generation import get_gaussian_bunch_from_size
+
+
+tests_output_folder = './tests_output'
+
+
+def test_memory_mapped_bunch():
+    """
+    Test that the data of a bunch can be stored in a memory-mapped file and
+    be iterated in chunks that are views of it.
+    """
+    memmap_dir = os.path.join(tests_output_folder, 'memmap_bunch')
+    os.makedirs(memmap_dir, exist_ok=True)
+    np.random.seed(0)
+    bunch = get_gaussian_bunch_from_size(
+        1e-6, 1e-6, 5e-6, 5e-6, 1000, 1, 10, 0, 100, 1e4)
+    bunch_mm = bunch.copy()
+    bunch_mm.make_contiguous(memmap_dir=memmap_dir)
+    bunch_mm.set_chunk_size(3000)
+    assert bunch_mm.is_contiguous
+    assert isinstance(bunch_mm.x.base.base, np.memmap)
+    assert_array_equal(bunch_mm.get_6D_matrix(), bunch.get_6D_matrix())
+
+    # The chunks cover the whole bunch and are views of its data.
+    chunks = list(bunch_mm.iter_chunks())
+    assert [len(chunk.x) for chunk in chunks] == [3000, 3000, 3000, 1000]
+    for chunk in chunks:
+        chunk.x[:] = 0.
+    assert np.all(bunch_mm.x == 0.)
+
+    # Copies are also stored in memory-mapped files, and keep the chunks.
+    bunch_copy = bunch_mm.copy()
+    assert isinstance(bunch_copy.x.base.base, np.memmap)
+    assert bunch_copy.chunk_size == 3000
+    assert_array_equal(bunch_copy.get_6D_matrix(), bunch_mm.get_6D_matrix())
+    assert not np.shares_memory(bunch_copy.x, bunch_mm.x)
+
+    # And so are sub-bunches.
+    sub_bunch = bunch_mm.get_sub_bunch(np.arange(5000))
+    assert isinstance(sub_bunch.x.base.base, np.memmap)
+    assert sub_bunch.chunk_size == 3000
+    assert_array_equal(
+        sub_bunch.get_6D_matrix(), bunch_mm.get_6D_matrix()[:, :5000])
+
+    # Bunches without chunk size are a single chunk.
+    assert list(bunch.iter_chunks()) == [bunch]
+
+
+def test_chunked_tracking():
+    """
+    Test that evolving and depositing a bunch in chunks gives the same
+    result as tracking the whole bunch, in a plasma stage with numerical
+    wakefields and with analytical fields and fused tracking. With the
+    adaptive pusher, the error of each chunk is controlled separately, so
+    that the results are only approximately equal. The energy classes of a
+    chunked bunch are also evolved in chunks.
+    """
+    memmap_dir = os.path.join(tests_output_folder, 'chunked_tracking')
+    os.makedirs(memmap_dir, exist_ok=True)
+    stages = [
+        PlasmaStage(
+            1e-3, 1e23, wakefield_model='quasistatic_2d', n_out=2,
+            xi_min=-20e-6, xi_max=20e-6, r_max=50e-6, n_xi=80, n_r=100,
+            dz_fields=0.5e-3),
+        PlasmaStage(
+            1e-3, 1e23, wakefield_model='cold_fluid_1d', n_out=2,
+            xi_min=-20e-6, xi_max=20e-6, r_max=50e-6, n_xi=80, n_r=100,
+            dz_fields=0.5e-3, bunch_pusher='rk4'),
+        PlasmaStage(
+            1e-3, 1e23, wakefield_model='focusing_blowout', n_out=2,
+            fused_tracking=True),
+        PlasmaStage(
+            1e-3, 1e23, wakefield_model='focusing_blowout', n_out=2,
+            bunch_pusher='boris_adaptive', dt_bunch='auto'),
+        PlasmaStage(
+            1e-3, 1e23, wakefield_model='focusing_blowout', n_out=2,
+            dt_bunch='auto', n_energy_classes=2),
+    ]
+    tolerances = [1e-12, 1e-12, 1e-12, 1e-3, 1e-12]
+    np.random.seed(0)
+    bunch_0 = get_gaussian_bunch_from_size(
+        1e-6, 1e-6, 5e-6, 5e-6, 1000, 1, 10, 0, 100, 1e4)
+    for stage, tolerance in zip(stages, tolerances):
+        bunch = bunch_0.copy()
+        bunch_ch = bunch_0.copy()
+        bunch_ch.make_contiguous(memmap_dir=memmap_dir)
+        bunch_ch.set_chunk_size(3000)
+        out = stage.track(bunch, show_progress_bar=False)
+        out_ch = stage.track(bunch_ch, show_progress_bar=False)
+        assert bunch_ch.chunk_size == 3000
+        assert len(out_ch) == len(out)
+        for b, b_ch in zip(out, out_ch):
+            mat, mat_ch = b.get_6D_matrix(), b_ch.get_6D_matrix()
+            error = np.abs(mat_ch - mat) / np.std(mat, axis=1)[:, np.newaxis]
+            assert np.max(error) <= tolerance
+
+
+if __name__ == '__main__':
+    test_memory_mapped_bunch()
+    test_chunked_tracking()
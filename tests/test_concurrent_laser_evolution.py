@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from wake_t import PlasmaStage, GaussianPulse
+from wake_t.utilities.bunch_generation import get_matched_bunch
+
+
+def test_concurrent_laser_evolution():
+    """
+    Test that evolving the laser envelope in a background thread (while the
+    bunch is being pushed) gives exactly the same result as evolving it at
+    each update, both with a fixed and an adaptive update interval.
+    """
+    for dz_fields in [20e-6, 'auto']:
+        results = []
+        for concurrent in [False, True]:
+            np.random.seed(1)
+            laser = GaussianPulse(
+                xi_c=0., l_0=800e-9, w_0=30e-6, a_0=2, tau=25e-15, z_foc=0.)
+            bunch = get_matched_bunch(
+                en_x=1e-6, en_y=1e-6, ene=200, ene_sp=0.1, s_t=3, xi_c=-40e-6,
+                q_tot=10, n_part=1000, n_p=1e23, k_x=1e5)
+            stage = PlasmaStage(
+                length=2e-3, density=1e23, wakefield_model='quasistatic_2d',
+                xi_max=30e-6, xi_min=-60e-6, r_max=100e-6, n_r=80, n_xi=120,
+                laser=laser, dz_fields=dz_fields, n_out=3,
+                laser_envelope_concurrent=concurrent)
+            bunch_list = stage.track(bunch, show_progress_bar=False)
+            results.append((laser, bunch, bunch_list, stage.wakefield))
+
+        (laser_1, bunch_1, list_1, wf_1), (laser_2, bunch_2, list_2, wf_2) = (
+            results)
+        np.testing.assert_array_equal(
+            laser_1.get_envelope(), laser_2.get_envelope())
+        assert laser_1.n_steps == laser_2.n_steps
+        np.testing.assert_array_equal(
+            wf_1.dt_update_history, wf_2.dt_update_history)
+        for b_1, b_2 in zip(list_1 + [bunch_1], list_2 + [bunch_2]):
+            for attr in ['x', 'y', 'xi', 'px', 'py', 'pz']:
+                np.testing.assert_array_equal(
+                    getattr(b_1, attr), getattr(b_2, attr))
+
+        # No evolution should be left running after the tracking.
+        assert wf_2._laser_evolution is None
+        assert wf_2._laser_executor is None
+
+
+def test_concurrent_laser_evolution_error():
+    """
+    Test that the background thread of the laser evolution is stopped when
+    the tracking is interrupted by an error.
+    """
+    def density(z):
+        # Fail when computing the wakefields in the middle of the stage.
+        if np.ndim(z) == 0 and z > 1e-3:
+            raise RuntimeError('Density not available.')
+        return np.ones_like(z) * 1e23
+
+    laser = GaussianPulse(
+        xi_c=0., l_0=800e-9, w_0=30e-6, a_0=2, tau=25e-15, z_foc=0.)
+    stage = PlasmaStage(
+        length=2e-3, density=density, wakefield_model='quasistatic_2d',
+        xi_max=30e-6, xi_min=-60e-6, r_max=100e-6, n_r=80, n_xi=120,
+        laser=laser, dz_fields=20e-6, n_out=3,
+        laser_envelope_concurrent=True)
+    with pytest.raises(RuntimeError):
+        stage.track(show_progress_bar=False)
+    assert stage.wakefield._laser_evolution is None
+    assert stage.wakefield._laser_executor is None
+
+
+if __name__ == '__main__':
+    test_concurrent_laser_evolution()
+    test_concurrent_laser_evolution_error()
@@ -0,0 +1,136 @@
+import numpy as np
+from numpy.testing import assert_array_equal
+import pytest
+
+from wake_t import Beamline, Drift, Dipole, Quadrupole, PlasmaStage
+from wake_t.particles import particle_bunch
+from wake_t.utilities.bunch_generation import get_gaussian_bunch_from_twiss
+
+
+def test_contiguous_storage():
+    """
+    Test that the coordinates of a contiguous bunch are views of a single
+    buffer and that the bunch matrices agree with those of a regular bunch.
+    """
+    np.random.seed(0)
+    bunch = get_gaussian_bunch_from_twiss(
+        en_x=1e-6, en_y=1e-6, a_x=0, a_y=0, b_x=1, b_y=1, ene=1000,
+        ene_sp=0.1, s_t=10, xi_c=0, q_tot=100, n_part=1000)
+    bunch_c = bunch.copy()
+    bunch_c.make_contiguous()
+    assert not bunch.is_contiguous
+    assert bunch_c.is_contiguous
+
+    # The coordinates and the 6D matrix are views of the same buffer.
+    mat_c = bunch_c.get_6D_matrix()
+    assert mat_c.base is not None
+    for coord in [bunch_c.x, bunch_c.px, bunch_c.y, bunch_c.py, bunch_c.xi,
+                  bunch_c.pz, bunch_c.w]:
+        assert coord.base is mat_c.base
+        assert coord.flags['C_CONTIGUOUS']
+    assert_array_equal(mat_c, bunch.get_6D_matrix())
+    assert_array_equal(bunch_c.get_bunch_matrix(), bunch.get_bunch_matrix())
+    assert_array_equal(
+        bunch_c.get_6D_matrix_with_charge(),
+        bunch.get_6D_matrix_with_charge())
+
+    # Modifying the coordinates modifies the buffer and vice versa.
+    bunch_c.xi += 1e-6
+    bunch_c.pz = bunch_c.pz * 2
+    mat_c[0] *= 2
+    assert_array_equal(mat_c[4], bunch.xi + 1e-6)
+    assert_array_equal(mat_c[5], bunch.pz * 2)
+    assert_array_equal(bunch_c.x, bunch.x * 2)
+
+    # Copies and sub-bunches are also contiguous.
+    bunch_copy = bunch_c.copy()
+    assert bunch_copy.is_contiguous
+    assert not np.shares_memory(bunch_copy.x, bunch_c.x)
+    assert_array_equal(bunch_copy.get_6D_matrix(), mat_c)
+    sub_bunch = bunch_c.get_sub_bunch(np.arange(10))
+    assert sub_bunch.is_contiguous
+    assert_array_equal(sub_bunch.get_6D_matrix(), mat_c[:, :10])
+
+    # The number of particles of a contiguous bunch cannot be changed by
+    # assigning a single coordinate.
+    with pytest.raises(ValueError):
+        bunch_c.x = np.zeros(10)
+
+
+def test_contiguous_tracking():
+    """
+    Test that tracking a contiguous bunch gives the same result as tracking
+    a regular bunch, both in transfer-matrix and field elements.
+    """
+    def get_beamline():
+        return Beamline([
+            Drift(0.1, n_out=2),
+            Dipole(0.2, 0.05, n_out=2),
+            Quadrupole(0.1, 5.),
+            Drift(0.1),
+            PlasmaStage(
+                1e-3, 1e23, wakefield_model='focusing_blowout', n_out=2,
+                bunch_pusher='rk4'),
+            PlasmaStage(
+                1e-3, 1e23, wakefield_model='focusing_blowout', n_out=2,
+                bunch_pusher='boris')
+        ])
+
+    np.random.seed(0)
+    bunch = get_gaussian_bunch_from_twiss(
+        en_x=1e-6, en_y=1e-6, a_x=0, a_y=0, b_x=1, b_y=1, ene=1000,
+        ene_sp=0.1, s_t=10, xi_c=0, q_tot=100, n_part=1000)
+    bunch_c = bunch.copy()
+    bunch_c.make_contiguous()
+    out = get_beamline().track(bunch, show_progress_bar=False)
+    out_c = get_beamline().track(bunch_c, show_progress_bar=False)
+
+    assert bunch_c.is_contiguous
+    assert_array_equal(bunch_c.get_6D_matrix(), bunch.get_6D_matrix())
+    assert len(out_c) == len(out)
+    for b, b_c in zip(out, out_c):
+        assert_array_equal(b_c.get_6D_matrix(), b.get_6D_matrix())
+
+
+def test_scratch_pool():
+    """
+    Test that the scratch arrays of the pushers are shared by contiguous
+    bunches with the same number of particles, that the field and RK4 arrays
+    are only allocated when needed, and that they are released at the end
+    of the tracking.
+    """
+    pool = particle_bunch._scratch_pool
+    particle_bunch.clear_scratch_pool()
+    np.random.seed(0)
+    bunch_1 = get_gaussian_bunch_from_twiss(
+        en_x=1e-6, en_y=1e-6, a_x=0, a_y=0, b_x=1, b_y=1, ene=1000,
+        ene_sp=0.1, s_t=10, xi_c=0, q_tot=100, n_part=1000)
+    bunch_1.make_contiguous()
+    bunch_2 = bunch_1.copy()
+    n_part = len(bunch_1.x)
+
+    # Field arrays are shared, RK4 arrays are not yet allocated.
+    fields_1 = bunch_1.get_field_arrays()
+    fields_2 = bunch_2.get_field_arrays()
+    assert len(fields_1) == 6
+    assert all(f_1.base is f_2.base for f_1, f_2 in zip(fields_1, fields_2))
+    assert list(pool) == [(6, n_part)]
+
+    # RK4 arrays are allocated separately.
+    assert len(bunch_1.get_rk4_arrays()) == 18
+    assert sorted(pool) == [(6, n_part), (18, n_part)]
+    particle_bunch.clear_scratch_pool()
+    assert len(pool) == 0
+
+    # The pool is released after tracking.
+    stage = PlasmaStage(
+        1e-3, 1e23, wakefield_model='focusing_blowout', n_out=2,
+        bunch_pusher='rk4')
+    stage.track(bunch_1, show_progress_bar=False)
+    assert len(pool) == 0
+
+
+if __name__ == '__main__':
+    test_contiguous_storage()
+    test_contiguous_tracking()
+    test_scratch_pool()
@@ -0,0 +1,226 @@
+import numpy as np
+from scipy import stats
+
+from wake_t import Beamline, Drift, Dipole
+from wake_t.physics_models.collective_effects.csr import (
+    smooth_line_charge, reset_csr_calculator, set_csr_settings,
+    get_csr_calculator)
+from wake_t.utilities.bunch_generation import get_gaussian_bunch_from_twiss
+
+
+def test_line_charge_smoothing():
+    """
+    Test that the smoothing of the line charge profile agrees with a
+    Gaussian KDE from `scipy`.
+    """
+    np.random.seed(0)
+    z = np.concatenate([
+        np.random.normal(0., 10e-6, 50000),
+        np.random.normal(30e-6, 5e-6, 20000)
+    ])
+    q = np.full(z.size, -1e-15)
+    bw_factor = len(q)**(-1/5)
+    for n_bins in [100, 2000]:
+        hist, bin_edges = np.histogram(z, n_bins, weights=q)
+        bin_size = bin_edges[1] - bin_edges[0]
+        bin_centers = bin_edges[1:] - bin_size/2
+        kde = stats.gaussian_kde(
+            bin_centers, bw_method=bw_factor, weights=hist)
+        hist_kde = kde(bin_centers) * bin_size * hist.sum()
+        hist_smooth = smooth_line_charge(hist, bin_centers, bw_factor)
+        np.testing.assert_allclose(
+            hist_smooth, hist_kde, rtol=0, atol=1e-12*np.max(np.abs(hist_kde)))
+
+
+def test_csr_chicane():
+    """
+    Test the CSR-induced energy change of a bunch in a four-dipole chicane.
+    """
+    bunch = get_test_bunch()
+    pz_0 = bunch.pz.copy()
+    track_chicane(bunch)
+
+    # Reference values obtained with the original implementation based on
+    # `scipy.stats.gaussian_kde` and `np.convolve`.
+    dpz = bunch.pz - pz_0
+    np.testing.assert_allclose(np.mean(dpz), 3.440088389260455, rtol=1e-9)
+    np.testing.assert_allclose(np.std(dpz), 2.334730026031364, rtol=1e-9)
+
+    # Restore default settings.
+    set_csr_settings()
+    reset_csr_calculator()
+
+
+def test_csr_kernel_cache():
+    """
+    Test that the CSR kernels are reused when tracking a bunch several
+    times through the same chicane, and that this gives the same result
+    as without cache.
+    """
+    csr_calculator = get_csr_calculator()
+    bunch = get_test_bunch()
+    bunch_ref = bunch.copy()
+    track_chicane(bunch_ref)
+    dpz_ref = bunch_ref.pz - bunch.pz
+
+    # Exact cache.
+    csr_calculator.clear_kernel_cache()
+    for i in range(2):
+        bunch_i = bunch.copy()
+        track_chicane(bunch_i, kernel_cache_size=10000)
+        np.testing.assert_array_equal(bunch_i.pz, bunch_ref.pz)
+    info = csr_calculator.get_kernel_cache_info()
+    assert info['misses'] == info['size']
+    assert info['hits'] == info['misses']
+
+    # Cache with quantized bin size.
+    csr_calculator.clear_kernel_cache()
+    bunch_q = bunch.copy()
+    track_chicane(bunch_q, kernel_cache_size=10000, kernel_bin_tolerance=1e-3)
+    np.testing.assert_allclose(
+        bunch_q.pz - bunch.pz, dpz_ref, rtol=0, atol=1e-2*np.std(dpz_ref))
+
+    # Small cache where kernels are discarded before being reused.
+    csr_calculator.clear_kernel_cache()
+    bunch_s = bunch.copy()
+    track_chicane(bunch_s, kernel_cache_size=50)
+    info = csr_calculator.get_kernel_cache_info()
+    assert info['size'] == 50
+    assert info['hits'] == 0
+    np.testing.assert_array_equal(bunch_s.pz, bunch_ref.pz)
+
+    # Restore default settings.
+    set_csr_settings()
+    reset_csr_calculator()
+    csr_calculator.clear_kernel_cache()
+
+
+def test_csr_kernel_cache_gamma():
+    """
+    Test that, with a quantized gamma, the CSR kernels are reused when
+    tracking bunches of slightly different energy.
+    """
+    csr_calculator = get_csr_calculator()
+    bunch_1 = get_test_bunch()
+    bunch_2 = bunch_1.copy()
+    bunch_2.pz *= 1 + 1e-5
+
+    # Reference without cache.
+    bunch_ref = bunch_2.copy()
+    track_chicane(bunch_ref)
+    dpz_ref = bunch_ref.pz - bunch_2.pz
+
+    # Without quantized gamma, the kernels of the first bunch are not reused.
+    settings = {'kernel_cache_size': 20000, 'kernel_bin_tolerance': 1e-3}
+    csr_calculator.clear_kernel_cache()
+    track_chicane(bunch_1.copy(), **settings)
+    track_chicane(bunch_2.copy(), **settings)
+    info = csr_calculator.get_kernel_cache_info()
+    assert info['hits'] == 0
+
+    # With quantized gamma, all kernels are reused.
+    settings['kernel_gamma_tolerance'] = 1e-2
+    csr_calculator.clear_kernel_cache()
+    track_chicane(bunch_1.copy(), **settings)
+    bunch_q = bunch_2.copy()
+    track_chicane(bunch_q, **settings)
+    info = csr_calculator.get_kernel_cache_info()
+    assert info['misses'] == info['size']
+    assert info['hits'] == info['misses']
+    np.testing.assert_allclose(
+        bunch_q.pz - bunch_2.pz, dpz_ref, rtol=0, atol=1e-2*np.std(dpz_ref))
+
+    # Restore default settings.
+    set_csr_settings()
+    reset_csr_calculator()
+    csr_calculator.clear_kernel_cache()
+
+
+def test_csr_multibunch():
+    """
+    Test that, when tracking several bunches together, CSR is calculated
+    from their combined line charge.
+    """
+    bunch = get_test_bunch()
+    n_half = len(bunch.w) // 2
+    bunches = [
+        bunch.get_sub_bunch(np.arange(n_half)),
+        bunch.get_sub_bunch(np.arange(n_half, len(bunch.w)))
+    ]
+    track_chicane(bunch)
+    track_chicane(bunches)
+    for attr in ['x', 'y', 'xi', 'px', 'py', 'pz']:
+        np.testing.assert_allclose(
+            np.concatenate([getattr(b, attr) for b in bunches]),
+            getattr(bunch, attr), rtol=1e-12, atol=0)
+
+    # Restore default settings.
+    set_csr_settings()
+
+
+def test_csr_fused_drifts():
+    """
+    Test that CSR-free drifts tracked with a single (fused) transfer map
+    interrupt the CSR trajectory in the same way as when they are tracked
+    one by one.
+    """
+    bunch = get_test_bunch()
+    results = []
+    for fuse in [False, True]:
+        bunch_i = bunch.copy()
+        beamline = Beamline([
+            Dipole(0.5, 0.05, csr_on=True),
+            Drift(0.2),
+            Drift(0.3),
+            Dipole(0.5, -0.05, csr_on=True),
+        ], fuse_tm_elements=fuse)
+        reset_csr_calculator()
+        set_csr_settings(csr_step=0.05, n_bins=500)
+        beamline.track(bunch_i, show_progress_bar=False)
+        results.append(bunch_i)
+    bunch_1, bunch_2 = results
+    for attr in ['x', 'y', 'xi', 'px', 'py', 'pz']:
+        np.testing.assert_allclose(
+            getattr(bunch_2, attr), getattr(bunch_1, attr), rtol=0,
+            atol=1e-6*np.std(getattr(bunch_1, attr)))
+
+    # Restore default settings.
+    set_csr_settings()
+    reset_csr_calculator()
+
+
+def get_test_bunch():
+    """Get the bunch used in the CSR tests."""
+    np.random.seed(0)
+    return get_gaussian_bunch_from_twiss(
+        en_x=1e-6, en_y=1e-6, a_x=0, a_y=0, b_x=10, b_y=10, ene=1000,
+        ene_sp=0.1, s_t=30, xi_c=0, q_tot=300, n_part=5000)
+
+
+def track_chicane(bunch, **csr_settings):
+    """Track a bunch (or a list of bunches) through a four-dipole chicane
+    with CSR."""
+    theta = 0.05
+    l_dipole = 0.5
+    l_drift = 0.2
+    chicane = Beamline([
+        Dipole(l_dipole, theta, csr_on=True),
+        Drift(l_drift, csr_on=True),
+        Dipole(l_dipole, -theta, csr_on=True),
+        Drift(l_drift, csr_on=True),
+        Dipole(l_dipole, -theta, csr_on=True),
+        Drift(l_drift, csr_on=True),
+        Dipole(l_dipole, theta, csr_on=True),
+    ])
+    reset_csr_calculator()
+    set_csr_settings(csr_step=0.05, n_bins=500, **csr_settings)
+    chicane.track(bunch, show_progress_bar=False)
+
+
+if __name__ == '__main__':
+    test_line_charge_smoothing()
+    test_csr_chicane()
+    test_csr_kernel_cache()
+    test_csr_kernel_cache_gamma()
+    test_csr_multibunch()
+    test_csr_fused_drifts()
@@ -0,0 +1,69 @@
+import copy
+
+import numpy as np
+
+from wake_t import PlasmaStage, ParticleBunch
+
+
+def test_energy_classes():
+    """
+    Test that tracking a bunch with a wide energy spread using several
+    energy classes requires fewer particle pushes than using a single time
+    step for the whole bunch, while keeping the same accuracy.
+    """
+    np.random.seed(0)
+    n_part = 10000
+    gamma = np.exp(np.random.uniform(np.log(20), np.log(2000), n_part))
+    bunch = ParticleBunch(
+        w=np.ones(n_part),
+        x=np.random.normal(0, 1e-6, n_part),
+        y=np.random.normal(0, 1e-6, n_part),
+        xi=np.random.normal(0, 1e-6, n_part),
+        px=np.random.normal(0, 2, n_part),
+        py=np.random.normal(0, 2, n_part),
+        pz=gamma
+    )
+    stage_params = dict(
+        length=1e-2, density=1e23, wakefield_model='focusing_blowout',
+        n_out=3
+    )
+
+    # Count the number of particle pushes.
+    n_pushes = 0
+    evolve = ParticleBunch.evolve
+
+    def counting_evolve(self, *args, **kwargs):
+        nonlocal n_pushes
+        n_pushes += len(self.x)
+        return evolve(self, *args, **kwargs)
+
+    # Reference with a very small time step.
+    bunch_ref = copy.deepcopy(bunch)
+    PlasmaStage(dt_bunch=2e-15, **stage_params).track(
+        bunch_ref, show_progress_bar=False)
+
+    errors = []
+    pushes = []
+    ParticleBunch.evolve = counting_evolve
+    try:
+        for n_classes in [1, 4]:
+            bunch_test = copy.deepcopy(bunch)
+            n_pushes = 0
+            stage = PlasmaStage(
+                dt_bunch='auto', n_energy_classes=n_classes, **stage_params)
+            bunch_list = stage.track(bunch_test, show_progress_bar=False)
+            pushes.append(n_pushes)
+            error = (bunch_test.x - bunch_ref.x) / np.std(bunch_ref.x)
+            errors.append(np.sqrt(np.mean(error**2)))
+            np.testing.assert_allclose(
+                bunch_test.prop_distance, stage_params['length'])
+            assert len(bunch_list) == stage_params['n_out'] + 1
+    finally:
+        ParticleBunch.evolve = evolve
+
+    assert pushes[1] < 0.7 * pushes[0]
+    assert errors[1] < 1.2 * errors[0]
+
+
+if __name__ == '__main__':
+    test_energy_classes()
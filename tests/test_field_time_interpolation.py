@@ -0,0 +1,54 @@
+import copy
+
+import numpy as np
+
+from wake_t import PlasmaStage
+from wake_t.utilities.bunch_generation import get_matched_bunch
+
+
+def test_field_time_interpolation():
+    """
+    Test that interpolating the wakefields in time between updates improves
+    the accuracy of the witness energy gain in a density upramp.
+    """
+    # Set numpy random seed to get reproducible results.
+    np.random.seed(1)
+
+    # Plasma density.
+    n_p = 1e23
+
+    def density(z):
+        return n_p * (1 + 30 * z)
+
+    # Create driver and a low-charge witness.
+    driver = get_matched_bunch(
+        en_x=10e-6, en_y=10e-6, ene=2000, ene_sp=1, s_t=10, xi_c=0,
+        q_tot=500, n_part=1e4, n_p=n_p)
+    witness = get_matched_bunch(
+        en_x=1e-6, en_y=1e-6, ene=200, ene_sp=0.1, s_t=3, xi_c=-60e-6,
+        q_tot=1, n_part=1e4, n_p=n_p)
+
+    def get_energy_gain(dz_fields, field_time_interpolation):
+        bunches = [copy.deepcopy(driver), copy.deepcopy(witness)]
+        plasma = PlasmaStage(
+            length=1e-2, density=density, wakefield_model='quasistatic_2d',
+            xi_max=20e-6, xi_min=-120e-6, r_max=70e-6, n_xi=280, n_r=70,
+            dz_fields=dz_fields,
+            field_time_interpolation=field_time_interpolation)
+        plasma.track(bunches, show_progress_bar=False)
+        gamma = np.sqrt(1 + bunches[1].pz**2)
+        return np.mean(gamma) - 200
+
+    # Reference with frequent updates.
+    gain_ref = get_energy_gain(2e-4, None)
+
+    # Relative error with 10 times fewer updates.
+    errors = {}
+    for interpolation in [None, 'linear', 'quadratic']:
+        gain = get_energy_gain(2e-3, interpolation)
+        errors[interpolation] = np.abs(gain / gain_ref - 1)
+    assert errors['quadratic'] < errors['linear'] < errors[None] / 2
+
+
+if __name__ == '__main__':
+    test_field_time_interpolation()
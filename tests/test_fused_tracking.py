@@ -0,0 +1,90 @@
+import copy
+
+import numpy as np
+
+from wake_t import PlasmaStage, PlasmaRamp, ActivePlasmaLens, GaussianPulse
+from wake_t.beamline_elements import FieldQuadrupole
+from wake_t.utilities.bunch_generation import get_gaussian_bunch_from_twiss
+
+
+def get_test_bunch():
+    """Get the bunch used in the tests."""
+    bunch = get_gaussian_bunch_from_twiss(
+        en_x=1e-6, en_y=1e-6, a_x=0, a_y=0, b_x=1e-3, b_y=1e-3, ene=600,
+        ene_sp=2, s_t=3, xi_c=0e-6, q_tot=100, n_part=1e4)
+    return bunch
+
+
+def check_fused_tracking(element_class, **element_params):
+    """Check that fused and standard tracking give the same result.
+
+    A constant time step should be given in `element_params`, since adaptive
+    time steps are only evaluated once in fused tracking.
+    """
+    np.random.seed(0)
+    bunch = get_test_bunch()
+    bunch_fused = copy.deepcopy(bunch)
+
+    element = element_class(**element_params)
+    element_fused = element_class(fused_tracking=True, **element_params)
+    bunch_list = element.track(bunch, show_progress_bar=False)
+    bunch_list_fused = element_fused.track(
+        bunch_fused, show_progress_bar=False)
+
+    assert len(bunch_list) == len(bunch_list_fused)
+    for b, b_fused in zip(bunch_list, bunch_list_fused):
+        assert b.prop_distance == b_fused.prop_distance
+        for coord in ['x', 'y', 'xi', 'px', 'py', 'pz']:
+            np.testing.assert_allclose(
+                getattr(b_fused, coord), getattr(b, coord),
+                rtol=1e-12, atol=1e-15)
+
+
+def test_fused_active_plasma_lens():
+    """Fused tracking through an active plasma lens."""
+    check_fused_tracking(
+        ActivePlasmaLens, length=1e-2, foc_strength=1000, dt_bunch=1e-13,
+        n_out=3)
+
+
+def test_fused_field_quadrupole():
+    """Fused tracking through a field quadrupole."""
+    check_fused_tracking(
+        FieldQuadrupole, length=5e-2, foc_strength=100, dt_bunch=1e-13,
+        n_out=3)
+
+
+def test_fused_simple_blowout():
+    """Fused tracking through a stage with a `simple_blowout` model."""
+    laser = GaussianPulse(
+        100e-6, l_0=800e-9, w_0=50e-6, a_0=3, tau=30e-15, z_foc=0.)
+    check_fused_tracking(
+        PlasmaStage, length=1e-2, density=1e23, laser=laser,
+        wakefield_model='simple_blowout', dt_bunch=1e-13, n_out=4)
+
+
+def test_fused_focusing_blowout_ramp():
+    """
+    Fused tracking through a `focusing_blowout` ramp. Since the density is
+    tabulated in this case, the results are not exactly identical.
+    """
+    np.random.seed(0)
+    bunch = get_test_bunch()
+    bunch_fused = copy.deepcopy(bunch)
+    ramp_params = dict(
+        length=1e-2, ramp_type='downramp', profile='inverse_square',
+        plasma_dens_top=1e23, plasma_dens_down=1e21,
+        wakefield_model='focusing_blowout', dt_bunch=1e-13, n_out=3
+    )
+    PlasmaRamp(**ramp_params).track(bunch, show_progress_bar=False)
+    PlasmaRamp(fused_tracking=True, **ramp_params).track(
+        bunch_fused, show_progress_bar=False)
+    np.testing.assert_allclose(bunch_fused.x, bunch.x, rtol=1e-6, atol=1e-12)
+    np.testing.assert_allclose(bunch_fused.px, bunch.px, rtol=1e-6, atol=1e-6)
+
+
+if __name__ == '__main__':
+    test_fused_active_plasma_lens()
+    test_fused_field_quadrupole()
+    test_fused_simple_blowout()
+    test_fused_focusing_blowout_ramp()
@@ -191,6 +191,183 @@ def test_gaussian_laser_in_vacuum_with_subgrid(plot=False):
         plt.show()
 
 
+def test_gaussian_laser_in_vacuum_single_precision():
+    """Test evolution of Gaussian laser pulse in vacuum in single precision.
+
+    Same as `test_gaussian_laser_in_vacuum`, but storing the envelope
+    in single precision. The evolution should agree with the analytical
+    expectation and with the double-precision result.
+    """
+    # Grid properties.
+    xi_max = 20e-6
+    xi_min = -20e-6
+    r_max = 400e-6
+    nxi = 201
+    nr = 400
+    dr = r_max / nr
+
+    # Time steps.
+    z_tot = 1e-2
+    t_tot = z_tot / ct.c
+    nt = 1000
+    dt = t_tot / nt
+
+    # Plasma susceptibility (zero in vaccum) and normalization density.
+    chi = np.zeros((nxi, nr))
+    n_p = 1e23
+
+    # Laser parameters in SI units
+    w_0 = 50e-6  # m
+    l_0 = 0.8e-6  # m
+    a_0 = 3
+    z_foc = z_tot / 2
+
+    # Create and initialize laser pulse.
+    laser = GaussianPulse(
+        0., l_0=l_0, w_0=w_0, a_0=a_0, tau=25e-15, z_foc=z_foc,
+        polarization='circular'
+    )
+    laser.set_envelope_solver_params(
+        xi_min, xi_max, r_max, nxi, nr, dt, single_precision=True)
+    laser.initialize_envelope()
+    assert laser.get_envelope().dtype == np.complex64
+
+    # Evolve laser.
+    laser_w = np.zeros(nt + 1)
+    laser_a = np.zeros(nt + 1)
+    a_env = laser.get_envelope()
+    laser_w[0] = calculate_spot_size(a_env, dr)
+    laser_a[0] = calculate_a0(a_env)
+    for n in range(nt):
+        laser.evolve(chi, n_p)
+        a_env = laser.get_envelope()
+        laser_w[n+1] = calculate_spot_size(a_env, dr)
+        laser_a[n+1] = calculate_a0(a_env)
+
+    # Check that evolution is as expected.
+    z = np.linspace(0, z_tot, nt + 1)
+    rayleigh_length = ct.pi * w_0**2 / l_0
+    laser_w_an = w_0 * np.sqrt(1 + ((z-z_foc)/rayleigh_length)**2)
+    laser_a_an = a_0 / np.sqrt(1 + ((z-z_foc)/rayleigh_length)**2)
+    diff_w = np.max(np.abs(laser_w - laser_w_an) / laser_w_an)
+    diff_a = np.max(np.abs(laser_a - laser_a_an) / laser_a_an)
+    assert diff_a < 1e-3
+    assert diff_w < 1e-3
+
+    # Compare with the double-precision result.
+    assert a_env.dtype == np.complex64
+    np.testing.assert_allclose(
+        np.sum(np.abs(a_env)), 7500.380522059235, rtol=1e-4)
+
+
+def test_parallel_envelope_solver():
+    """Test that the parallel envelope solver, which computes all substeps
+    simultaneously, agrees with the serial solver.
+    """
+    np.random.seed(0)
+    xi_min = -60e-6
+    xi_max = 20e-6
+    r_max = 150e-6
+    nxi = 161
+    nr = 100
+    dt = 20e-6 / ct.c
+    n_p = 1e23
+
+    # Random (but constant) plasma susceptibility.
+    chi = 0.05 * np.random.rand(nxi, nr)
+
+    envelopes = []
+    for parallel in [False, True]:
+        laser = GaussianPulse(
+            0., l_0=0.8e-6, w_0=30e-6, a_0=2, tau=25e-15, z_foc=0.)
+        laser.set_envelope_solver_params(
+            xi_min, xi_max, r_max, nxi, nr, dt, nt=5, parallel=parallel)
+        laser.initialize_envelope()
+        for n in range(10):
+            laser.evolve(chi, n_p)
+        envelopes.append(laser.get_envelope())
+    np.testing.assert_allclose(
+        envelopes[1], envelopes[0], rtol=1e-10,
+        atol=1e-10 * np.max(np.abs(envelopes[0])))
+
+
+def test_auto_crop():
+    """Test that evolving the laser envelope only within its active region
+    gives the same result as evolving it in the whole grid.
+    """
+    xi_min = -150e-6
+    xi_max = 20e-6
+    r_max = 300e-6
+    nxi = 341
+    nr = 300
+    dt = 50e-6 / ct.c
+    n_p = 1e23
+    chi = np.zeros((nxi, nr))
+
+    envelopes = []
+    for auto_crop in [False, True]:
+        laser = GaussianPulse(
+            0., l_0=0.8e-6, w_0=30e-6, a_0=2, tau=25e-15, z_foc=2e-3,
+            polarization='circular')
+        laser.set_envelope_solver_params(
+            xi_min, xi_max, r_max, nxi, nr, dt, auto_crop=auto_crop)
+        laser.initialize_envelope()
+        for n in range(80):
+            laser.evolve(chi, n_p)
+        envelopes.append(laser.get_envelope())
+
+    # Check that only a fraction of the grid has been evolved.
+    j_start, j_end, k_end = laser.active_region
+    assert j_end - j_start < nxi / 2
+    assert k_end < nr / 2
+
+    # Check that the result is the same.
+    np.testing.assert_allclose(
+        envelopes[1], envelopes[0], atol=1e-4 * np.max(np.abs(envelopes[0])))
+
+
+def test_adaptive_substeps():
+    """Test the automatic choice of the number of laser envelope substeps.
+
+    The laser propagates first in vacuum and then in a plasma. The number of
+    substeps should stay within the given bounds and increase in the plasma,
+    and the result should be more accurate than with a single substep.
+    """
+    xi_min = -40e-6
+    xi_max = 20e-6
+    r_max = 100e-6
+    nxi = 121
+    nr = 100
+    dt = 200e-6 / ct.c
+    n_p = 1e24
+
+    def evolve_laser(nt, **kwargs):
+        laser = GaussianPulse(
+            0., l_0=0.8e-6, w_0=20e-6, a_0=1, tau=25e-15, z_foc=1e-3,
+            polarization='circular')
+        laser.set_envelope_solver_params(
+            xi_min, xi_max, r_max, nxi, nr, dt, nt=nt, **kwargs)
+        laser.initialize_envelope()
+        for n in range(40):
+            chi = np.full((nxi, nr), 0. if n < 30 else 0.5)
+            laser.evolve(chi, n_p)
+        return laser
+
+    a_ref = evolve_laser(64).get_envelope()
+    a_single = evolve_laser(1).get_envelope()
+    laser = evolve_laser('auto', nt_min=1, nt_max=8)
+    a_auto = laser.get_envelope()
+
+    nt_history = np.array(laser.nt_history)
+    assert len(nt_history) == 40
+    assert np.all((nt_history >= 1) & (nt_history <= 8))
+    assert np.min(nt_history[30:]) > np.max(nt_history[20:30])
+    assert np.mean(nt_history) < 8
+    error_single = np.max(np.abs(a_single - a_ref))
+    error_auto = np.max(np.abs(a_auto - a_ref))
+    assert error_auto < 0.5 * error_single
+
+
 def test_unwrap():
     """Test that the custom function for phase unwrapping implemented for
     numba agrees with the numpy version.
@@ -240,4 +417,8 @@ def calculate_a0(a_env):
 if __name__ == "__main__":
     test_gaussian_laser_in_vacuum(plot=True)
     test_gaussian_laser_in_vacuum_with_subgrid(plot=True)
+    test_gaussian_laser_in_vacuum_single_precision()
+    test_parallel_envelope_solver()
+    test_auto_crop()
+    test_adaptive_substeps()
     test_unwrap()
@@ -1,8 +1,14 @@
+import os
 import math
+import shutil
 import numpy as np
 from aptools.plasma_accel.general_equations import (
     laser_radius_at_z_pos, laser_rayleigh_length)
-from wake_t import GaussianPulse, FlattenedGaussianPulse
+from wake_t import GaussianPulse, FlattenedGaussianPulse, LaguerreGaussPulse
+from wake_t.physics_models.laser.laser_pulse import OpenPMDPulse
+
+
+tests_output_folder = './tests_output'
 
 
 def test_gaussian_init():
@@ -99,6 +105,102 @@ def test_flattened_gaussian_init():
         assert math.isclose(a0_env, a0_analytic, rel_tol=1e-4)
 
 
+def test_compiled_envelope_functions():
+    """Test the compiled evaluation of the envelope of analytic pulses.
+
+    This test checks that the envelope used to initialize the laser, which is
+    evaluated in a compiled kernel, agrees with the `envelope_function` of
+    each pulse evaluated on the meshgrid.
+    """
+    xi = np.linspace(-100e-6, 0., 201)
+    r = np.linspace(0.25e-6, 99.75e-6, 200)
+    pulses = [
+        GaussianPulse(
+            xi_c=-50e-6, a_0=1, w_0=30e-6, tau=25e-15, z_foc=1e-2,
+            cep_phase=0.5),
+        LaguerreGaussPulse(
+            xi_c=-50e-6, p=3, a_0=1, w_0=30e-6, tau=25e-15, z_foc=1e-2,
+            cep_phase=0.5),
+        FlattenedGaussianPulse(
+            xi_c=-50e-6, a_0=1, w_0=30e-6, tau=25e-15, z_foc=1e-2, N=6),
+        GaussianPulse(xi_c=-30e-6, a_0=1, w_0=30e-6, tau=25e-15) +
+        GaussianPulse(xi_c=-70e-6, a_0=0.5, w_0=20e-6, tau=25e-15)
+    ]
+    ZZ, RR = np.meshgrid(xi, r, indexing='ij')
+    for pulse in pulses:
+        a_env = pulse._envelope_function_on_grid(xi, r, 1e-3)
+        a_env_ref = pulse.envelope_function(ZZ, RR, 1e-3)
+        np.testing.assert_allclose(
+            a_env, a_env_ref, rtol=1e-12,
+            atol=1e-14 * np.max(np.abs(a_env_ref)))
+
+
+def test_openpmd_pulse_cache():
+    """Test the on-disk cache of `OpenPMDPulse`.
+
+    This test pre-seeds the cache folder with the wavelength and envelope of
+    an openPMD pulse and checks that they are read from the cache instead of
+    from the openPMD data (which does not exist, and `lasy` is not needed).
+    It also checks that the cache files depend on the grid and on the
+    smoothing options, and that no temporary files are left in the folder.
+    """
+    cache_dir = os.path.join(tests_output_folder, 'openpmd_pulse_cache')
+    if os.path.exists(cache_dir):
+        shutil.rmtree(cache_dir)
+    path = os.path.join(cache_dir, 'missing_openpmd_data')
+
+    class DummyProfile():
+        lambda0 = 0.8e-6
+
+    class DummyOpenPMDPulse(OpenPMDPulse):
+        def _get_lasy_profile(self):
+            return DummyProfile()
+
+    # Grid properties.
+    xi_min, xi_max, r_max, nxi, nr = -100e-6, 0., 100e-6, 51, 20
+    dr = r_max / nr
+    xi = np.linspace(xi_min, xi_max, nxi)
+    r = np.linspace(dr/2, r_max-dr/2, nr)
+
+    # Get name of the cache files and pre-seed them.
+    pulse = DummyOpenPMDPulse(path, 0, cache_dir=cache_dir)
+    l_0_file = pulse._get_cache_file('l_0')
+    a_env_file = pulse._get_cache_file('a_env', grid=(xi, r, np.array([0.])))
+    assert os.path.exists(l_0_file)
+    np.save(l_0_file, 1e-6)
+    a_env_cached = np.random.rand(nxi, nr) + 1j * np.random.rand(nxi, nr)
+    np.save(a_env_file, a_env_cached)
+
+    # Create pulse that can only be initialized from the cache.
+    pulse = OpenPMDPulse(path, 0, cache_dir=cache_dir)
+    assert pulse.l_0 == 1e-6
+    pulse.set_envelope_solver_params(xi_min, xi_max, r_max, nxi, nr, 1e-13)
+    pulse.initialize_envelope()
+    np.testing.assert_array_equal(pulse.get_envelope(), a_env_cached)
+
+    # The cache key changes with the grid.
+    assert pulse._get_cache_file(
+        'a_env', grid=(xi, r * 2, np.array([0.]))) != a_env_file
+    assert pulse._get_cache_file(
+        'a_env', grid=(xi, r, np.array([1e-3]))) != a_env_file
+
+    # The cache key changes with the smoothing options.
+    pulses = [
+        DummyOpenPMDPulse(path, 0, smooth_edges=True, cache_dir=cache_dir),
+        DummyOpenPMDPulse(
+            path, 0, apply_gaussian_filter=True, cache_dir=cache_dir),
+        DummyOpenPMDPulse(
+            path, 0, apply_gaussian_filter=True, gaussian_filter_sigma=2,
+            cache_dir=cache_dir),
+    ]
+    cache_files = [l_0_file] + [p._get_cache_file('l_0') for p in pulses]
+    assert len(set(cache_files)) == len(cache_files)
+    assert all(os.path.exists(f) for f in cache_files)
+
+    # No temporary files are left behind.
+    assert not [f for f in os.listdir(cache_dir) if f.endswith('.tmp')]
+
+
 def calculate_spot_size(a_env, dr):
     # Project envelope to r
     a_proj = np.sum(np.abs(a_env), axis=0)
@@ -133,3 +235,5 @@ def calculate_spot_size(a_env, dr):
 if __name__ == "__main__":
     test_gaussian_init()
     test_flattened_gaussian_init()
+    test_compiled_envelope_functions()
+    test_openpmd_pulse_cache()
@@ -0,0 +1,69 @@
+import copy
+
+import numpy as np
+
+from wake_t import PlasmaStage, ActivePlasmaLens
+from wake_t.beamline_elements import FieldQuadrupole
+from wake_t.utilities.bunch_generation import get_gaussian_bunch_from_twiss
+
+
+def check_against_boris(element_class, n_steps_boris, rtol, **element_params):
+    """
+    Track a bunch through an element using the linear focusing pusher
+    with the automatic time step and compare it with the result of the
+    Boris pusher with a much smaller time step.
+    """
+    np.random.seed(0)
+    bunch = get_gaussian_bunch_from_twiss(
+        en_x=1e-6, en_y=1e-6, a_x=0, a_y=0, b_x=1e-3, b_y=1e-3, ene=600,
+        ene_sp=2, s_t=3, xi_c=0e-6, q_tot=100, n_part=1e4)
+    bunch_ref = copy.deepcopy(bunch)
+
+    element = element_class(bunch_pusher='linear_focusing', **element_params)
+    dt_ref = element.length / 3e8 / n_steps_boris
+    element_ref = element_class(
+        bunch_pusher='boris', dt_bunch=dt_ref, **element_params)
+    element.track(bunch, show_progress_bar=False)
+    element_ref.track(bunch_ref, show_progress_bar=False)
+
+    for coord in ['x', 'y', 'xi', 'px', 'py', 'pz']:
+        q = getattr(bunch, coord)
+        q_ref = getattr(bunch_ref, coord)
+        np.testing.assert_allclose(q, q_ref, atol=rtol * np.std(q_ref))
+
+
+def test_linear_focusing_active_plasma_lens():
+    """
+    The field of an active plasma lens is constant, so the bunch can be
+    tracked through the whole lens in a single step.
+    """
+    lens = ActivePlasmaLens(3e-2, 1000, bunch_pusher='linear_focusing')
+    np.random.seed(0)
+    assert lens._get_optimized_dt(None) * 3e8 > 2.9e-2
+    check_against_boris(
+        ActivePlasmaLens, 10000, 1e-4, length=3e-2, foc_strength=1000)
+
+
+def test_linear_focusing_quadrupole():
+    """Test the linear focusing pusher in a quadrupole field."""
+    check_against_boris(
+        FieldQuadrupole, 10000, 1e-4, length=5e-2, foc_strength=100)
+
+
+def test_linear_focusing_blowout():
+    """
+    Test the linear focusing pusher in a `focusing_blowout` stage with a
+    linearly decreasing density.
+    """
+    def density(z):
+        return 1e23 * (1 - 20 * z)
+
+    check_against_boris(
+        PlasmaStage, 10000, 2e-3, length=1e-2, density=density,
+        wakefield_model='focusing_blowout')
+
+
+if __name__ == '__main__':
+    test_linear_focusing_active_plasma_lens()
+    test_linear_focusing_quadrupole()
+    test_linear_focusing_blowout()
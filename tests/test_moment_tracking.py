@@ -0,0 +1,104 @@
+import numpy as np
+from numpy.testing import assert_allclose
+
+from wake_t import (
+    Beamline, Drift, Dipole, Quadrupole, ActivePlasmaLens, PlasmaStage,
+    BeamMoments)
+from wake_t.beamline_elements import FieldQuadrupole
+from wake_t.diagnostics import analyze_bunch_list, analyze_beam_moments_list
+from wake_t.utilities.bunch_generation import get_gaussian_bunch_from_twiss
+
+
+# Parameters that are compared between particle and moment tracking.
+COMPARED_PARAMS = [
+    'prop_dist', 'x_avg', 'y_avg', 'theta_x', 'theta_y', 'sigma_x',
+    'sigma_y', 'sigma_z', 'alpha_x', 'alpha_y', 'beta_x', 'beta_y',
+    'emitt_x', 'emitt_y', 'avg_slice_emitt_x', 'avg_slice_emitt_y',
+    'avg_ene', 'rel_ene_spread', 'q_tot']
+
+
+def get_elements():
+    """Get the elements of a beamline with linear focusing elements."""
+    def density(z):
+        return 2e19 * (1 + z / 0.05)
+
+    return [
+        Drift(0.1, n_out=2),
+        Quadrupole(0.1, 5., n_out=2),
+        Drift(0.2, n_out=2),
+        ActivePlasmaLens(
+            0.03, 500., n_out=3, bunch_pusher='linear_focusing'),
+        Drift(0.1, n_out=2),
+        FieldQuadrupole(
+            0.05, -20., n_out=2, bunch_pusher='linear_focusing'),
+        PlasmaStage(
+            0.01, density, wakefield_model='focusing_blowout', n_out=3,
+            bunch_pusher='linear_focusing'),
+        Drift(0.1, n_out=2)
+    ]
+
+
+def test_moment_tracking():
+    """
+    Test that tracking the moments of a bunch through a beamline with
+    transfer-matrix and linear focusing elements gives the same parameters
+    as tracking the particles.
+    """
+    np.random.seed(0)
+    bunch = get_gaussian_bunch_from_twiss(
+        en_x=1e-6, en_y=2e-6, a_x=1, a_y=-0.5, b_x=1, b_y=2, ene=500,
+        ene_sp=0.1, s_t=10, xi_c=0, q_tot=100, n_part=100000)
+    moments = BeamMoments.from_bunch(bunch)
+
+    moments_list = Beamline(get_elements()).track_moments(moments)
+    bunch_list = Beamline(get_elements()).track(
+        bunch, show_progress_bar=False)
+    params_moments = analyze_beam_moments_list(moments_list)
+    params_bunch = analyze_bunch_list(bunch_list)
+
+    assert len(moments_list) == len(bunch_list)
+    assert_allclose(moments.prop_distance, bunch.prop_distance)
+    for param in COMPARED_PARAMS:
+        assert_allclose(
+            params_moments[param], params_bunch[param], rtol=5e-3,
+            atol=1e-3 * np.max(np.abs(params_bunch[param])))
+    # The peak current of a Gaussian profile is only approximately that of
+    # the binned current profile.
+    assert_allclose(
+        params_moments['i_peak'], params_bunch['i_peak'], rtol=5e-2)
+
+
+def test_moment_tracking_chromatic():
+    """
+    Test that the chromatic emittance growth in a plasma lens and the
+    longitudinal compression in a chicane are reproduced by the moment
+    tracking.
+    """
+    np.random.seed(0)
+    bunch = get_gaussian_bunch_from_twiss(
+        en_x=1e-6, en_y=1e-6, a_x=0, a_y=0, b_x=0.1, b_y=0.1, ene=500,
+        ene_sp=1, s_t=100, xi_c=0, q_tot=100, n_part=100000)
+    # Add a linear energy chirp.
+    bunch.pz -= 2e5 * bunch.xi
+
+    theta = 0.05
+    for elements in [
+        [ActivePlasmaLens(0.03, 500., n_out=3,
+                          bunch_pusher='linear_focusing'),
+         Drift(0.3, n_out=1)],
+        [Dipole(0.5, theta), Drift(0.5), Dipole(0.5, -theta), Drift(0.5),
+         Dipole(0.5, -theta), Drift(0.5), Dipole(0.5, theta, n_out=1)]
+    ]:
+        moments_list = Beamline(elements).track_moments(bunch)
+        bunch_list = Beamline(elements).track(
+            bunch.copy(), show_progress_bar=False)
+        params_moments = analyze_beam_moments_list(moments_list)
+        params_bunch = analyze_bunch_list(bunch_list)
+        for param in ['sigma_x', 'sigma_z', 'emitt_x', 'rel_ene_spread']:
+            assert_allclose(
+                params_moments[param], params_bunch[param], rtol=5e-3)
+
+
+if __name__ == '__main__':
+    test_moment_tracking()
+    test_moment_tracking_chromatic()
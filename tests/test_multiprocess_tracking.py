@@ -0,0 +1,149 @@
+import numpy as np
+from numpy.testing import assert_array_equal
+import pytest
+
+from wake_t import PlasmaStage
+from wake_t.fields.numerical_field import NumericalField
+from wake_t.tracking.process_pool import ParticleProcessPool
+from wake_t.utilities.bunch_generation import get_gaussian_bunch_from_size
+
+
+def test_multiprocess_tracking():
+    """
+    Test that evolving and depositing the particles of a bunch in several
+    processes gives the same result as tracking it in a single process, with
+    numerical wakefields (also with temporal interpolation, chunks and
+    particle losses) and with analytical fields and fused tracking. With the
+    adaptive pusher, the error of the particles of each process is
+    controlled separately, so that the results are only approximately equal.
+    """
+    def get_stages(n_processes):
+        return [
+            PlasmaStage(
+                1e-3, 1e23, wakefield_model='quasistatic_2d', n_out=2,
+                xi_min=-20e-6, xi_max=20e-6, r_max=50e-6, n_xi=80, n_r=100,
+                dz_fields=0.5e-3, n_processes=n_processes),
+            PlasmaStage(
+                1e-3, 1e23, wakefield_model='cold_fluid_1d', n_out=2,
+                xi_min=-20e-6, xi_max=20e-6, r_max=50e-6, n_xi=80, n_r=100,
+                dz_fields=0.5e-3, bunch_pusher='rk4',
+                field_time_interpolation='linear', n_processes=n_processes),
+            PlasmaStage(
+                1e-3, 1e23, wakefield_model='focusing_blowout', n_out=2,
+                fused_tracking=True, n_processes=n_processes),
+            PlasmaStage(
+                1e-3, 1e23, wakefield_model='focusing_blowout', n_out=2,
+                bunch_pusher='boris_adaptive', dt_bunch='auto',
+                n_processes=n_processes),
+        ]
+
+    tolerances = [1e-12, 1e-12, 1e-12, 1e-3]
+    np.random.seed(0)
+    bunch_0 = get_gaussian_bunch_from_size(
+        1e-6, 1e-6, 5e-6, 5e-6, 1000, 1, 10, 0, 100, 1e4)
+    for i, tolerance in enumerate(tolerances):
+        bunch = bunch_0.copy()
+        bunch_mp = bunch_0.copy()
+        if i == 0:
+            # Evolve each process in chunks and remove particles.
+            bunch_mp.set_chunk_size(300)
+            for b in [bunch, bunch_mp]:
+                b.set_particle_boundaries(r_max=2e-6)
+        out = get_stages(1)[i].track(bunch, show_progress_bar=False)
+        out_mp = get_stages(2)[i].track(bunch_mp, show_progress_bar=False)
+
+        # After tracking, the bunch is no longer in shared memory.
+        assert bunch_mp.process_pool is None
+        assert bunch_mp.is_contiguous
+        assert bunch_mp.n_lost == bunch.n_lost
+        assert len(out_mp) == len(out)
+        for b, b_mp in zip(out, out_mp):
+            mat, mat_mp = b.get_6D_matrix(), b_mp.get_6D_matrix()
+            error = np.abs(mat_mp - mat) / np.std(mat, axis=1)[:, np.newaxis]
+            assert np.max(error) <= tolerance
+
+
+def test_multiprocess_tracking_errors():
+    """
+    Test that the worker processes are stopped when an error occurs during
+    tracking, and that unsupported tracking options are rejected.
+    """
+    def density(z):
+        # Fail when computing the wakefields in the middle of the stage.
+        if np.ndim(z) == 0 and z > 0.5e-3:
+            raise RuntimeError('Density not available.')
+        return np.ones_like(z) * 1e23
+
+    np.random.seed(0)
+    bunch = get_gaussian_bunch_from_size(
+        1e-6, 1e-6, 5e-6, 5e-6, 1000, 1, 10, 0, 100, 1e4)
+    stage = PlasmaStage(
+        1e-3, density, wakefield_model='quasistatic_2d', n_out=2,
+        xi_min=-20e-6, xi_max=20e-6, r_max=50e-6, n_xi=80, n_r=100,
+        dz_fields=0.25e-3, n_processes=2)
+    with pytest.raises(RuntimeError):
+        stage.track(bunch, show_progress_bar=False)
+    assert bunch.process_pool is None
+    assert bunch.is_contiguous
+
+    stage = PlasmaStage(
+        1e-3, 1e23, wakefield_model='focusing_blowout', n_out=2,
+        n_energy_classes=2, n_processes=2)
+    with pytest.raises(ValueError):
+        stage.track(bunch, show_progress_bar=False)
+
+
+def test_process_pool():
+    """
+    Test that the data of a bunch is shared with the worker processes, that
+    it is shared again after being reallocated, and that unsupported fields
+    and bunches are rejected.
+    """
+    np.random.seed(0)
+    bunch = get_gaussian_bunch_from_size(
+        1e-6, 1e-6, 5e-6, 5e-6, 1000, 1, 10, 0, 100, 1e4)
+    stage = PlasmaStage(
+        1e-3, 1e23, wakefield_model='focusing_blowout', n_out=2)
+    pool = ParticleProcessPool(2, stage.fields)
+    try:
+        pool.share_bunch(bunch)
+        assert bunch.process_pool is pool
+        x, y = bunch.x.copy(), bunch.y.copy()
+
+        # The processes deposit their particles on separate grids.
+        grid = np.zeros(3)
+        bunch.deposit(count_particles, grid)
+        assert_array_equal(grid, [len(x), len(x), 0.])
+
+        # A reallocated bunch is shared again.
+        bunch.set_particle_boundaries(r_max=np.std(x))
+        bunch.flag_lost_particles()
+        bunch.remove_lost_particles()
+        grid[:] = 0.
+        bunch.deposit(count_particles, grid)
+        assert grid[0] == len(bunch.x)
+
+        # Unknown bunches are rejected.
+        with pytest.raises(ValueError):
+            pool.evolve(bunch.copy(), stage.fields, 0., 1e-12, 'boris', 1e-3)
+    finally:
+        pool.close()
+    assert bunch.process_pool is None
+    assert_array_equal(bunch.x, x[np.sqrt(x**2 + y**2) <= np.std(x)])
+
+    with pytest.raises(ValueError):
+        ParticleProcessPool(2, [NumericalField(1e-12)])
+    with pytest.raises(ValueError):
+        ParticleProcessPool(1, stage.fields)
+
+
+def count_particles(chunk, grid):
+    """Count the particles of a chunk in the first two elements of `grid`."""
+    grid[0] += len(chunk.x)
+    grid[1] += np.count_nonzero(chunk.w)
+
+
+if __name__ == '__main__':
+    test_multiprocess_tracking()
+    test_multiprocess_tracking_errors()
+    test_process_pool()
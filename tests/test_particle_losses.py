@@ -0,0 +1,144 @@
+import numpy as np
+from numpy.testing import assert_array_equal, assert_allclose
+
+from wake_t import PlasmaStage
+from wake_t.tracking.tracker import Tracker
+from wake_t.utilities.bunch_generation import get_gaussian_bunch_from_twiss
+
+
+def test_flag_and_remove_lost_particles():
+    """
+    Test that the particles beyond the boundaries of a bunch are flagged,
+    accounted for and removed, both in regular and contiguous bunches.
+    """
+    for contiguous in [False, True]:
+        np.random.seed(0)
+        bunch = get_gaussian_bunch_from_twiss(
+            en_x=1e-6, en_y=1e-6, a_x=0, a_y=0, b_x=1e-3, b_y=1e-3, ene=10,
+            ene_sp=20, s_t=1, xi_c=0, q_tot=100, n_part=1000)
+        bunch.tags = np.arange(len(bunch.x))
+        if contiguous:
+            bunch.make_contiguous()
+        x, y, xi = bunch.x.copy(), bunch.y.copy(), bunch.xi.copy()
+        px, py, pz = bunch.px.copy(), bunch.py.copy(), bunch.pz.copy()
+        q_tot = np.sum(bunch.q)
+
+        # Without boundaries, no particle is lost.
+        assert bunch.flag_lost_particles() == 0
+        assert bunch.remove_lost_particles() == 0
+
+        r_max = np.std(x) * 2
+        xi_min = -np.std(xi)
+        gamma_min = 9.9
+        bunch.set_particle_boundaries(
+            r_max=r_max, xi_min=xi_min, gamma_min=gamma_min)
+        gamma = np.sqrt(1 + px**2 + py**2 + pz**2)
+        lost = ((np.sqrt(x**2 + y**2) > r_max) | (xi < xi_min) |
+                (gamma < gamma_min))
+        n_lost = np.count_nonzero(lost)
+        assert 0 < n_lost < len(x)
+
+        # Flagging the particles sets their weight to zero.
+        assert bunch.flag_lost_particles() == n_lost
+        assert bunch.flag_lost_particles() == n_lost
+        assert np.all(bunch.w[lost] == 0)
+        assert bunch.n_lost == n_lost
+        assert_allclose(bunch.lost_charge + np.sum(bunch.q), q_tot)
+
+        # Copies keep the record of lost particles.
+        bunch_copy = bunch.copy()
+        assert bunch_copy.n_lost == n_lost
+        assert bunch_copy.remove_lost_particles() == n_lost
+
+        # Remove particles.
+        assert bunch.remove_lost_particles() == n_lost
+        assert bunch.remove_lost_particles() == 0
+        assert bunch.is_contiguous == contiguous
+        assert_array_equal(bunch.tags, np.nonzero(~lost)[0])
+        assert_array_equal(bunch.get_6D_matrix(), np.array(
+            [x, px, y, py, xi, pz])[:, ~lost])
+        assert bunch.n_lost == n_lost
+        assert_allclose(bunch.lost_charge + np.sum(bunch.q), q_tot)
+        for array in bunch.get_field_arrays() + bunch.get_rk4_arrays():
+            assert len(array) == len(bunch.x)
+
+
+def test_particle_losses_in_tracker():
+    """
+    Test that the particles that slip behind a boundary during tracking are
+    removed, and that the remaining ones evolve as without boundaries.
+    """
+    t_final = 1e-10
+    xi_min = -150e-6
+    # Low-energy bunch, whose particles slip at different rates.
+    np.random.seed(0)
+    bunch_0 = get_gaussian_bunch_from_twiss(
+        en_x=1e-6, en_y=1e-6, a_x=0, a_y=0, b_x=1e-3, b_y=1e-3, ene=10,
+        ene_sp=20, s_t=1, xi_c=0, q_tot=100, n_part=1000)
+    for contiguous in [False, True]:
+        for fused_tracking in [False, True]:
+            bunch = bunch_0.copy()
+            bunch_ref = bunch_0.copy()
+            for b in [bunch, bunch_ref]:
+                b.tags = np.arange(len(b.x))
+            if contiguous:
+                bunch.make_contiguous()
+            bunch.set_particle_boundaries(xi_min=xi_min)
+            bunches_out = []
+            for b in [bunch, bunch_ref]:
+                tracker = Tracker(
+                    t_final=t_final, bunches=[b], dt_bunches=[t_final / 50],
+                    n_diags=5, show_progress_bar=False,
+                    fused_tracking=fused_tracking)
+                bunches_out.append(tracker.do_tracking()[0])
+
+            # In free space, all particles slip backwards monotonically.
+            lost = bunch_ref.xi < xi_min
+            assert 0 < np.count_nonzero(lost) < len(lost)
+            assert bunch.n_lost == np.count_nonzero(lost)
+            assert_allclose(bunch.lost_charge, np.sum(bunch_ref.q[lost]))
+            assert_array_equal(bunch.tags, bunch_ref.tags[~lost])
+            assert_array_equal(
+                bunch.get_6D_matrix(), bunch_ref.get_6D_matrix()[:, ~lost])
+
+            # The diagnostics do not contain lost particles.
+            for b_out, b_ref_out in zip(*bunches_out):
+                assert np.all(b_out.xi >= xi_min)
+                assert len(b_out.x) == np.count_nonzero(b_ref_out.xi >= xi_min)
+
+
+def test_all_particles_lost():
+    """
+    Test that a bunch keeps being tracked (without pushing it) when all of
+    its particles are lost, with an automatic time step, with energy classes
+    and with the adaptive pusher, also through subsequent elements.
+    """
+    stage_params = [
+        {'bunch_pusher': 'boris'},
+        {'bunch_pusher': 'rk4', 'n_energy_classes': 2},
+        {'bunch_pusher': 'boris_adaptive'},
+    ]
+    for params in stage_params:
+        np.random.seed(0)
+        bunch = get_gaussian_bunch_from_twiss(
+            en_x=1e-6, en_y=1e-6, a_x=0, a_y=0, b_x=1e-3, b_y=1e-3, ene=200,
+            ene_sp=1, s_t=1, xi_c=0, q_tot=100, n_part=1000)
+        q_tot = np.sum(bunch.q)
+        bunch.set_particle_boundaries(r_max=1e-9)
+        for i in range(2):
+            stage = PlasmaStage(
+                1e-3, 1e23, wakefield_model='focusing_blowout', n_out=3,
+                **params)
+            bunch_list = stage.track(bunch, show_progress_bar=False)
+            assert len(bunch.x) == 0
+            assert bunch.n_lost == 1000
+            assert_allclose(bunch.lost_charge, q_tot)
+            assert len(bunch_list) == 4
+            assert all(len(b.x) == 0 for b in bunch_list[1:])
+        assert_allclose(bunch.prop_distance, 2e-3)
+
+
+if __name__ == '__main__':
+    test_flag_and_remove_lost_particles()
+    test_particle_losses_in_tracker()
+    test_all_particles_lost()
@@ -0,0 +1,113 @@
+import numpy as np
+from numpy.testing import assert_allclose
+import pytest
+
+from wake_t import PlasmaStage
+from wake_t.utilities.bunch_generation import get_gaussian_bunch_from_twiss
+from wake_t.utilities.particle_merging import (
+    merge_macroparticles, get_moments)
+
+
+def test_merge_macroparticles():
+    """
+    Test that merging the macroparticles of a bunch reduces their number by
+    the requested factor and conserves the charge, average and covariance
+    of the coordinates.
+    """
+    # Correlated bunch with uneven macroparticle weights.
+    np.random.seed(0)
+    bunch_0 = get_gaussian_bunch_from_twiss(
+        en_x=1e-6, en_y=2e-6, a_x=1, a_y=-0.5, b_x=1e-3, b_y=2e-3,
+        ene=1000, ene_sp=1, s_t=10, xi_c=0, q_tot=100, n_part=100000)
+    bunch_0.pz -= 1e6 * bunch_0.xi
+    bunch_0.w *= np.random.uniform(0.5, 1.5, len(bunch_0.w))
+    for method in ['cells', 'resample']:
+        for contiguous in [False, True]:
+            bunch = bunch_0.copy()
+            bunch.tags = np.arange(len(bunch.x))
+            if contiguous:
+                bunch.make_contiguous()
+            n_part = len(bunch.x)
+            q_tot = np.sum(bunch.q)
+            mean, cov = get_moments(bunch.get_6D_matrix(), bunch.w)
+
+            errors = merge_macroparticles(bunch, 10, method=method)
+            assert 0.8 * n_part / 10 < len(bunch.x) <= n_part / 10
+            assert bunch.is_contiguous == contiguous
+            assert bunch.tags is None
+            assert max(errors.values()) < 1e-6
+            mean_new, cov_new = get_moments(bunch.get_6D_matrix(), bunch.w)
+            s = np.sqrt(np.diag(cov))
+            assert_allclose(np.sum(bunch.q), q_tot, rtol=1e-12)
+            assert np.all(np.abs(mean_new - mean) / s < 1e-6)
+            assert np.all(np.abs(cov_new - cov) / np.outer(s, s) < 1e-6)
+
+            # The pushers can be used on the new particles.
+            for array in bunch.get_field_arrays() + bunch.get_rk4_arrays():
+                assert len(array) == len(bunch.x)
+
+
+def test_merging_errors():
+    """
+    Test that the errors induced by merging without correcting the moments
+    are reported, and that the cell merging conserves the charge and the
+    average of the coordinates.
+    """
+    # Correlated bunch with uneven macroparticle weights.
+    np.random.seed(0)
+    bunch = get_gaussian_bunch_from_twiss(
+        en_x=1e-6, en_y=2e-6, a_x=1, a_y=-0.5, b_x=1e-3, b_y=2e-3,
+        ene=1000, ene_sp=1, s_t=10, xi_c=0, q_tot=100, n_part=100000)
+    bunch.pz -= 1e6 * bunch.xi
+    bunch.w *= np.random.uniform(0.5, 1.5, len(bunch.w))
+    mean, cov = get_moments(bunch.get_6D_matrix(), bunch.w)
+    errors = merge_macroparticles(bunch, 10, tolerance=None)
+    assert errors['charge'] < 1e-12
+    assert errors['mean'] < 1e-12
+    assert 1e-6 < errors['covariance'] < 0.5
+    mean_new, cov_new = get_moments(bunch.get_6D_matrix(), bunch.w)
+    s = np.sqrt(np.diag(cov))
+    assert_allclose(
+        np.max(np.abs(cov_new - cov) / np.outer(s, s)), errors['covariance'])
+
+    with pytest.raises(ValueError):
+        merge_macroparticles(bunch, 0.5)
+    with pytest.raises(ValueError):
+        merge_macroparticles(bunch, 2, method='unknown')
+
+
+def test_merging_in_tracker():
+    """
+    Test that the macroparticles of a bunch are merged at the beginning of
+    the tracking when they exceed the maximum number.
+    """
+    # Correlated bunch with uneven macroparticle weights.
+    np.random.seed(0)
+    bunch = get_gaussian_bunch_from_twiss(
+        en_x=1e-6, en_y=2e-6, a_x=1, a_y=-0.5, b_x=1e-3, b_y=2e-3,
+        ene=1000, ene_sp=1, s_t=10, xi_c=0, q_tot=100, n_part=20000)
+    bunch.pz -= 1e6 * bunch.xi
+    bunch.w *= np.random.uniform(0.5, 1.5, len(bunch.w))
+    bunch.set_macroparticle_merging(n_part_max=2000)
+    q_tot = np.sum(bunch.q)
+    plasma = PlasmaStage(
+        1e-3, 1e23, wakefield_model='focusing_blowout', n_out=2)
+    bunch_list = plasma.track(bunch, show_progress_bar=False)
+    assert len(bunch.x) <= 2000
+    assert max(bunch.merging_errors.values()) < 1e-6
+    assert_allclose(np.sum(bunch.q), q_tot, rtol=1e-12)
+    for bunch_out in bunch_list:
+        assert len(bunch_out.x) == len(bunch.x)
+
+    # Bunches below the maximum are not merged again.
+    bunch.merging_errors = None
+    x = bunch.x.copy()
+    plasma.track(bunch, show_progress_bar=False)
+    assert bunch.merging_errors is None
+    assert len(bunch.x) == len(x)
+
+
+if __name__ == '__main__':
+    test_merge_macroparticles()
+    test_merging_errors()
+    test_merging_in_tracker()
@@ -0,0 +1,30 @@
+import numpy as np
+
+from wake_t.particles.push.transfer_matrix import (
+    get_transfer_map, apply_transfer_map)
+
+
+def test_transfer_map():
+    """
+    Test that the compiled kernel applying a transfer map agrees with
+    a direct evaluation using `np.dot` and `np.einsum`.
+    """
+    np.random.seed(0)
+    n_part = 10000
+    beam_matrix = np.random.normal(
+        size=(6, n_part)) * np.array([[1e-6, 1e-5, 1e-6, 1e-5, 1e-6, 1e-2]]).T
+    for order in [1, 2]:
+        for theta, k1, k2 in [(0.01, 0., 0.), (0., 5., 0.), (0., 0., 50.),
+                              (0.02, -3., 10.)]:
+            R, T = get_transfer_map(
+                0.1, 0.5, theta, k1, k2, gamma_ref=1000, order=order)
+            bm_ref = np.dot(R, beam_matrix)
+            bm_ref += np.einsum(
+                'ijk,j...,k...', T, beam_matrix, beam_matrix).T
+            bm = beam_matrix.copy()
+            apply_transfer_map(bm, R, T)
+            np.testing.assert_allclose(bm, bm_ref, rtol=1e-12, atol=1e-20)
+
+
+if __name__ == '__main__':
+    test_transfer_map()
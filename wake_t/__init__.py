@@ -7,9 +7,10 @@ from .physics_models.collective_effects.csr import set_csr_settings
 from .physics_models.laser.laser_pulse import (
     GaussianPulse, LaguerreGaussPulse, FlattenedGaussianPulse)
 from .particles.particle_bunch import ParticleBunch
+from .particles.beam_moments import BeamMoments
 
 
 __all__ = ['__version__', 'PlasmaStage', 'PlasmaRamp', 'ActivePlasmaLens',
            'Drift', 'Dipole', 'Quadrupole', 'Sextupole', 'Beamline',
            'set_csr_settings', 'GaussianPulse', 'LaguerreGaussPulse',
-           'FlattenedGaussianPulse', 'ParticleBunch']
+           'FlattenedGaussianPulse', 'ParticleBunch', 'BeamMoments']
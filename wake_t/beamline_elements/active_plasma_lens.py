@@ -41,7 +41,11 @@ class ActivePlasmaLens(PlasmaStage):
     bunch_pusher : str
         The pusher used to evolve the particle bunches in time within
         the specified fields. Possible values are ``'rk4'`` (Runge-Kutta
-        method of 4th order) or ``'boris'`` (Boris method).
+        method of 4th order), ``'boris'`` (Boris method),
+        ``'boris_adaptive'`` (Boris method with error control, which
+        determines the next time step if ``dt_bunch='auto'``) or
+        ``'linear_focusing'`` (analytic integration of linear focusing
+        fields, which allows for much larger time steps).
     dt_bunch : float
         The time step for evolving the particle bunches. If ``None``, it will
         be automatically set to :math:`dt = T/(10*2*pi)`, where T is the
@@ -65,6 +69,28 @@ class ActivePlasmaLens(PlasmaStage):
         convergence studies more difficult to interpret,
         since the number of pushes will depend on `n_diags`. Therefore,
         it is exposed as an option so that it can be disabled if needed.
+    fused_tracking : bool, optional
+        Whether to evolve each bunch between outputs in a single compiled
+        kernel, where all time steps are carried out for each particle
+        before moving to the next one. Only possible when all fields are
+        analytical (e.g., if ``wakefields=False``) and the ``'boris'``
+        pusher is used. By default ``False``.
+    pusher_tolerance : float, optional
+        Error tolerance of the ``'boris_adaptive'`` pusher. The local error of
+        each particle is normalized to the RMS spread of the bunch in each
+        phase-space coordinate. By default ``1e-3``.
+    n_energy_classes : int, optional
+        Number of energy classes into which the particles of the bunches
+        with ``dt_bunch='auto'`` are grouped. Each class spans a factor 4 in
+        energy and is evolved with its own time step, so that the
+        high-energy particles are not pushed with the time step required by
+        the low-energy ones. All classes are synchronized at the field
+        updates and outputs. By default ``1`` (no sub-cycling).
+    n_processes : int, optional
+        Number of processes in which to evolve the particles of the bunches.
+        If larger than ``1``, the particles of each bunch are divided among
+        a pool of worker processes that share the bunch data and the field
+        grids through shared memory. By default ``1``.
     n_out : int
         Number of times along the lens in which the particle distribution
         should be returned (A list with all output bunches is returned
@@ -90,9 +116,14 @@ class ActivePlasmaLens(PlasmaStage):
         wakefields: bool = False,
         density: Optional[Union[float, Callable[[float], float]]] = None,
         wakefield_model: Optional[str] = 'quasistatic_2d',
-        bunch_pusher: Optional[Literal['boris', 'rk4']] = 'boris',
+        bunch_pusher: Optional[Literal[
+            'boris', 'boris_adaptive', 'rk4', 'linear_focusing']] = 'boris',
         dt_bunch: Optional[DtBunchType] = 'auto',
         push_bunches_before_diags: Optional[bool] = True,
+        fused_tracking: Optional[bool] = False,
+        pusher_tolerance: Optional[float] = 1e-3,
+        n_energy_classes: Optional[int] = 1,
+        n_processes: Optional[int] = 1,
         n_out: Optional[int] = 1,
         name: Optional[str] = 'Active plasma lens',
         **model_params
@@ -116,6 +147,10 @@ class ActivePlasmaLens(PlasmaStage):
             bunch_pusher=bunch_pusher,
             dt_bunch=dt_bunch,
             push_bunches_before_diags=push_bunches_before_diags,
+            fused_tracking=fused_tracking,
+            pusher_tolerance=pusher_tolerance,
+            n_energy_classes=n_energy_classes,
+            n_processes=n_processes,
             n_out=n_out,
             name=name,
             external_fields=[self.apl_field],
@@ -127,6 +162,9 @@ class ActivePlasmaLens(PlasmaStage):
         # If plasma wakefields are active, use default dt.
         if self.wakefields:
             dt = super()._get_optimized_dt(beam)
+        # The linear focusing pusher is exact in the constant APL field.
+        elif self.bunch_pusher == 'linear_focusing':
+            dt = self.length / ct.c
         # Otherwise, determine dt from the APL focusing strength.
         else:
             # Get minimum gamma in the bunch (assumes px,py << pz).
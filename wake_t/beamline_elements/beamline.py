@@ -2,19 +2,36 @@ from typing import Optional, Union, List
 
 from wake_t.diagnostics import OpenPMDDiagnostics
 from wake_t.particles.particle_bunch import ParticleBunch
+from wake_t.particles.beam_moments import BeamMoments
+from .tm_elements import (
+    TMElement, can_be_fused, track_fused_tm_elements)
 
 
 class Beamline():
     """
     Class for grouping beamline elements and allowing easier tracking.
 
+    Parameters
+    ----------
+    elements : list
+        List of beamline elements.
+    fuse_tm_elements : bool, optional
+        Whether to track consecutive transfer-matrix elements (`Drift`,
+        `Dipole`, `Quadrupole`, `Sextupole`) with a single transfer map,
+        truncated at second order, which is applied in a single pass over
+        the particles. This is only done for elements without CSR, without
+        intermediate outputs (i.e., ``n_out=None``) and with the same
+        reference energy. By default ``True``.
+
     """
 
     def __init__(
         self,
-        elements: List
+        elements: List,
+        fuse_tm_elements: Optional[bool] = True
     ) -> None:
         self.elements = elements
+        self.fuse_tm_elements = fuse_tm_elements
 
     def track(
         self,
@@ -29,7 +46,9 @@ class Beamline():
         Parameters
         ----------
         bunches : ParticleBunch or list of ParticleBunch
-            Particle bunches to be tracked.
+            Particle bunches to be tracked. Several bunches are tracked
+            together through the transfer-matrix elements, sharing the same
+            transfer map (see `TMElement.track`).
         opmd_diag : bool or OpenPMDDiagnostics
             Determines whether to write simulation diagnostics to disk (i.e.
             particle distributions and fields). The output is written to
@@ -47,18 +66,92 @@ class Beamline():
 
         Returns
         -------
-        A list of size 'n_out' containing the bunch distribution at each step.
+        A list containing the bunch distribution at each output step of the
+        elements. If several bunches are tracked, a list containing one such
+        list per bunch.
 
         """
-        bunch_list = []
+        n_bunches = len(bunches) if isinstance(bunches, list) else 1
+        if n_bunches > 1:
+            bunch_list = [[] for i in range(n_bunches)]
+        else:
+            bunch_list = []
         if type(opmd_diag) is not OpenPMDDiagnostics and opmd_diag:
             opmd_diag = OpenPMDDiagnostics(write_dir=diag_dir)
-        for element in self.elements:
-            bunch_list.extend(
-                element.track(
+        i = 0
+        while i < len(self.elements):
+            # Group consecutive elements that can be tracked with a single
+            # transfer map.
+            i_next = i + 1
+            if self.fuse_tm_elements and bunches:
+                while (
+                    i_next < len(self.elements) and
+                    can_be_fused(self.elements[i_next - 1],
+                                 self.elements[i_next])
+                ):
+                    i_next += 1
+            if i_next - i > 1:
+                output = track_fused_tm_elements(
+                    self.elements[i:i_next],
+                    bunches,
+                    opmd_diag=opmd_diag if opmd_diag else None,
+                    show_progress_bar=show_progress_bar,
+                )
+            else:
+                output = self.elements[i].track(
                     bunches,
                     opmd_diag=opmd_diag,
                     show_progress_bar=show_progress_bar,
                 )
-            )
+            if n_bunches > 1:
+                for bunch_list_i, output_i in zip(bunch_list, output):
+                    bunch_list_i.extend(output_i)
+            else:
+                bunch_list.extend(output)
+            i = i_next
         return bunch_list
+
+    def track_moments(
+        self,
+        moments: Union[ParticleBunch, BeamMoments],
+        n_steps: Optional[int] = 100,
+    ) -> List[BeamMoments]:
+        """
+        Track the first and second moments of a bunch through the beamline.
+
+        This is a fast alternative to particle tracking for beamlines made
+        of transfer-matrix elements and linear focusing elements (active
+        plasma lenses without wakefields, field quadrupoles and plasma
+        stages with the ``'focusing_blowout'`` model). The moments are
+        propagated through the transfer map of each element (up to second
+        order) assuming that the initial distribution is Gaussian.
+        Collective effects, such as CSR, are not included. The beam
+        parameters along the beamline can be obtained with
+        `analyze_beam_moments_list`.
+
+        Parameters
+        ----------
+        moments : ParticleBunch or BeamMoments
+            Beam moments to be tracked, which are updated in place. If a
+            particle bunch is given, its moments are computed first (and
+            the bunch itself is not modified).
+        n_steps : int, optional
+            Number of steps in which each field element is divided for
+            computing its transfer map. By default ``100``.
+
+        Returns
+        -------
+        A list containing the beam moments at each output step of the
+        elements (as determined by their `n_out`).
+
+        """
+        if isinstance(moments, ParticleBunch):
+            moments = BeamMoments.from_bunch(moments)
+        moments_list = []
+        for element in self.elements:
+            if isinstance(element, TMElement):
+                moments_list.extend(element.track_moments(moments))
+            else:
+                moments_list.extend(
+                    element.track_moments(moments, n_steps=n_steps))
+        return moments_list
@@ -1,11 +1,26 @@
 from typing import Optional, Union, List, Literal
 
+import numpy as np
 import scipy.constants as ct
 
 from wake_t.diagnostics import OpenPMDDiagnostics
 from wake_t.tracking.tracker import Tracker
 from wake_t.fields.base import Field
+from wake_t.fields.gather import gather_fields
 from wake_t.particles.particle_bunch import ParticleBunch
+from wake_t.particles.beam_moments import BeamMoments
+from wake_t.particles.push.transfer_matrix import (
+    get_linear_focusing_map, compose_transfer_maps)
+from wake_t.physics_models.em_fields.linear_b_theta import LinearBThetaField
+from wake_t.physics_models.em_fields.quadrupole import QuadrupoleField
+from wake_t.physics_models.plasma_wakefields.focusing_blowout import (
+    FocusingBlowoutField)
+
+
+# Fields that are linear in the transverse coordinates and do not change the
+# particle energy, which are supported by `FieldElement.track_moments`.
+LINEAR_FOCUSING_FIELDS = (
+    LinearBThetaField, QuadrupoleField, FocusingBlowoutField)
 
 
 class FieldElement():
@@ -25,7 +40,11 @@ class FieldElement():
     bunch_pusher : str
         The pusher used to evolve the particle bunches in time within
         the specified fields. Possible values are ``'rk4'`` (Runge-Kutta
-        method of 4th order) or ``'boris'`` (Boris method).
+        method of 4th order), ``'boris'`` (Boris method),
+        ``'boris_adaptive'`` (Boris method with error control, which
+        determines the next time step if ``dt_bunch='auto'``) or
+        ``'linear_focusing'`` (analytic integration of linear focusing
+        fields, which allows for much larger time steps).
     n_out : int
         Number of times along the stage in which the particle distribution
         should be returned (A list with all output bunches is returned
@@ -53,6 +72,28 @@ class FieldElement():
         convergence studies more difficult to interpret,
         since the number of pushes will depend on `n_diags`. Therefore,
         it is exposed as an option so that it can be disabled if needed.
+    fused_tracking : bool, optional
+        Whether to evolve each bunch between outputs in a single compiled
+        kernel, where all time steps are carried out for each particle
+        before moving to the next one. This removes the overhead of
+        evolving the bunches step by step. Only possible when all fields are
+        analytical and the ``'boris'`` pusher is used. By default ``False``.
+    pusher_tolerance : float, optional
+        Error tolerance of the ``'boris_adaptive'`` pusher. The local error of
+        each particle is normalized to the RMS spread of the bunch in each
+        phase-space coordinate. By default ``1e-3``.
+    n_energy_classes : int, optional
+        Number of energy classes into which the particles of the bunches
+        with ``dt_bunch='auto'`` are grouped. Each class spans a factor 4 in
+        energy and is evolved with its own time step, so that the
+        high-energy particles are not pushed with the time step required by
+        the low-energy ones. All classes are synchronized at the field
+        updates and outputs. By default ``1`` (no sub-cycling).
+    n_processes : int, optional
+        Number of processes in which to evolve the particles of the bunches.
+        If larger than ``1``, the particles of each bunch are divided among
+        a pool of worker processes that share the bunch data and the field
+        grids through shared memory. By default ``1``.
 
     """
 
@@ -60,12 +101,17 @@ class FieldElement():
         self,
         length: float,
         dt_bunch: Union[float, str, List[Union[float, str]]],
-        bunch_pusher: Optional[Literal['boris', 'rk4']] = 'boris',
+        bunch_pusher: Optional[Literal[
+            'boris', 'boris_adaptive', 'rk4', 'linear_focusing']] = 'boris',
         n_out: Optional[int] = 1,
         name: Optional[str] = 'field element',
         fields: Optional[List[Field]] = [],
         auto_dt_bunch: Optional[str] = None,
         push_bunches_before_diags: Optional[bool] = True,
+        fused_tracking: Optional[bool] = False,
+        pusher_tolerance: Optional[float] = 1e-3,
+        n_energy_classes: Optional[int] = 1,
+        n_processes: Optional[int] = 1,
     ) -> None:
         self.length = length
         self.bunch_pusher = bunch_pusher
@@ -75,6 +121,10 @@ class FieldElement():
         self.fields = fields
         self.auto_dt_bunch = auto_dt_bunch
         self.push_bunches_before_diags = push_bunches_before_diags
+        self.fused_tracking = fused_tracking
+        self.pusher_tolerance = pusher_tolerance
+        self.n_energy_classes = n_energy_classes
+        self.n_processes = n_processes
 
     def track(
         self,
@@ -141,7 +191,11 @@ class FieldElement():
             auto_dt_bunch_f=self.auto_dt_bunch,
             push_bunches_before_diags=self.push_bunches_before_diags,
             show_progress_bar=show_progress_bar,
-            section_name=self.name
+            section_name=self.name,
+            fused_tracking=self.fused_tracking,
+            pusher_tolerance=self.pusher_tolerance,
+            n_energy_classes=self.n_energy_classes,
+            n_processes=self.n_processes,
         )
 
         # Do tracking.
@@ -152,3 +206,74 @@ class FieldElement():
             bunch_list = bunch_list[0]
 
         return bunch_list
+
+    def track_moments(
+        self,
+        moments: BeamMoments,
+        n_steps: Optional[int] = 100,
+    ) -> List[BeamMoments]:
+        """
+        Track the first and second moments of a bunch through the element.
+
+        Only possible if all fields of the element are linear focusing
+        fields (i.e., those of an active plasma lens without wakefields, a
+        field quadrupole or a plasma stage with the ``'focusing_blowout'``
+        model). The transfer map of each step is computed from the field
+        gradients at the average position of the bunch, including the
+        chromatic terms up to second order.
+
+        Parameters
+        ----------
+        moments : BeamMoments
+            Beam moments to be tracked. They are updated in place.
+        n_steps : int, optional
+            Number of steps in which the element is divided for computing
+            the transfer map. Only relevant if the fields change along the
+            element (e.g., in a plasma stage with a longitudinal density
+            profile). By default ``100``.
+
+        Returns
+        -------
+        A list containing the beam moments at the beginning of the element
+        and at each of the 'n_out' steps, as in `track`.
+
+        """
+        for field in self.fields:
+            if not isinstance(field, LINEAR_FOCUSING_FIELDS):
+                raise ValueError(
+                    'Moment tracking is not supported for fields of type '
+                    '{}.'.format(type(field).__name__))
+        moments.set_reference_energy(moments.mean_gamma)
+        q_over_m = moments.q_species / moments.m_species
+        n_sub = max(1, int(np.ceil(n_steps / self.n_out)))
+        l_out = self.length / self.n_out
+        l_step = l_out / n_sub
+        prop_distance = moments.prop_distance
+        output_moments_list = [moments.copy()]
+        for i in range(self.n_out):
+            R = np.identity(6)
+            T = np.zeros((6, 6, 6))
+            for j in range(n_sub):
+                z_mid = (i * n_sub + j + 0.5) * l_step
+                gradients = self._get_linear_field_gradients(
+                    -moments.mean[4], z_mid / ct.c)
+                R_step, T_step = get_linear_focusing_map(
+                    l_step, *gradients, moments.gamma_ref, q_over_m)
+                R, T = compose_transfer_maps(R, T, R_step, T_step)
+            moments.apply_transfer_map(R, T)
+            moments.prop_distance = prop_distance + (i + 1) * l_out
+            output_moments_list.append(moments.copy())
+        return output_moments_list
+
+    def _get_linear_field_gradients(self, xi, t, d=1e-6):
+        """
+        Get the transverse gradients (dEx/dx, dEy/dy, dBx/dy, dBy/dx) of the
+        fields at position `xi` and time `t`.
+        """
+        x = np.array([0., d, 0.])
+        y = np.array([0., 0., d])
+        xi = np.full(3, xi)
+        ex, ey, ez, bx, by, bz = np.zeros((6, 3))
+        gather_fields(self.fields, x, y, xi, t, ex, ey, ez, bx, by, bz)
+        return ((ex[1] - ex[0]) / d, (ey[2] - ey[0]) / d,
+                (bx[2] - bx[0]) / d, (by[1] - by[0]) / d)
@@ -30,7 +30,11 @@ class FieldQuadrupole(FieldElement):
     bunch_pusher : str
         The pusher used to evolve the particle bunches in time within
         the specified fields. Possible values are ``'rk4'`` (Runge-Kutta
-        method of 4th order) or ``'boris'`` (Boris method).
+        method of 4th order), ``'boris'`` (Boris method),
+        ``'boris_adaptive'`` (Boris method with error control, which
+        determines the next time step if ``dt_bunch='auto'``) or
+        ``'linear_focusing'`` (analytic integration of linear focusing
+        fields, which allows for much larger time steps).
     n_out : int, optional
         Number of times along the lens in which the particle distribution
         should be returned (A list with all output bunches is returned
@@ -38,6 +42,27 @@ class FieldQuadrupole(FieldElement):
     name : str, optional
         Name of the quadrupole. This is only used for displaying the
         progress bar during tracking. By default, 'quadrupole'
+    fused_tracking : bool, optional
+        Whether to evolve each bunch between outputs in a single compiled
+        kernel, where all time steps are carried out for each particle
+        before moving to the next one. Only possible with the ``'boris'``
+        pusher. By default ``False``.
+    pusher_tolerance : float, optional
+        Error tolerance of the ``'boris_adaptive'`` pusher. The local error of
+        each particle is normalized to the RMS spread of the bunch in each
+        phase-space coordinate. By default ``1e-3``.
+    n_energy_classes : int, optional
+        Number of energy classes into which the particles of the bunches
+        with ``dt_bunch='auto'`` are grouped. Each class spans a factor 4 in
+        energy and is evolved with its own time step, so that the
+        high-energy particles are not pushed with the time step required by
+        the low-energy ones. All classes are synchronized at the field
+        updates and outputs. By default ``1`` (no sub-cycling).
+    n_processes : int, optional
+        Number of processes in which to evolve the particles of the bunches.
+        If larger than ``1``, the particles of each bunch are divided among
+        a pool of worker processes that share the bunch data and the field
+        grids through shared memory. By default ``1``.
     """
 
     def __init__(
@@ -45,9 +70,14 @@ class FieldQuadrupole(FieldElement):
         length: float,
         foc_strength: float,
         dt_bunch: Optional[DtBunchType] = 'auto',
-        bunch_pusher: Literal['boris', 'rk4'] = 'boris',
+        bunch_pusher: Literal[
+            'boris', 'boris_adaptive', 'rk4', 'linear_focusing'] = 'boris',
         n_out: Optional[int] = 1,
         name: Optional[str] = 'quadrupole',
+        fused_tracking: Optional[bool] = False,
+        pusher_tolerance: Optional[float] = 1e-3,
+        n_energy_classes: Optional[int] = 1,
+        n_processes: Optional[int] = 1,
     ) -> None:
         self.foc_strength = foc_strength
         super().__init__(
@@ -58,10 +88,18 @@ class FieldQuadrupole(FieldElement):
             name=name,
             fields=[QuadrupoleField(foc_strength)],
             auto_dt_bunch=self._get_optimized_dt,
+            fused_tracking=fused_tracking,
+            pusher_tolerance=pusher_tolerance,
+            n_energy_classes=n_energy_classes,
+            n_processes=n_processes,
         )
 
     def _get_optimized_dt(self, beam):
         """ Get tracking time step. """
+        # The linear focusing pusher is exact in the constant quadrupole
+        # field.
+        if self.bunch_pusher == 'linear_focusing':
+            return self.length / ct.c
         # Get minimum gamma in the bunch (assumes px,py << pz).
         q_over_m = beam.q_species / beam.m_species
         min_gamma = np.sqrt(np.min(beam.pz)**2 + 1)
@@ -88,7 +88,11 @@ class PlasmaRamp(PlasmaStage):
     bunch_pusher : str
         The pusher used to evolve the particle bunches in time within
         the specified fields. Possible values are ``'rk4'`` (Runge-Kutta
-        method of 4th order) or ``'boris'`` (Boris method).
+        method of 4th order), ``'boris'`` (Boris method),
+        ``'boris_adaptive'`` (Boris method with error control, which
+        determines the next time step if ``dt_bunch='auto'``) or
+        ``'linear_focusing'`` (analytic integration of linear focusing
+        fields, which allows for much larger time steps).
     dt_bunch : float
         The time step for evolving the particle bunches. If ``None``, it will
         be automatically set to :math:`dt = T/(10*2*pi)`, where T is the
@@ -110,6 +114,28 @@ class PlasmaRamp(PlasmaStage):
         convergence studies more difficult to interpret,
         since the number of pushes will depend on `n_diags`. Therefore,
         it is exposed as an option so that it can be disabled if needed.
+    fused_tracking : bool, optional
+        Whether to evolve each bunch between outputs in a single compiled
+        kernel, where all time steps are carried out for each particle
+        before moving to the next one. Only possible when all fields are
+        analytical (e.g., ``'simple_blowout'`` or ``'focusing_blowout'``
+        models) and the ``'boris'`` pusher is used. By default ``False``.
+    pusher_tolerance : float, optional
+        Error tolerance of the ``'boris_adaptive'`` pusher. The local error of
+        each particle is normalized to the RMS spread of the bunch in each
+        phase-space coordinate. By default ``1e-3``.
+    n_energy_classes : int, optional
+        Number of energy classes into which the particles of the bunches
+        with ``dt_bunch='auto'`` are grouped. Each class spans a factor 4 in
+        energy and is evolved with its own time step, so that the
+        high-energy particles are not pushed with the time step required by
+        the low-energy ones. All classes are synchronized at the field
+        updates and outputs. By default ``1`` (no sub-cycling).
+    n_processes : int, optional
+        Number of processes in which to evolve the particles of the bunches.
+        If larger than ``1``, the particles of each bunch are divided among
+        a pool of worker processes that share the bunch data and the field
+        grids through shared memory. By default ``1``.
     n_out : int
         Number of times along the stage in which the particle distribution
         should be returned (A list with all output bunches is returned
@@ -138,9 +164,14 @@ class PlasmaRamp(PlasmaStage):
         plasma_dens_top: Optional[float] = None,
         plasma_dens_down: Optional[float] = None,
         position_down: Optional[float] = None,
-        bunch_pusher: Optional[Literal['boris', 'rk4']] = 'boris',
+        bunch_pusher: Optional[Literal[
+            'boris', 'boris_adaptive', 'rk4', 'linear_focusing']] = 'boris',
         dt_bunch: Optional[DtBunchType] = 'auto',
         push_bunches_before_diags: Optional[bool] = True,
+        fused_tracking: Optional[bool] = False,
+        pusher_tolerance: Optional[float] = 1e-3,
+        n_energy_classes: Optional[int] = 1,
+        n_processes: Optional[int] = 1,
         n_out: Optional[int] = 1,
         name: Optional[str] = 'Plasma ramp',
         **model_params
@@ -167,6 +198,10 @@ class PlasmaRamp(PlasmaStage):
             bunch_pusher=bunch_pusher,
             dt_bunch=dt_bunch,
             push_bunches_before_diags=push_bunches_before_diags,
+            fused_tracking=fused_tracking,
+            pusher_tolerance=pusher_tolerance,
+            n_energy_classes=n_energy_classes,
+            n_processes=n_processes,
             n_out=n_out,
             name=name,
             **model_params
@@ -7,6 +7,7 @@ import scipy.constants as ct
 
 import wake_t.physics_models.plasma_wakefields as wf
 from wake_t.fields.base import Field
+from wake_t.fields.analytical_field import AnalyticalField
 from .field_element import FieldElement
 
 
@@ -40,7 +41,11 @@ class PlasmaStage(FieldElement):
     bunch_pusher : str, optional
         The pusher used to evolve the particle bunches in time within
         the specified fields. Possible values are ``'rk4'`` (Runge-Kutta
-        method of 4th order) or ``'boris'`` (Boris method).
+        method of 4th order), ``'boris'`` (Boris method),
+        ``'boris_adaptive'`` (Boris method with error control, which
+        determines the next time step if ``dt_bunch='auto'``) or
+        ``'linear_focusing'`` (analytic integration of linear focusing
+        fields, which allows for much larger time steps).
     dt_bunch : float, str or list of float or str, optional
         The time step for evolving the particle bunches. If ``'auto'``, it
         will be automatically set to ``dt = T/(10*2*pi)``, where T is the
@@ -62,6 +67,28 @@ class PlasmaStage(FieldElement):
         convergence studies more difficult to interpret,
         since the number of pushes will depend on `n_diags`. Therefore,
         it is exposed as an option so that it can be disabled if needed.
+    fused_tracking : bool, optional
+        Whether to evolve each bunch between outputs in a single compiled
+        kernel, where all time steps are carried out for each particle
+        before moving to the next one. Only possible when all fields are
+        analytical (e.g., ``'simple_blowout'`` or ``'focusing_blowout'``
+        models) and the ``'boris'`` pusher is used. By default ``False``.
+    pusher_tolerance : float, optional
+        Error tolerance of the ``'boris_adaptive'`` pusher. The local error of
+        each particle is normalized to the RMS spread of the bunch in each
+        phase-space coordinate. By default ``1e-3``.
+    n_energy_classes : int, optional
+        Number of energy classes into which the particles of the bunches
+        with ``dt_bunch='auto'`` are grouped. Each class spans a factor 4 in
+        energy and is evolved with its own time step, so that the
+        high-energy particles are not pushed with the time step required by
+        the low-energy ones. All classes are synchronized at the field
+        updates and outputs. By default ``1`` (no sub-cycling).
+    n_processes : int, optional
+        Number of processes in which to evolve the particles of the bunches.
+        If larger than ``1``, the particles of each bunch are divided among
+        a pool of worker processes that share the bunch data and the field
+        grids through shared memory. By default ``1``.
     n_out : int, optional
         Number of times along the stage in which the particle distribution
         should be returned (A list with all output bunches is returned
@@ -89,9 +116,14 @@ class PlasmaStage(FieldElement):
         length: float,
         density: Union[float, Callable[[float], float]],
         wakefield_model: Optional[str] = 'simple_blowout',
-        bunch_pusher: Optional[Literal['boris', 'rk4']] = 'boris',
+        bunch_pusher: Optional[Literal[
+            'boris', 'boris_adaptive', 'rk4', 'linear_focusing']] = 'boris',
         dt_bunch: Optional[DtBunchType] = 'auto',
         push_bunches_before_diags: Optional[bool] = True,
+        fused_tracking: Optional[bool] = False,
+        pusher_tolerance: Optional[float] = 1e-3,
+        n_energy_classes: Optional[int] = 1,
+        n_processes: Optional[int] = 1,
         n_out: Optional[int] = 1,
         name: Optional[str] = 'Plasma stage',
         external_fields: Optional[List[Field]] = [],
@@ -113,6 +145,10 @@ class PlasmaStage(FieldElement):
             fields=fields,
             auto_dt_bunch=self._get_optimized_dt,
             push_bunches_before_diags=push_bunches_before_diags,
+            fused_tracking=fused_tracking,
+            pusher_tolerance=pusher_tolerance,
+            n_energy_classes=n_energy_classes,
+            n_processes=n_processes,
         )
 
     def _get_density_profile(self, density):
@@ -141,6 +177,11 @@ class PlasmaStage(FieldElement):
 
     def _get_optimized_dt(self, beam):
         """ Get tracking time step. """
+        if (
+            self.bunch_pusher == 'linear_focusing' and
+            all(isinstance(f, AnalyticalField) for f in self.fields)
+        ):
+            return self._get_linear_focusing_dt(beam)
         # Get minimum gamma in the bunch (assumes px,py << pz).
         min_gamma = np.sqrt(np.min(beam.pz)**2 + 1)
         # calculate maximum focusing along stage.
@@ -153,3 +194,36 @@ class PlasmaStage(FieldElement):
         period_x = 1/w_x
         dt = 0.1*period_x
         return dt
+
+    def _get_linear_focusing_dt(self, beam):
+        """ Get tracking time step for the linear focusing pusher. """
+        # This pusher is exact in constant linear fields, so the time step
+        # is only limited by the variation of the focusing strength (i.e.,
+        # of the plasma density) and of the bunch energy.
+        t_final = self.length / ct.c
+        dt = t_final
+        z = np.linspace(0, self.length, 1000)
+        n_p = self.density(z)
+        n_p_max = np.max(n_p)
+        if n_p_max > 0:
+            min_gamma = np.sqrt(np.min(beam.pz)**2 + 1)
+            q_over_m = beam.q_species / beam.m_species
+            w_p = np.sqrt(n_p_max*ct.e**2/(ct.m_e*ct.epsilon_0))
+            max_kx = (ct.m_e/(2*ct.e*ct.c))*w_p**2
+            w_x2 = np.abs(q_over_m*ct.c * max_kx/min_gamma)
+            # The error due to keeping the focusing constant within each
+            # step scales as `t_final * dt**2 * d(w_x**2)/dt / 12`. Limit it
+            # to 1e-3.
+            dw_x2_dt = w_x2 / n_p_max * np.max(np.abs(np.gradient(n_p, z)))
+            dw_x2_dt *= ct.c
+            if dw_x2_dt > 0:
+                dt = min(dt, np.sqrt(12 * 1e-3 / (t_final * dw_x2_dt)))
+            # If the wakefield has a longitudinal component, allow for a
+            # maximum relative energy change of 5 % per step (assuming an
+            # accelerating field of the order of the wave-breaking field).
+            if (
+                self.wakefield is not None and
+                not isinstance(self.wakefield, wf.FocusingBlowoutField)
+            ):
+                dt = min(dt, 0.05 * min_gamma / w_p)
+        return dt
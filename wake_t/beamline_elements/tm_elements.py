@@ -5,8 +5,10 @@ import time
 import numpy as np
 import scipy.constants as ct
 
-from wake_t.particles.push.transfer_matrix import track_with_transfer_map
+from wake_t.particles.push.transfer_matrix import (
+    get_transfer_map, apply_transfer_map, compose_transfer_maps)
 from wake_t.particles.particle_bunch import ParticleBunch
+from wake_t.particles.beam_moments import BeamMoments
 from wake_t.utilities.other import print_progress_bar
 from wake_t.utilities.bunch_manipulation import (
     convert_to_ocelot_matrix, convert_from_ocelot_matrix, rotation_matrix_xz)
@@ -72,20 +74,25 @@ class TMElement():
 
     def track(
         self,
-        bunch: ParticleBunch,
+        bunches: Union[ParticleBunch, List[ParticleBunch]],
         backtrack: Optional[bool] = False,
         out_initial: Optional[bool] = False,
         opmd_diag: Optional[Union[bool, OpenPMDDiagnostics]] = False,
         diag_dir: Optional[str] = None,
         show_progress_bar: Optional[bool] = True,
-    ) -> List[ParticleBunch]:
+    ) -> Union[List[ParticleBunch], List[List[ParticleBunch]]]:
         """
         Track bunch through element.
 
         Parameters
         ----------
-        bunch : ParticleBunch
-            Particle bunch to be tracked.
+        bunches : ParticleBunch or list of ParticleBunch
+            Particle bunches to be tracked. Several bunches are tracked
+            together in a single buffer (each of them with respect to its
+            own reference orbit) using the same transfer map. If
+            `gamma_ref` is not specified, the average gamma of all bunches
+            is used. When CSR is active, it is calculated from the combined
+            line charge of all bunches.
         backtrack : bool
             Whether to perform the tracking backwards.
         out_initial : bool
@@ -107,12 +114,23 @@ class TMElement():
         Returns
         -------
         A list of size 'n_out' containing the bunch distribution at each step.
+        If several bunches are tracked, a list containing one such list per
+        bunch.
 
         """
-        # Convert bunch to ocelot units and reference frame
-        bunch_mat, g_avg = self._get_beam_matrix_for_tracking(bunch)
+        # Make sure `bunches` is a list.
+        if not isinstance(bunches, list):
+            bunches = [bunches]
+
+        # Convert bunches to ocelot units and reference frame, and join
+        # them in a single matrix.
         if self.gamma_ref is None:
-            self.gamma_ref = g_avg
+            self.gamma_ref = get_average_gamma(bunches)
+        bunch_mat = np.concatenate(
+            [self._get_beam_matrix_for_tracking(bunch)[0]
+             for bunch in bunches], axis=1)
+        bunch_q = np.concatenate([bunch.q for bunch in bunches])
+        bunch_slices = get_bunch_slices(bunches)
 
         # Add element to CSR calculator
         if self.csr_on:
@@ -140,39 +158,49 @@ class TMElement():
             n_steps = len(track_steps)
             st_0 = 'Tracking in {} step(s)... '.format(n_steps)
 
+        # Get transfer map of each step.
+        R, T = get_transfer_map(
+            l_step, self.length, -self.theta, self.k1, self.k2,
+            self.gamma_ref, order=self.order)
+
         # Start tracking
         start_time = time.time()
-        output_bunch_list = list()
+        output_bunch_lists = [list() for bunch in bunches]
         if out_initial:
-            output_bunch_list.append(bunch.copy())
+            for bunch, output_bunch_list in zip(bunches, output_bunch_lists):
+                output_bunch_list.append(bunch.copy())
             if opmd_diag is not None:
                 opmd_diag.write_diagnostics(
-                    0., l_step/ct.c, [output_bunch_list[-1]])
+                    0., l_step/ct.c, [bl[-1] for bl in output_bunch_lists])
         for i in track_steps:
             if show_progress_bar:
                 print_progress_bar(st_0, i+1, n_steps)
             l_curr = (i+1) * l_step * (1-2*backtrack)
             # Track with transfer matrix
-            bunch_mat = track_with_transfer_map(
-                bunch_mat, l_step, self.length, -self.theta, self.k1, self.k2,
-                self.gamma_ref, order=self.order)
+            apply_transfer_map(bunch_mat, R, T)
             # Apply CSR
             if self.csr_on:
-                self.csr_calculator.apply_csr(bunch_mat, bunch.q,
+                self.csr_calculator.apply_csr(bunch_mat, bunch_q,
                                               self.gamma_ref, self, l_curr)
-            # Add bunch to output list
+            # Add bunches to output lists
             if i in output_steps:
                 new_bunch_mat = convert_from_ocelot_matrix(
                     bunch_mat, self.gamma_ref)
-                new_bunch = self._create_new_bunch(
-                    bunch, new_bunch_mat, l_curr)
-                output_bunch_list.append(new_bunch)
+                for bunch, sl, output_bunch_list in zip(
+                        bunches, bunch_slices, output_bunch_lists):
+                    new_bunch = self._create_new_bunch(
+                        bunch, new_bunch_mat[:, sl], l_curr)
+                    output_bunch_list.append(new_bunch)
                 if opmd_diag is not None:
                     opmd_diag.write_diagnostics(
-                        l_curr/ct.c, l_step/ct.c, [output_bunch_list[-1]])
+                        l_curr/ct.c, l_step/ct.c,
+                        [bl[-1] for bl in output_bunch_lists])
 
         # Update bunch data
-        self._update_input_bunch(bunch, bunch_mat, output_bunch_list)
+        for bunch, sl, output_bunch_list in zip(
+                bunches, bunch_slices, output_bunch_lists):
+            self._update_input_bunch(
+                bunch, bunch_mat[:, sl], output_bunch_list)
 
         # Add element length to diagnostics position
         if opmd_diag is not None:
@@ -183,12 +211,58 @@ class TMElement():
             tracking_time = time.time() - start_time
             print('Done ({} s).'.format(tracking_time))
             print('-'*80)
-        return output_bunch_list
+
+        # If only tracking one bunch, do not return list of lists.
+        if len(output_bunch_lists) == 1:
+            return output_bunch_lists[0]
+        return output_bunch_lists
+
+    def track_moments(self, moments: BeamMoments) -> List[BeamMoments]:
+        """
+        Track the first and second moments of a bunch through the element.
+
+        The moments are propagated through the same transfer map used for
+        tracking the particles. CSR effects are not included.
+
+        Parameters
+        ----------
+        moments : BeamMoments
+            Beam moments to be tracked. They are updated in place.
+
+        Returns
+        -------
+        A list of size 'n_out' containing the beam moments at each step.
+
+        """
+        gamma_ref = self.gamma_ref
+        if gamma_ref is None:
+            gamma_ref = moments.mean_gamma
+        moments.set_reference_energy(gamma_ref)
+        n_steps = 1 if self.n_out is None else self.n_out
+        l_step = self.length / n_steps
+        R, T = get_transfer_map(
+            l_step, self.length, -self.theta, self.k1, self.k2, gamma_ref,
+            order=self.order)
+        theta_ref, x_ref = moments.theta_ref, moments.x_ref
+        prop_distance = moments.prop_distance
+        output_moments_list = list()
+        for i in range(n_steps):
+            l_curr = (i+1) * l_step
+            moments.apply_transfer_map(R, T)
+            moments.theta_ref, moments.x_ref = self._get_new_reference_orbit(
+                theta_ref, x_ref, l_curr)
+            moments.prop_distance = prop_distance + l_curr
+            if self.n_out is not None:
+                output_moments_list.append(moments.copy())
+        return output_moments_list
 
     def _get_beam_matrix_for_tracking(self, bunch):
         bunch_mat = bunch.get_6D_matrix()
-        # obtain with respect to reference displacement
-        bunch_mat[0] -= bunch.x_ref
+        # obtain with respect to reference displacement (on a copy, since the
+        # matrix can be a view of the bunch data)
+        if bunch.x_ref != 0:
+            bunch_mat = bunch_mat.copy()
+            bunch_mat[0] -= bunch.x_ref
         # rotate by the reference angle so that it enters normal to the element
         if bunch.theta_ref != 0:
             rot = rotation_matrix_xz(-bunch.theta_ref)
@@ -232,23 +306,30 @@ class TMElement():
         bunch.theta_ref = last_bunch.theta_ref
         bunch.x_ref = last_bunch.x_ref
 
-    def _create_new_bunch(self, old_bunch, new_bunch_mat, prop_dist):
+    def _get_new_reference_orbit(self, theta_ref, x_ref, prop_dist):
+        """
+        Get the reference angle and transverse displacement after
+        propagating a distance `prop_dist` along the element.
+        """
         if self.theta != 0:
             # angle rotated for prop_dist
             theta_step = self.theta*prop_dist/self.length
             # magnet bending radius
             rho = abs(self.length/self.theta)
             # new reference angle and transverse displacement
-            new_theta_ref = old_bunch.theta_ref + theta_step
+            new_theta_ref = theta_ref + theta_step
             sign = -theta_step/abs(theta_step)
             new_x_ref = (
-                old_bunch.x_ref +
-                sign*rho*(np.cos(new_theta_ref)-np.cos(old_bunch.theta_ref)))
+                x_ref + sign*rho*(np.cos(new_theta_ref)-np.cos(theta_ref)))
         else:
             # new reference angle and transverse displacement
-            new_theta_ref = old_bunch.theta_ref
-            new_x_ref = (old_bunch.x_ref + prop_dist *
-                         np.sin(old_bunch.theta_ref))
+            new_theta_ref = theta_ref
+            new_x_ref = x_ref + prop_dist * np.sin(theta_ref)
+        return new_theta_ref, new_x_ref
+
+    def _create_new_bunch(self, old_bunch, new_bunch_mat, prop_dist):
+        new_theta_ref, new_x_ref = self._get_new_reference_orbit(
+            old_bunch.theta_ref, old_bunch.x_ref, prop_dist)
         # new prop. distance
         new_prop_dist = old_bunch.prop_distance + prop_dist
         # rotate distribution if reference angle != 0
@@ -441,3 +522,138 @@ class Sextupole(TMElement):
     def _print_element_properties(self):
         g = self.k2 * self.gamma_ref*(ct.m_e*ct.c/ct.e)
         print('Sextupole gradient = {:1.4f} T/m^2'.format(g))
+
+
+def can_be_fused(element_1, element_2):
+    """
+    Whether two consecutive elements can be tracked together with a single
+    transfer map.
+
+    This is the case for transfer-matrix elements without CSR, without
+    intermediate outputs and with the same reference energy.
+    """
+    for element in [element_1, element_2]:
+        if (
+            not isinstance(element, TMElement) or element.csr_on or
+            element.n_out is not None
+        ):
+            return False
+    return element_1.gamma_ref == element_2.gamma_ref
+
+
+def track_fused_tm_elements(
+    elements: List[TMElement],
+    bunches: Union[ParticleBunch, List[ParticleBunch]],
+    opmd_diag: Optional[OpenPMDDiagnostics] = None,
+    show_progress_bar: Optional[bool] = True,
+) -> List[ParticleBunch]:
+    """
+    Track one or several bunches through consecutive transfer-matrix
+    elements with a single transfer map.
+
+    The transfer maps of all elements are composed into a single map
+    (truncated at second order), which is applied in a single pass over the
+    particles of all bunches. The reference orbit of each bunch is updated
+    as if the elements were tracked one by one. See `can_be_fused` for the
+    requirements of the elements.
+
+    Parameters
+    ----------
+    elements : list of TMElement
+        Elements to be tracked.
+    bunches : ParticleBunch or list of ParticleBunch
+        Particle bunches to be tracked.
+    opmd_diag : OpenPMDDiagnostics, optional
+        Diagnostics whose position should be updated after the tracking.
+    show_progress_bar : bool, optional
+        Whether to print information about the tracking. By default
+        ``True``.
+
+    Returns
+    -------
+    An empty list, since the elements have no intermediate outputs.
+
+    """
+    if not isinstance(bunches, list):
+        bunches = [bunches]
+
+    # Fused elements have no CSR, so the CSR trajectory is interrupted (as
+    # in `TMElement.track`).
+    get_csr_calculator().clear()
+
+    # Convert bunches to ocelot units and reference frame.
+    g_avg = get_average_gamma(bunches)
+    for element in elements:
+        if element.gamma_ref is None:
+            element.gamma_ref = g_avg
+    gamma_ref = elements[0].gamma_ref
+    bunch_mat = np.concatenate(
+        [elements[0]._get_beam_matrix_for_tracking(bunch)[0]
+         for bunch in bunches], axis=1)
+    bunch_slices = get_bunch_slices(bunches)
+
+    if show_progress_bar:
+        names = ', '.join(element.element_name for element in elements)
+        print('')
+        print('Fused elements ({})'.format(names))
+        print('-'*80)
+    start_time = time.time()
+
+    # Compose transfer maps of all elements.
+    R = np.identity(6)
+    T = np.zeros((6, 6, 6))
+    for element in elements:
+        R_el, T_el = get_transfer_map(
+            element.length, element.length, -element.theta, element.k1,
+            element.k2, gamma_ref, order=element.order)
+        R, T = compose_transfer_maps(R, T, R_el, T_el)
+    length = sum(element.length for element in elements)
+
+    # Track and convert back to the lab frame.
+    apply_transfer_map(bunch_mat, R, T)
+    new_bunch_mat = convert_from_ocelot_matrix(bunch_mat, gamma_ref)
+    for bunch, sl in zip(bunches, bunch_slices):
+        # Reference orbit of the bunch after all elements.
+        theta_ref = bunch.theta_ref
+        x_ref = bunch.x_ref
+        for element in elements:
+            theta_ref, x_ref = element._get_new_reference_orbit(
+                theta_ref, x_ref, element.length)
+        bunch_mat_i = new_bunch_mat[:, sl]
+        if theta_ref != 0:
+            rot = rotation_matrix_xz(theta_ref)
+            bunch_mat_i = np.dot(rot, bunch_mat_i)
+        bunch_mat_i[0] += x_ref
+
+        # Update bunch data.
+        bunch.set_phase_space_from_matrix(bunch_mat_i)
+        bunch.prop_distance += length
+        bunch.theta_ref = theta_ref
+        bunch.x_ref = x_ref
+
+    # Add length of all elements to diagnostics position.
+    if opmd_diag is not None:
+        opmd_diag.increase_z_pos(length)
+
+    if show_progress_bar:
+        tracking_time = time.time() - start_time
+        print('Done ({} s).'.format(tracking_time))
+        print('-'*80)
+    return []
+
+
+def get_average_gamma(bunches: List[ParticleBunch]) -> float:
+    """Get the average gamma of all particles in a list of bunches."""
+    g = np.concatenate(
+        [np.sqrt(1 + b.px**2 + b.py**2 + b.pz**2) for b in bunches])
+    w = np.concatenate([b.w for b in bunches])
+    return np.average(g, weights=w)
+
+
+def get_bunch_slices(bunches: List[ParticleBunch]) -> List[slice]:
+    """
+    Get the slices that select the particles of each bunch in a matrix
+    where all bunches have been concatenated.
+    """
+    n_part = np.cumsum([0] + [len(b.w) for b in bunches])
+    return [slice(i_0, i_1) for i_0, i_1 in zip(n_part[:-1], n_part[1:])]
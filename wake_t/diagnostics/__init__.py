@@ -1,9 +1,10 @@
 from .openpmd_diag import OpenPMDDiagnostics
 from .bunch_analysis import (
-    analyze_bunch, analyze_bunch_list, save_parameters_to_file,
-    read_parameters_from_file)
+    analyze_bunch, analyze_bunch_list, analyze_beam_moments_list,
+    save_parameters_to_file, read_parameters_from_file)
 
 
 __all__ = [
     'OpenPMDDiagnostics', 'analyze_bunch', 'analyze_bunch_list',
-    'save_parameters_to_file', 'read_parameters_from_file']
+    'analyze_beam_moments_list', 'save_parameters_to_file',
+    'read_parameters_from_file']
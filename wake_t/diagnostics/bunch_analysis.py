@@ -76,6 +76,20 @@ def analyze_bunch_list(
     return bunch_list_params
 
 
+def analyze_beam_moments_list(moments_list: List) -> Dict:
+    """
+    Get the parameters of a list of `BeamMoments`, such as the one returned
+    by `Beamline.track_moments`.
+
+    The returned dictionary has the same keys as that of
+    `analyze_bunch_list`.
+    """
+    params_analysis = np.array(
+        [m._get_distribution_parameters() for m in moments_list]).T
+    dist = np.array([m.prop_distance for m in moments_list])
+    return _store_bunch_parameters_into_dict(dist, *params_analysis)
+
+
 def save_parameters_to_file(bunch_params, folder_path, file_name):
     if not os.path.exists(folder_path):
         os.makedirs(folder_path)
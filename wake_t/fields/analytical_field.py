@@ -4,7 +4,7 @@ from typing import Callable, Optional, List
 import numpy as np
 
 from .base import Field
-from wake_t.utilities.numba import njit_parallel
+from wake_t.utilities.numba import njit_parallel, njit_serial
 
 
 # Define type alias.
@@ -84,6 +84,7 @@ class AnalyticalField(Field):
         self.__b_y = njit_parallel(b_y) if b_y is not None else no_field
         self.__b_z = njit_parallel(b_z) if b_z is not None else no_field
         self.constants = np.array(constants)
+        self._components = (e_x, e_y, e_z, b_x, b_y, b_z)
 
     def _pre_gather(self, x, y, z, t):
         """Function that is automatically called just before gathering.
@@ -94,6 +95,31 @@ class AnalyticalField(Field):
         """
         pass
 
+    def _get_constants(self, t):
+        """Get the constants of the field at time `t`.
+
+        Derived classes with time-dependent constants should overwrite this
+        method. It is used by the fused tracking mode, where the constants
+        at all times are computed in advance instead of calling
+        `_pre_gather` at every step.
+        """
+        return self.constants
+
+    def _get_serial_components(self, z_min, z_max):
+        """Get serial versions of the field components and their constants.
+
+        These are meant to be called from within an already parallel kernel
+        (see `wake_t.particles.push.fused_boris_pusher`). Components that
+        are not defined are returned as `None`. The `z_min` and `z_max`
+        arguments give the range of `z = c*t + xi` that the particles will
+        explore, and can be used by derived classes to tabulate quantities.
+        """
+        components = tuple(
+            get_serial_function(f) if f is not None else None
+            for f in self._components
+        )
+        return components, self.constants
+
     def _gather(self, x, y, z, t, ex, ey, ez, bx, by, bz):
         self._pre_gather(x, y, z, t)
         self.__e_x(x, y, z, t, ex, self.constants)
@@ -102,3 +128,18 @@ class AnalyticalField(Field):
         self.__b_x(x, y, z, t, bx, self.constants)
         self.__b_y(x, y, z, t, by, self.constants)
         self.__b_z(x, y, z, t, bz, self.constants)
+
+
+# Serial versions of the field components, so that they are compiled only
+# once per function.
+_serial_functions = {}
+
+
+def get_serial_function(function):
+    """Get (and cache) a serial numba version of a field component."""
+    # Functions defined within a class constructor are recreated with each
+    # instance. Use their code object as key so that they are not recompiled.
+    key = function.__code__ if function.__closure__ is None else function
+    if key not in _serial_functions:
+        _serial_functions[key] = njit_serial(function)
+    return _serial_functions[key]
@@ -6,7 +6,7 @@ import numpy as np
 from wake_t.utilities.numba import njit_serial
 
 
-@njit_serial(fastmath=True)
+@njit_serial(fastmath=True, nogil=True)
 def interpolate_rz_field(
     fld: np.ndarray,
     z_min: float,
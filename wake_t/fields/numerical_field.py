@@ -20,6 +20,11 @@ class NumericalField(Field):
     Each subclass must implement the logic for calculating and gathering the
     field and, optionally, for initializing and evolving any field properties.
 
+    The update period can also be adaptive. In this case, after each update,
+    the period until the next one is determined by `_get_next_dt_update`,
+    which should be implemented by the subclass, and the values used during
+    tracking are stored in `dt_update_history`.
+
     Parameters
     ----------
     dt_update : float
@@ -34,17 +39,30 @@ class NumericalField(Field):
         larger) so that the total tracking time is an integer multiple
         of `dt_update`. This makes sure also that the fields are
         updated one last time exactly at the end of the stage.
+    adaptive_dt_update : bool
+        Whether to adapt the update period after each update. In this
+        case, `dt_update` is only the initial value.
+    dt_update_min, dt_update_max : float
+        Minimum and maximum update period when `adaptive_dt_update=True`.
     """
 
     def __init__(
         self,
         dt_update: float,
         openpmd_diag_supported: Optional[bool] = False,
-        force_even_updates: Optional[bool] = False
+        force_even_updates: Optional[bool] = False,
+        adaptive_dt_update: Optional[bool] = False,
+        dt_update_min: Optional[float] = 0.,
+        dt_update_max: Optional[float] = np.inf
     ) -> None:
         super().__init__(openpmd_diag_supported=openpmd_diag_supported)
         self.dt_update = dt_update
         self.force_even_updates = force_even_updates
+        self.adaptive_dt_update = adaptive_dt_update
+        self.dt_update_min = dt_update_min
+        self.dt_update_max = dt_update_max
+        self.t_final = None
+        self.dt_update_history = []
         self.initialized = False
 
     def update(
@@ -64,6 +82,8 @@ class NumericalField(Field):
         else:
             self.evolve_properties(bunches)
         self.calculate_field(bunches)
+        if self.adaptive_dt_update:
+            self.adapt_dt_update()
 
     def initialize_properties(
         self,
@@ -89,15 +109,53 @@ class NumericalField(Field):
         """Calculate field using the current properties and given bunches."""
         self._calculate_field(bunches)
 
+    def finalize(self) -> None:
+        """Finalize the field at the end of the tracking.
+
+        Releases any resources (e.g., background threads) used by the
+        field during tracking. It is called by the `Tracker` when the
+        tracking finishes, also if it is interrupted by an error.
+        """
+        pass
+
     def adjust_dt(
         self,
         t_final: float
     ) -> None:
         """Autoadjust the time step of the field update."""
-        if self.force_even_updates:
+        self.t_final = t_final
+        if self.force_even_updates and not self.adaptive_dt_update:
             n_updates = np.ceil(t_final / self.dt_update)
             self.dt_update = t_final / n_updates
 
+    def adapt_dt_update(self) -> None:
+        """Determine the update period until the next update."""
+        dt = self._get_next_dt_update()
+        dt = min(max(dt, self.dt_update_min), self.dt_update_max)
+        # Avoid small changes of the update period.
+        if abs(dt / self.dt_update - 1) < 0.1:
+            dt = self.dt_update
+        # Make sure that the last update takes place at `t_final` and that
+        # the last update period is not much shorter than the previous ones.
+        if self.t_final is not None:
+            t_left = self.t_final - self.t
+            if np.float32(self.t) < np.float32(self.t_final):
+                if t_left <= dt:
+                    dt = t_left
+                elif t_left < 2 * dt:
+                    dt = t_left / 2
+        if dt != self.dt_update:
+            self._set_dt_update(dt)
+        self.dt_update_history.append(dt)
+
+    def _get_next_dt_update(self):
+        """Get the next update period (adaptive update only)."""
+        return self.dt_update
+
+    def _set_dt_update(self, dt_update):
+        """Change the update period."""
+        self.dt_update = dt_update
+
     def _initialize_properties(self, bunches):
         pass
 
@@ -106,3 +164,17 @@ class NumericalField(Field):
 
     def _calculate_field(self, bunches):
         raise NotImplementedError
+
+    def _get_gather_state(self):
+        """Get the arrays and values needed to gather the field.
+
+        Used to broadcast the field to the worker processes when tracking
+        with several processes (see `ParticleProcessPool`). Returns a
+        dictionary with the arrays, which are shared through shared memory,
+        and another one with any other (picklable) values.
+        """
+        raise NotImplementedError
+
+    def _set_gather_state(self, arrays, values):
+        """Set the arrays and values given by `_get_gather_state`."""
+        raise NotImplementedError
@@ -1,5 +1,6 @@
 """This module contains the base class for plasma wakefields in r-z geometry"""
-from typing import Optional, Callable
+from typing import Optional, Callable, Union
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 import scipy.constants as ct
@@ -31,22 +32,37 @@ class RZWakefield(NumericalField):
         Number of grid elements along r to calculate the wakefields.
     n_xi : int
         Number of grid elements along xi to calculate the wakefields.
-    dz_fields : float, optional
+    dz_fields : float or str, optional
         Determines how often the plasma wakefields should be updated.
         For example, if ``dz_fields=10e-6``, the plasma wakefields are
         only updated every time the simulation window advances by
         10 micron. By default ``dz_fields=xi_max-xi_min``, i.e., the
-        length the simulation box.
+        length the simulation box. If ``'auto'``, the distance to the next
+        update is determined after each update from the relative change of
+        the fields (and of the laser envelope) since the previous update,
+        and from the relative change of the plasma density expected
+        until the next one. The values used are stored in
+        `dt_update_history` (in units of time).
+    dz_fields_min, dz_fields_max : float, optional
+        Minimum and maximum value of ``dz_fields`` when
+        ``dz_fields='auto'``. By default, 0.1 and 10 times the length of
+        the simulation box, respectively.
+    dz_fields_tolerance : float, optional
+        Maximum relative change of the fields between updates when
+        ``dz_fields='auto'``. By default ``0.05``.
     laser : LaserPulse, optional
         Laser driver of the plasma stage.
     laser_evolution : bool, optional
         If True (default), the laser pulse is evolved
         using a laser envelope model. If False, the pulse envelope stays
         unchanged throughout the computation.
-    laser_envelope_substeps : int, optional
+    laser_envelope_substeps : int or str, optional
         Number of substeps of the laser envelope solver per `dz_fields`.
         The time step of the envelope solver is therefore
         `dz_fields / c / laser_envelope_substeps`.
+        If ``'auto'``, the number of substeps is determined at each update
+        from an estimate of the change of the envelope phase (see
+        ``laser_envelope_substeps_tolerance``).
     laser_envelope_nxi, laser_envelope_nr : int, optional
         If given, the laser envelope will run in a grid of size
         (`laser_envelope_nxi`, `laser_envelope_nr`) instead
@@ -58,6 +74,43 @@ class RZWakefield(NumericalField):
         Determines whether to take into account the terms related to the
         longitudinal derivative of the complex phase in the envelope
         solver.
+    laser_envelope_parallel : bool, optional
+        If ``True``, the substeps of the laser envelope solver are computed
+        in parallel as a wavefront along the grid. Only useful when
+        ``laser_envelope_substeps > 1`` and several threads are available.
+        By default ``False``.
+    laser_envelope_auto_crop : bool, optional
+        If ``True``, the laser envelope is only evolved within the region
+        where its amplitude is above ``1e-4`` times its maximum value (plus
+        a safety margin), and set to zero outside of it. This reduces the
+        cost of the envelope solver in large simulation boxes.
+        By default ``False``.
+    laser_envelope_single_precision : bool, optional
+        If ``True``, the laser envelope is stored and evolved in single
+        precision (``complex64``), which halves the memory footprint and
+        bandwidth of the envelope solver. By default ``False``.
+    laser_envelope_substeps_min, laser_envelope_substeps_max : int, optional
+        Minimum and maximum number of substeps when
+        ``laser_envelope_substeps='auto'``. By default ``1`` and ``16``.
+    laser_envelope_substeps_tolerance : float, optional
+        When ``laser_envelope_substeps='auto'``, the number of substeps is
+        chosen at each update so that the estimated change of the envelope
+        phase in each substep is below this value (in rad). By default
+        ``0.05``.
+    laser_envelope_concurrent : bool, optional
+        If ``True``, the evolution of the laser envelope until the next
+        update is computed in a background thread right after each update,
+        while the particle bunches are being pushed. The result is the same
+        as without this option. When combined with
+        ``laser_envelope_parallel=True``, a thread-safe numba threading
+        layer (``'tbb'`` or ``'omp'``) is required. By default ``False``.
+    field_time_interpolation : str, optional
+        If ``'linear'`` or ``'quadratic'``, the fields of the last two or
+        three updates are kept and the fields gathered by the particles are
+        interpolated (or extrapolated after the last update) in time using
+        a polynomial of that order. This allows for a larger `dz_fields`
+        at the same accuracy. If ``None`` (default), the fields are kept
+        constant between updates.
     model_name : str, optional
         Name of the wakefield model. This will be stored in the openPMD
         diagnostics.
@@ -72,16 +125,39 @@ class RZWakefield(NumericalField):
         xi_max: float,
         n_r: int,
         n_xi: int,
-        dz_fields=None,
+        dz_fields: Optional[Union[float, str]] = None,
+        dz_fields_min: Optional[float] = None,
+        dz_fields_max: Optional[float] = None,
+        dz_fields_tolerance: Optional[float] = 0.05,
         laser: Optional[LaserPulse] = None,
         laser_evolution: Optional[bool] = True,
-        laser_envelope_substeps: Optional[int] = 1,
+        laser_envelope_substeps: Optional[Union[int, str]] = 1,
         laser_envelope_nxi: Optional[int] = None,
         laser_envelope_nr: Optional[int] = None,
         laser_envelope_use_phase: Optional[bool] = True,
+        laser_envelope_parallel: Optional[bool] = False,
+        laser_envelope_auto_crop: Optional[bool] = False,
+        laser_envelope_single_precision: Optional[bool] = False,
+        laser_envelope_substeps_min: Optional[int] = 1,
+        laser_envelope_substeps_max: Optional[int] = 16,
+        laser_envelope_substeps_tolerance: Optional[float] = 0.05,
+        laser_envelope_concurrent: Optional[bool] = False,
+        field_time_interpolation: Optional[str] = None,
         model_name: Optional[str] = ''
     ) -> None:
-        dz_fields = xi_max - xi_min if dz_fields is None else dz_fields
+        box_length = xi_max - xi_min
+        adaptive_dz_fields = dz_fields == 'auto'
+        if adaptive_dz_fields:
+            if dz_fields_min is None:
+                dz_fields_min = 0.1 * box_length
+            if dz_fields_max is None:
+                dz_fields_max = 10 * box_length
+            dz_fields = min(max(box_length, dz_fields_min), dz_fields_max)
+        else:
+            dz_fields_min = 0.
+            dz_fields_max = np.inf
+        dz_fields = box_length if dz_fields is None else dz_fields
+        self.dz_fields_tolerance = dz_fields_tolerance
         self.density_function = density_function
         self.laser = laser
         self.laser_evolution = laser_evolution
@@ -89,6 +165,16 @@ class RZWakefield(NumericalField):
         self.laser_envelope_nxi = laser_envelope_nxi
         self.laser_envelope_nr = laser_envelope_nr
         self.laser_envelope_use_phase = laser_envelope_use_phase
+        self.laser_envelope_parallel = laser_envelope_parallel
+        self.laser_envelope_auto_crop = laser_envelope_auto_crop
+        self.laser_envelope_single_precision = laser_envelope_single_precision
+        self.laser_envelope_substeps_min = laser_envelope_substeps_min
+        self.laser_envelope_substeps_max = laser_envelope_substeps_max
+        self.laser_envelope_substeps_tolerance = (
+            laser_envelope_substeps_tolerance)
+        self.laser_envelope_concurrent = laser_envelope_concurrent
+        self._laser_executor = None
+        self._laser_evolution = None
         self.r_max = r_max
         self.xi_min = xi_min
         self.xi_max = xi_max
@@ -97,23 +183,33 @@ class RZWakefield(NumericalField):
         self.dr = r_max / n_r
         self.dxi = (xi_max - xi_min) / (n_xi - 1)
         self.model_name = model_name
+        self.field_time_interpolation = field_time_interpolation
+        self._n_field_history = self._get_field_history_length(
+            field_time_interpolation)
         # If a laser is included, make sure it is evolved for the whole
         # duration of the plasma stage. See `force_even_updates` parameter.
         super().__init__(
             dt_update=dz_fields/ct.c,
             openpmd_diag_supported=True,
-            force_even_updates=laser is not None
+            force_even_updates=laser is not None,
+            adaptive_dt_update=adaptive_dz_fields,
+            dt_update_min=dz_fields_min/ct.c,
+            dt_update_max=dz_fields_max/ct.c
         )
 
+    def update(self, bunches):
+        super().update(bunches)
+        # Start evolving the laser envelope until the next update, so that
+        # it runs while the bunches are being pushed.
+        if self.laser_envelope_concurrent:
+            self._start_laser_evolution()
+
     def _initialize_properties(self, bunches):
         # Initialize laser.
         if self.laser is not None:
-            self.laser.set_envelope_solver_params(
-                self.xi_min, self.xi_max, self.r_max, self.n_xi, self.n_r,
-                self.dt_update, self.laser_envelope_substeps,
-                self.laser_envelope_nxi, self.laser_envelope_nr,
-                self.laser_envelope_use_phase)
+            self._set_laser_envelope_solver_params()
             self.laser.initialize_envelope()
+        self._laser_evolution = None
 
         # Initialize field arrays
         self.rho = np.zeros((self.n_xi+4, self.n_r+4))
@@ -127,13 +223,36 @@ class RZWakefield(NumericalField):
         self.r_fld = np.linspace(self.dr/2, self.r_max - self.dr/2, self.n_r)
         self.xi_fld = np.linspace(self.xi_min, self.xi_max, self.n_xi)
 
+        # Initialize arrays for the temporal interpolation of the fields.
+        # `_field_history` contains the time and the (e_r, e_z, b_t) arrays
+        # of the previous updates, from the oldest to the most recent.
+        self._field_history = []
+        self._t_fields = None
+        if self._n_field_history > 0:
+            self._e_r_blend = np.zeros_like(self.e_r)
+            self._e_z_blend = np.zeros_like(self.e_z)
+            self._b_t_blend = np.zeros_like(self.b_t)
+            self._t_blend = None
+
+        # Initialize arrays for measuring the change of the fields between
+        # updates.
+        if self.adaptive_dt_update:
+            self._e_z_prev = None
+            self._w_r_prev = None
+            self._a_env_prev = None
+
     def _evolve_properties(self, bunches):
         if self.laser is not None:
             # Evolve laser envelope
             if self.laser_evolution:
-                self.laser.evolve(self.chi[2:-2, 2:-2], self.n_p)
+                if self._laser_evolution is not None:
+                    self._finish_laser_evolution()
+                else:
+                    self.laser.evolve(self.chi[2:-2, 2:-2], self.n_p)
 
     def _calculate_field(self, bunches):
+        if self._n_field_history > 0 and self._t_fields is not None:
+            self._store_fields_in_history()
         self.n_p = self.density_function(self.t*ct.c)
         self.rho[:] = 0.
         self.chi[:] = 0.
@@ -141,6 +260,8 @@ class RZWakefield(NumericalField):
         self.e_r[:] = 0.
         self.b_t[:] = 0.
         self._calculate_wakefield(bunches)
+        self._t_fields = self.t
+        self._t_blend = None
 
     def _calculate_wakefield(self, bunches):
         """To be implemented by the subclasses."""
@@ -149,11 +270,193 @@ class RZWakefield(NumericalField):
     def _gather(self, x, y, z, t, ex, ey, ez, bx, by, bz):
         dr = self.r_fld[1] - self.r_fld[0]
         dxi = self.xi_fld[1] - self.xi_fld[0]
+        e_r, e_z, b_t = self._get_fields_at_time(t)
         gather_main_fields_cyl_linear(
-            self.e_r, self.e_z, self.b_t, self.xi_fld[0], self.xi_fld[-1],
+            e_r, e_z, b_t, self.xi_fld[0], self.xi_fld[-1],
             self.r_fld[0], self.r_fld[-1], dxi, dr, x, y, z,
             ex, ey, ez, bx, by, bz)
 
+    def _get_gather_state(self):
+        arrays = {
+            'e_r': self.e_r, 'e_z': self.e_z, 'b_t': self.b_t,
+            'r_fld': self.r_fld, 'xi_fld': self.xi_fld
+        }
+        # Fields of the previous updates, for the temporal interpolation.
+        t_history = []
+        for i, (t, *fields) in enumerate(self._field_history):
+            t_history.append(t)
+            for name, field in zip(['e_r', 'e_z', 'b_t'], fields):
+                arrays['{}_{}'.format(name, i)] = field
+        values = {'t_fields': self._t_fields, 't_history': t_history}
+        return arrays, values
+
+    def _set_gather_state(self, arrays, values):
+        self.e_r = arrays['e_r']
+        self.e_z = arrays['e_z']
+        self.b_t = arrays['b_t']
+        self.r_fld = arrays['r_fld']
+        self.xi_fld = arrays['xi_fld']
+        self._field_history = [
+            (t, arrays['e_r_{}'.format(i)], arrays['e_z_{}'.format(i)],
+             arrays['b_t_{}'.format(i)])
+            for i, t in enumerate(values['t_history'])
+        ]
+        self._t_fields = values['t_fields']
+        if self._n_field_history > 0:
+            self._e_r_blend = np.zeros_like(self.e_r)
+            self._e_z_blend = np.zeros_like(self.e_z)
+            self._b_t_blend = np.zeros_like(self.b_t)
+            self._t_blend = None
+
+    def _set_laser_envelope_solver_params(self):
+        """Set the parameters of the laser envelope solver."""
+        self.laser.set_envelope_solver_params(
+            self.xi_min, self.xi_max, self.r_max, self.n_xi, self.n_r,
+            self.dt_update, self.laser_envelope_substeps,
+            self.laser_envelope_nxi, self.laser_envelope_nr,
+            self.laser_envelope_use_phase,
+            parallel=self.laser_envelope_parallel,
+            auto_crop=self.laser_envelope_auto_crop,
+            single_precision=self.laser_envelope_single_precision,
+            nt_min=self.laser_envelope_substeps_min,
+            nt_max=self.laser_envelope_substeps_max,
+            nt_tolerance=self.laser_envelope_substeps_tolerance)
+
+    def _start_laser_evolution(self):
+        """Start evolving the laser envelope in a background thread.
+
+        The envelope is evolved until the next update with the current
+        plasma susceptibility and time step. The publicly-accessible
+        envelope array is not modified until `_finish_laser_evolution` is
+        called, so that it can still be used (e.g., by the diagnostics)
+        in the meantime.
+        """
+        # No evolution needed if there is no laser or if this was the
+        # last update.
+        if self.laser is None or not self.laser_evolution:
+            return
+        if (
+            self.t_final is not None and
+            np.float32(self.t) >= np.float32(self.t_final)
+        ):
+            self.finalize()
+            return
+        if self._laser_executor is None:
+            self._laser_executor = ThreadPoolExecutor(max_workers=1)
+        # `chi` is not modified until the evolution is finished at the
+        # next update, so it does not need to be copied.
+        self._laser_evolution = self._laser_executor.submit(
+            self.laser.evolve, self.chi[2:-2, 2:-2], self.n_p,
+            update_output=False)
+
+    def _finish_laser_evolution(self):
+        """Wait for the laser evolution in the background thread."""
+        # Any exception raised during the evolution is raised here.
+        self._laser_evolution.result()
+        self._laser_evolution = None
+        self.laser._update_output_envelope()
+
+    def finalize(self):
+        """Stop the background thread of the laser evolution, if any.
+
+        An evolution still in progress (e.g., if the tracking was
+        interrupted by an error) is cancelled or, if already running,
+        waited for and discarded.
+        """
+        if self._laser_evolution is not None:
+            self._laser_evolution.cancel()
+            self._laser_evolution = None
+        if self._laser_executor is not None:
+            self._laser_executor.shutdown(wait=True)
+            self._laser_executor = None
+
+    def _get_next_dt_update(self):
+        # Relative rate of change of all quantities.
+        rates = []
+        # Fields (and laser envelope) since the last update. The transverse
+        # field is measured as `e_r - c*b_t` (i.e., the transverse wakefield),
+        # which does not contain the space-charge field of the bunches.
+        w_r = self.e_r - ct.c * self.b_t
+        if self._e_z_prev is not None:
+            rates.append(get_relative_change(self.e_z, self._e_z_prev))
+            rates.append(get_relative_change(w_r, self._w_r_prev))
+            if self.laser is not None:
+                rates.append(get_relative_change(
+                    self.laser.get_envelope(), self._a_env_prev))
+            rates = [rate / self.dt_update for rate in rates]
+        # Plasma density until the next update.
+        dt = self.dt_update
+        n_p_next = self.density_function((self.t + dt) * ct.c)
+        if self.n_p > 0:
+            rates.append(np.abs(n_p_next / self.n_p - 1) / dt)
+        # Store current fields.
+        self._e_z_prev = np.copy(self.e_z)
+        self._w_r_prev = w_r
+        if self.laser is not None:
+            self._a_env_prev = np.copy(self.laser.get_envelope())
+        # Next update period. Do not allow it to grow by more than a factor
+        # 2 between updates.
+        max_rate = max(rates, default=0.)
+        if max_rate > 0:
+            dt = min(self.dz_fields_tolerance / max_rate, 2 * dt)
+        else:
+            dt = 2 * dt
+        return dt
+
+    def _set_dt_update(self, dt_update):
+        super()._set_dt_update(dt_update)
+        # Update time step of the laser envelope solver.
+        if self.laser is not None:
+            self._set_laser_envelope_solver_params()
+
+    def _get_field_history_length(self, field_time_interpolation):
+        """Get the number of previous field sets to keep in memory."""
+        if field_time_interpolation is None:
+            return 0
+        elif field_time_interpolation == 'linear':
+            return 1
+        elif field_time_interpolation == 'quadratic':
+            return 2
+        else:
+            raise ValueError(
+                "Field time interpolation '{}' not recognized. Possible "
+                "values are None, 'linear' and 'quadratic'.".format(
+                    field_time_interpolation))
+
+    def _store_fields_in_history(self):
+        """Store a copy of the current fields before they are updated."""
+        if len(self._field_history) < self._n_field_history:
+            arrays = [np.empty_like(self.e_r) for i in range(3)]
+        else:
+            # Reuse the arrays of the oldest fields.
+            _, *arrays = self._field_history.pop(0)
+        for array, field in zip(arrays, [self.e_r, self.e_z, self.b_t]):
+            array[:] = field
+        self._field_history.append((self._t_fields, *arrays))
+
+    def _get_fields_at_time(self, t):
+        """Get the `e_r`, `e_z` and `b_t` arrays interpolated at time `t`.
+
+        The fields of the last update and of the previous ones in the
+        history are combined using Lagrange interpolation. The time is
+        limited to at most one update interval after the last update.
+        """
+        if self._n_field_history == 0 or len(self._field_history) == 0:
+            return self.e_r, self.e_z, self.b_t
+        if t != self._t_blend:
+            field_sets = [*self._field_history,
+                          (self._t_fields, self.e_r, self.e_z, self.b_t)]
+            times = [field_set[0] for field_set in field_sets]
+            t_int = min(max(t, times[0]), 2 * times[-1] - times[-2])
+            weights = get_lagrange_weights(times, t_int)
+            blended = [self._e_r_blend, self._e_z_blend, self._b_t_blend]
+            for i, array in enumerate(blended):
+                array[:] = 0.
+                for weight, field_set in zip(weights, field_sets):
+                    array += weight * field_set[i + 1]
+            self._t_blend = t
+        return self._e_r_blend, self._e_z_blend, self._b_t_blend
+
     def _get_openpmd_diagnostics_data(self, global_time):
         # Prepare necessary data.
         fld_solver = 'other'
@@ -207,3 +510,23 @@ class RZWakefield(NumericalField):
             charge_correction)
 
         return diag_data
+
+
+def get_lagrange_weights(times, t):
+    """Get the weights of the Lagrange polynomial through `times` at `t`."""
+    weights = []
+    for j, t_j in enumerate(times):
+        weight = 1.
+        for m, t_m in enumerate(times):
+            if m != j:
+                weight *= (t - t_m) / (t_j - t_m)
+        weights.append(weight)
+    return weights
+
+
+def get_relative_change(array, array_prev):
+    """Get the change between two arrays relative to their L2 norm."""
+    norm = np.linalg.norm(array)
+    if norm == 0.:
+        return 0.
+    return np.linalg.norm(array - array_prev) / norm
@@ -0,0 +1,259 @@
+"""
+This module contains the class defining the first and second moments of a
+particle bunch, which can be tracked through beamline elements with linear
+(and weakly nonlinear) optics at a negligible computational cost.
+"""
+from __future__ import annotations
+from copy import deepcopy
+from typing import Optional, Dict
+
+import numpy as np
+import scipy.constants as ct
+
+from wake_t.utilities.bunch_manipulation import (
+    convert_to_ocelot_matrix, rotation_matrix_xz)
+from wake_t.diagnostics.bunch_analysis import (
+    _store_bunch_parameters_into_dict)
+from .particle_bunch import ParticleBunch
+from .push.transfer_matrix import compose_transfer_maps
+
+
+class BeamMoments():
+    """ Defines the first and second moments of a particle bunch.
+
+    The moments are given in terms of the phase-space coordinates
+    (x, x', y, y', tau, dp) used by the transfer-matrix elements, where
+    ``x' = px/p_ref``, ``y' = py/p_ref``, ``tau = -xi`` and
+    ``dp = (g-g_ref)/(g_ref*b_ref)``, with ``p_ref`` and ``b_ref`` the
+    momentum and velocity corresponding to the reference energy
+    ``g_ref``. The transverse coordinates are defined with respect to the
+    reference orbit (i.e., after subtracting `x_ref` and rotating by
+    `theta_ref`).
+
+    The transfer maps applied to the moments are composed into a single
+    map (truncated at second order), which is then applied to the initial
+    moments. In this way, the distribution only needs to be assumed
+    Gaussian at the beginning (or after changing the reference energy).
+
+    Parameters
+    ----------
+    mean : ndarray
+        Array of size 6 with the average of each coordinate.
+    cov : ndarray
+        6 x 6 covariance matrix of the coordinates.
+    gamma_ref : float
+        Reference energy with respect to which `dp` is calculated.
+    q_tot : float
+        Total charge of the bunch in units of C.
+    prop_distance : float
+        Propagation distance of the bunch along the beamline.
+    theta_ref, x_ref : float
+        Angle and transverse displacement of the reference orbit.
+    q_species, m_species : float
+        Charge and mass of a single particle of the species represented
+        by the moments. For an electron bunch (default), ``q_species=-e``
+        and ``m_species=m_e``
+
+    """
+
+    def __init__(
+        self,
+        mean: np.ndarray,
+        cov: np.ndarray,
+        gamma_ref: float,
+        q_tot: float,
+        prop_distance: Optional[float] = 0.,
+        theta_ref: Optional[float] = 0.,
+        x_ref: Optional[float] = 0.,
+        q_species: Optional[float] = -ct.e,
+        m_species: Optional[float] = ct.m_e
+    ) -> None:
+        self.mean = np.array(mean, dtype=np.float64)
+        self.cov = np.array(cov, dtype=np.float64)
+        self.gamma_ref = gamma_ref
+        self._reset_transfer_map()
+        self.q_tot = q_tot
+        self.prop_distance = prop_distance
+        self.theta_ref = theta_ref
+        self.x_ref = x_ref
+        self.q_species = q_species
+        self.m_species = m_species
+
+    @classmethod
+    def from_bunch(
+        cls,
+        bunch: ParticleBunch,
+        gamma_ref: Optional[float] = None
+    ) -> BeamMoments:
+        """Get the moments of a particle bunch.
+
+        Parameters
+        ----------
+        bunch : ParticleBunch
+            The particle bunch.
+        gamma_ref : float, optional
+            Reference energy. If not specified, the average gamma of the
+            bunch is used.
+        """
+        bunch_mat = bunch.get_6D_matrix()
+        if bunch.x_ref != 0:
+            bunch_mat = bunch_mat.copy()
+            bunch_mat[0] -= bunch.x_ref
+        if bunch.theta_ref != 0:
+            rot = rotation_matrix_xz(-bunch.theta_ref)
+            bunch_mat = np.dot(rot, bunch_mat)
+        bunch_mat, gamma_ref = convert_to_ocelot_matrix(
+            bunch_mat, bunch.w, gamma_ref)
+        mean = np.average(bunch_mat, axis=1, weights=bunch.w)
+        cov = np.cov(bunch_mat, aweights=bunch.w, bias=True)
+        return cls(
+            mean, cov, gamma_ref, np.sum(bunch.q),
+            prop_distance=bunch.prop_distance, theta_ref=bunch.theta_ref,
+            x_ref=bunch.x_ref, q_species=bunch.q_species,
+            m_species=bunch.m_species)
+
+    @property
+    def p_ref(self) -> float:
+        """Reference momentum in non-dimensional units (beta*gamma)."""
+        return np.sqrt(self.gamma_ref**2 - 1)
+
+    @property
+    def mean_gamma(self) -> float:
+        """Average gamma of the bunch."""
+        return self.gamma_ref + self.p_ref * self.mean[5]
+
+    def set_reference_energy(self, gamma_ref: float) -> None:
+        """Change the reference energy with respect to which `x'`, `y'` and
+        `dp` are calculated.
+
+        Relative changes below 1e-10 are ignored, so that the transfer maps
+        applied before and after the change can still be composed.
+
+        Parameters
+        ----------
+        gamma_ref : float
+            The new reference energy.
+        """
+        if np.isclose(gamma_ref, self.gamma_ref, rtol=1e-10, atol=0.):
+            return
+        p_ref_new = np.sqrt(gamma_ref**2 - 1)
+        ratio = self.p_ref / p_ref_new
+        A = np.diag([1., ratio, 1., ratio, 1., ratio])
+        self.mean = np.dot(A, self.mean)
+        self.mean[5] += (self.gamma_ref - gamma_ref) / p_ref_new
+        self.cov = np.dot(A, np.dot(self.cov, A.T))
+        self.gamma_ref = gamma_ref
+        self._reset_transfer_map()
+
+    def apply_transfer_map(self, R: np.ndarray, T: np.ndarray) -> None:
+        """Propagate the moments through a transfer map.
+
+        The map is composed with those applied since the last change of
+        reference energy, and the result is applied to the moments at that
+        point with `propagate_moments`.
+
+        Parameters
+        ----------
+        R, T : ndarray
+            First- and second-order matrices of the map, as returned by
+            `get_transfer_map`.
+        """
+        self._R, self._T = compose_transfer_maps(self._R, self._T, R, T)
+        self.mean, self.cov = propagate_moments(
+            self._mean_0, self._cov_0, self._R, self._T)
+
+    def get_parameters(self) -> Dict:
+        """Get the bunch parameters, as in `analyze_bunch`.
+
+        The slice emittance and energy spread are calculated from the
+        covariance of the coordinates at a fixed `xi`, and the peak current
+        is that of a Gaussian current profile with the same RMS length.
+        """
+        return _store_bunch_parameters_into_dict(
+            self.prop_distance, *self._get_distribution_parameters())
+
+    def copy(self) -> BeamMoments:
+        """Return a copy of the beam moments."""
+        return deepcopy(self)
+
+    def _reset_transfer_map(self):
+        """Take the current moments as the initial ones."""
+        self._mean_0 = self.mean.copy()
+        self._cov_0 = self.cov.copy()
+        self._R = np.identity(6)
+        self._T = np.zeros((6, 6, 6))
+
+    def _get_distribution_parameters(self):
+        """Get the same parameters as `_get_distribution_parameters` in
+        `bunch_analysis`."""
+        mu = self.mean
+        sigma = self.cov
+        p_ref = self.p_ref
+        ene = self.mean_gamma
+        s_z = np.sqrt(sigma[4, 4])
+
+        # Covariance at a fixed longitudinal position.
+        if s_z > 0:
+            sigma_sl = sigma - np.outer(sigma[4], sigma[4]) / sigma[4, 4]
+        else:
+            sigma_sl = sigma
+        params = []
+        for i in [0, 2]:
+            em_tr = np.sqrt(_det_2x2(sigma, i))
+            b = sigma[i, i] / em_tr
+            a = -sigma[i, i + 1] / em_tr
+            g = (1 + a**2) / b
+            em = p_ref * em_tr
+            em_sl = p_ref * np.sqrt(_det_2x2(sigma_sl, i))
+            params.append((a, b, g, em, em_sl))
+        (a_x, b_x, g_x, em_x, em_x_sl), (a_y, b_y, g_y, em_y, em_y_sl) = (
+            params)
+        ene_sp = p_ref * np.sqrt(sigma[5, 5]) / ene
+        ene_sp_sl = p_ref * np.sqrt(max(sigma_sl[5, 5], 0.)) / ene
+        theta_x = p_ref * mu[1] / ene
+        theta_y = p_ref * mu[3] / ene
+        if s_z > 0:
+            i_peak = abs(self.q_tot) * ct.c / (np.sqrt(2 * np.pi) * s_z)
+        else:
+            i_peak = np.inf
+        return (theta_x, theta_y, mu[0], mu[2], np.sqrt(sigma[0, 0]),
+                np.sqrt(sigma[2, 2]), a_x, a_y, b_x, b_y, g_x, g_y, em_x, em_y,
+                em_x_sl, em_y_sl, ene, ene_sp, ene_sp_sl, i_peak, s_z,
+                self.q_tot)
+
+
+def propagate_moments(mu, sigma, R, T):
+    """Propagate the average and covariance of a Gaussian distribution
+    through a transfer map.
+
+    The third-order central moments of the distribution vanish and the
+    fourth-order ones are given by Isserlis' theorem.
+
+    Parameters
+    ----------
+    mu, sigma : ndarray
+        Average and covariance matrix of the coordinates.
+    R, T : ndarray
+        First- and second-order matrices of the map.
+
+    Returns
+    -------
+    A tuple with the average and covariance matrix after the map.
+
+    """
+    # Jacobian of the map at the average position.
+    J = R + np.einsum('ijk,k->ij', T, mu) + np.einsum('ikj,k->ij', T, mu)
+    mu_new = (
+        np.dot(R, mu) + np.einsum('ijk,j,k->i', T, mu, mu) +
+        np.einsum('ijk,jk->i', T, sigma))
+    T_sigma = np.einsum('ijk,jm,kn->imn', T, sigma, sigma)
+    sigma_new = (
+        np.dot(J, np.dot(sigma, J.T)) +
+        np.einsum('imn,lmn->il', T_sigma, T) +
+        np.einsum('imn,lnm->il', T_sigma, T))
+    return mu_new, sigma_new
+
+
+def _det_2x2(sigma, i):
+    """Determinant of the 2 x 2 block of `sigma` starting at `i`."""
+    return max(sigma[i, i] * sigma[i+1, i+1] - sigma[i, i+1]**2, 0.)
@@ -3,8 +3,9 @@ This module contains the class defining a particle bunch.
 """
 # TODO: clean methods to set and get bunch matrix
 from __future__ import annotations
+import tempfile
 from copy import deepcopy
-from typing import Optional
+from typing import Optional, Iterator
 
 import numpy as np
 import scipy.constants as ct
@@ -12,6 +13,67 @@ from aptools.plotting.quick_diagnostics import full_phase_space
 
 from .push.runge_kutta_4 import apply_rk4_pusher
 from .push.boris_pusher import apply_boris_pusher
+from .push.linear_focusing_pusher import apply_linear_focusing_pusher
+from .push.adaptive_boris_pusher import apply_adaptive_boris_pusher
+
+
+# Order of the particle coordinates in the contiguous storage buffer.
+_COORDINATES = ('x', 'px', 'y', 'py', 'xi', 'pz', 'w')
+
+# Pool of scratch arrays shared by all contiguous bunches with the same
+# number of particles. The 6 arrays of the gathered fields and the 18
+# auxiliary arrays of the RK4 pusher are allocated separately, only when
+# needed. The pool is cleared by the `Tracker` at the end of the tracking.
+_N_FIELD_ARRAYS = 6
+_N_RK4_ARRAYS = 18
+_MAX_SCRATCH_POOL_SIZE = 8
+_scratch_pool = {}
+
+
+def _get_scratch_arrays(n_arrays, n_part):
+    """Get `n_arrays` shared scratch arrays of `n_part` elements."""
+    key = (n_arrays, n_part)
+    if key not in _scratch_pool:
+        # Discard the oldest buffer if the pool is full.
+        if len(_scratch_pool) >= _MAX_SCRATCH_POOL_SIZE:
+            del _scratch_pool[next(iter(_scratch_pool))]
+        _scratch_pool[key] = np.zeros((n_arrays, n_part))
+    return tuple(_scratch_pool[key])
+
+
+def clear_scratch_pool() -> None:
+    """Release the scratch arrays shared by the contiguous bunches.
+
+    The arrays are allocated again when needed by the next push.
+    """
+    _scratch_pool.clear()
+
+
+def _coordinate_property(index, name, doc):
+    """Create the property giving access to a particle coordinate.
+
+    The coordinate is either a row of the contiguous buffer of the bunch
+    or an independent array.
+    """
+    attr = '_' + name
+
+    def getter(self):
+        if self._data is not None:
+            return self._data[index]
+        return getattr(self, attr)
+
+    def setter(self, value):
+        if self._data is not None:
+            if np.shape(value) != self._data[index].shape:
+                raise ValueError(
+                    f"Cannot assign an array of shape {np.shape(value)} to "
+                    f"'{name}' of a contiguous bunch with "
+                    f"{self._data.shape[1]} particles.")
+            self._data[index] = value
+        else:
+            setattr(self, attr, value)
+
+    return property(getter, setter, doc=doc)
 
 
 class ParticleBunch():
@@ -58,6 +120,16 @@ class ParticleBunch():
         Charge and mass of a single particle of the species represented
         by the macroparticles. For an electron bunch (default),
         ``q_species=-e`` and ``m_species=m_e``
+    contiguous : bool
+        Whether to store the particle coordinates and weights in a single
+        contiguous (7, N) buffer (see `make_contiguous`). By default
+        ``False``.
+    memmap_dir : str, optional
+        If given, the contiguous buffer is a memory-mapped file in this
+        directory (see `make_contiguous`). Implies ``contiguous=True``.
+    chunk_size : int, optional
+        Number of particles in each of the chunks in which the bunch is
+        evolved and deposited (see `set_chunk_size`).
 
     """
 
@@ -81,8 +153,13 @@ class ParticleBunch():
         z_injection: Optional[float] = None,
         name: Optional[str] = None,
         q_species: Optional[float] = -ct.e,
-        m_species: Optional[float] = ct.m_e
+        m_species: Optional[float] = ct.m_e,
+        contiguous: Optional[bool] = False,
+        memmap_dir: Optional[str] = None,
+        chunk_size: Optional[int] = None
     ) -> None:
+        self._data = None
+        self.memmap_dir = None
         if bunch_matrix is not None:
             if matrix_type == 'standard':
                 self.set_phase_space_from_matrix(bunch_matrix)
@@ -107,8 +184,160 @@ class ParticleBunch():
         self.set_name(name)
         self.q_species = q_species
         self.m_species = m_species
+        self.dt_adaptive = None
+        self.boundaries = None
+        self.compaction_fraction = 0.
+        self.n_lost = 0
+        self.lost_charge = 0.
+        self._lost = None
+        self.merging = None
+        self.merging_errors = None
+        self.process_pool = None
         self.__field_arrays_allocated = False
         self.__rk4_arrays_allocated = False
+        if contiguous or memmap_dir is not None:
+            self.make_contiguous(memmap_dir)
+        self.set_chunk_size(chunk_size)
+
+    x = _coordinate_property(0, 'x', 'Position of the particles in x (m).')
+    px = _coordinate_property(1, 'px', 'Momentum of the particles in x.')
+    y = _coordinate_property(2, 'y', 'Position of the particles in y (m).')
+    py = _coordinate_property(3, 'py', 'Momentum of the particles in y.')
+    xi = _coordinate_property(4, 'xi', 'Position of the particles in xi (m).')
+    pz = _coordinate_property(5, 'pz', 'Momentum of the particles in z.')
+    w = _coordinate_property(6, 'w', 'Weight of the macroparticles.')
+
+    @property
+    def is_contiguous(self) -> bool:
+        """Whether the bunch data is stored in a contiguous buffer."""
+        return self._data is not None
+
+    def make_contiguous(self, memmap_dir: Optional[str] = None) -> None:
+        """Store the particle coordinates and weights in a single contiguous
+        (7, N) buffer.
+
+        The rows of the buffer contain (x, px, y, py, xi, pz, w), and the
+        attributes `x`, `px`, etc. become views of it. This allows
+        `get_6D_matrix` to return a view instead of a new copy, and assigning
+        new values to an attribute copies them into the buffer. In addition,
+        the scratch arrays used by the particle pushers are taken from a pool
+        shared by all contiguous bunches with the same number of particles
+        (see `clear_scratch_pool`).
+
+        Parameters
+        ----------
+        memmap_dir : str, optional
+            If given, the buffer is stored in an anonymous temporary file in
+            this directory, which is mapped into memory. In this way, the
+            bunch data does not need to fit in memory. Combined with
+            `set_chunk_size`, this allows tracking bunches larger than the
+            available memory through field elements. Copies of the bunch
+            (such as those stored at each output step) are also stored in
+            this directory. The files are removed when the bunches are
+            deleted.
+        """
+        if self._data is not None and memmap_dir == self.memmap_dir:
+            return
+        self.memmap_dir = memmap_dir
+        data = self._allocate_buffer(len(self.x))
+        for i, name in enumerate(_COORDINATES):
+            data[i] = getattr(self, name)
+        for name in _COORDINATES:
+            setattr(self, '_' + name, None)
+        self._data = data
+
+    def set_chunk_size(self, chunk_size: Optional[int]) -> None:
+        """Evolve and deposit the bunch in chunks of `chunk_size` particles.
+
+        Since the particles are independent of each other between field
+        updates, they can be evolved in chunks. This keeps the auxiliary
+        arrays of the particle pushers (which are taken from the shared pool
+        of contiguous bunches) at the size of a chunk. The charge of the
+        bunch is also deposited chunk by chunk by the plasma wakefields.
+        Chunked bunches are stored in a contiguous buffer. With the
+        ``'boris_adaptive'`` pusher, the error of each chunk is controlled
+        separately and the smallest recommended time step is used.
+
+        Parameters
+        ----------
+        chunk_size : int or None
+            Number of particles in each chunk. If ``None``, the bunch is
+            evolved as a whole.
+        """
+        if chunk_size is not None:
+            if chunk_size < 1:
+                raise ValueError(
+                    'The chunk size must be at least 1, not {}.'.format(
+                        chunk_size))
+            self.make_contiguous(self.memmap_dir)
+        self.chunk_size = chunk_size
+
+    def iter_chunks(self) -> Iterator[ParticleBunch]:
+        """Iterate over the chunks of the bunch.
+
+        Each chunk is a bunch whose data is a view of a subset of the
+        particles of this bunch, so that evolving the chunk evolves the
+        corresponding particles. If no chunk size has been set, the bunch
+        itself is the only chunk.
+        """
+        if self.chunk_size is None:
+            yield self
+            return
+        for sl in self._get_chunk_slices():
+            chunk = ParticleBunch(
+                w=None,
+                prop_distance=self.prop_distance,
+                name=self.name,
+                q_species=self.q_species,
+                m_species=self.m_species
+            )
+            chunk._data = self._data[:, sl]
+            yield chunk
+
+    def deposit(self, function, grid, *args) -> None:
+        """Deposit the particles of the bunch on a grid.
+
+        The particles are deposited chunk by chunk by calling
+        ``function(chunk, grid, *args)``, which should add the contribution
+        of each chunk to `grid`. If the bunch is evolved in a process pool
+        (see `Tracker`), each process deposits its particles on its own
+        copy of the grid and the results are added to `grid`. In this
+        case, `function` should be defined at module level.
+
+        Parameters
+        ----------
+        function : callable
+            Function that deposits a chunk of particles on the grid.
+        grid : ndarray
+            Grid on which to deposit the particles.
+        *args
+            Additional arguments passed to `function`.
+        """
+        if self.process_pool is not None:
+            self.process_pool.deposit(self, function, grid, *args)
+            return
+        for chunk in self.iter_chunks():
+            function(chunk, grid, *args)
+
+    def _get_chunk_slices(self):
+        """Get the slices of the particle arrays in each chunk."""
+        n_part = len(self.x)
+        if self.chunk_size is None:
+            return [slice(0, n_part)]
+        return [slice(i, i + self.chunk_size)
+                for i in range(0, n_part, self.chunk_size)]
+
+    def _allocate_buffer(self, n_part):
+        """Allocate a contiguous buffer for `n_part` particles."""
+        shape = (len(_COORDINATES), n_part)
+        if self.memmap_dir is None:
+            return np.empty(shape)
+        # The temporary file is deleted once the memory map is closed. The
+        # map is kept open by the returned array, which is a regular ndarray
+        # so that it can be passed to the compiled methods.
+        with tempfile.TemporaryFile(dir=self.memmap_dir) as f:
+            return np.asarray(
+                np.memmap(f, dtype=np.float64, mode='w+', shape=shape))
 
     @property
     def q(self) -> np.ndarray:
@@ -135,8 +364,24 @@ class ParticleBunch():
             ParticleBunch._n_unnamed += 1
         self.name = name
 
-    def set_phase_space(self, x, y, xi, px, py, pz):
-        """Sets the phase space coordinates"""
+    def set_phase_space(self, x, y, xi, px, py, pz, w=None):
+        """Sets the phase space coordinates
+
+        If the number of particles changes, the weights `w` of the new
+        particles should also be given.
+        """
+        if len(x) != len(self.x):
+            if w is None:
+                raise ValueError(
+                    'The weights of the particles are needed when changing '
+                    'the number of particles of the bunch.')
+            if self._data is not None:
+                self._data = self._allocate_buffer(len(x))
+            self._lost = None
+            self.__field_arrays_allocated = False
+            self.__rk4_arrays_allocated = False
+        if w is not None:
+            self.w = w
         self.x = x
         self.y = y
         self.xi = xi
@@ -150,6 +395,9 @@ class ParticleBunch():
         (x, px, y, py, xi, pz).
 
         """
+        if self._data is not None:
+            self._data[:6] = beam_matrix
+            return
         self.x = beam_matrix[0]
         self.y = beam_matrix[2]
         self.xi = beam_matrix[4]
@@ -197,7 +445,11 @@ class ParticleBunch():
         self.w = beam_matrix[6] / self.q_species
 
     def get_bunch_matrix(self):
-        """Returns a matrix with the 6D phase space and charge of the bunch"""
+        """Returns a matrix with the 6D phase space and charge of the bunch
+
+        Since the order of the coordinates differs from that of the
+        contiguous buffer, this is always a new array.
+        """
         return np.array([self.x, self.y, self.xi, self.px, self.py, self.pz,
                          self.w * self.q_species])
 
@@ -205,14 +457,23 @@ class ParticleBunch():
         """
         Returns the 6D phase space matrix of the bunch containing
         (x, px, y, py, xi, pz)
+
+        If the bunch is contiguous, this is a view of its data (i.e., modifying
+        the matrix modifies the bunch). Otherwise, it is a new array.
         """
+        if self._data is not None:
+            return self._data[:6]
         return np.array([self.x, self.px, self.y, self.py, self.xi, self.pz])
 
     def get_6D_matrix_with_charge(self):
         """
         Returns the 6D phase space matrix of the bunch containing
-        (x, px, y, py, xi, pz)
+        (x, px, y, py, xi, pz) and the charge of each macroparticle.
         """
+        if self._data is not None:
+            bunch_matrix = self._data.copy()
+            bunch_matrix[6] *= self.q_species
+            return bunch_matrix
         return np.array([self.x, self.px, self.y, self.py, self.xi, self.pz,
                          self.w * self.q_species])
 
@@ -229,6 +490,150 @@ class ParticleBunch():
         return np.array([self.x, self.px/p_kin, self.y, self.py/p_kin,
                          self.xi, dp]), g_avg
 
+    def set_particle_boundaries(
+        self,
+        r_max: Optional[float] = None,
+        xi_min: Optional[float] = None,
+        xi_max: Optional[float] = None,
+        gamma_min: Optional[float] = None,
+        compaction_fraction: Optional[float] = 0.05
+    ) -> None:
+        """Set the boundaries beyond which the particles are considered lost.
+
+        Lost particles are flagged by `flag_lost_particles` (which is called
+        by the `Tracker` after each push). Their weight is set to zero, so
+        that they no longer contribute to the fields or the bunch
+        diagnostics, and they are removed from the bunch by
+        `remove_lost_particles`.
+
+        Parameters
+        ----------
+        r_max : float, optional
+            Maximum radial position of the particles, sqrt(x**2 + y**2).
+        xi_min, xi_max : float, optional
+            Minimum and maximum longitudinal position of the particles.
+        gamma_min : float, optional
+            Minimum Lorentz factor of the particles.
+        compaction_fraction : float, optional
+            Fraction of flagged particles at which the bunch arrays are
+            compacted after a push. The flagged particles are also always
+            removed before generating diagnostics. By default ``0.05``.
+        """
+        self.boundaries = (r_max, xi_min, xi_max, gamma_min)
+        if all(b is None for b in self.boundaries):
+            self.boundaries = None
+        self.compaction_fraction = compaction_fraction
+
+    def set_macroparticle_merging(
+        self,
+        n_part_max: int,
+        method: Optional[str] = 'cells',
+        tolerance: Optional[float] = 1e-6
+    ) -> None:
+        """Reduce the number of macroparticles before tracking.
+
+        At the beginning of the tracking of each element, the `Tracker`
+        merges the macroparticles of the bunch if there are more than
+        `n_part_max` (see `wake_t.utilities.particle_merging`). The errors
+        of the charge and moments of the bunch induced by the last merge are
+        stored in `merging_errors`.
+
+        Parameters
+        ----------
+        n_part_max : int
+            Maximum number of macroparticles.
+        method : str, optional
+            Merging method, either ``'cells'`` (default) or ``'resample'``.
+        tolerance : float, optional
+            Maximum error of the charge and moments of the merged bunch,
+            beyond which they are corrected. By default ``1e-6``.
+        """
+        self.merging = (n_part_max, method, tolerance)
+
+    def flag_lost_particles(self) -> int:
+        """Flag the particles that are beyond the bunch boundaries.
+
+        The weight of the newly lost particles is set to zero, and their
+        number and charge are added to `n_lost` and `lost_charge`.
+
+        Returns
+        -------
+        int
+            The total number of flagged particles (i.e., that have not yet
+            been removed with `remove_lost_particles`).
+        """
+        if self.boundaries is None:
+            return 0
+        r_max, xi_min, xi_max, gamma_min = self.boundaries
+        lost = np.zeros(len(self.x), dtype=bool)
+        for sl in self._get_chunk_slices():
+            lost_sl = lost[sl]
+            if r_max is not None:
+                lost_sl |= self.x[sl]**2 + self.y[sl]**2 > r_max**2
+            if xi_min is not None:
+                lost_sl |= self.xi[sl] < xi_min
+            if xi_max is not None:
+                lost_sl |= self.xi[sl] > xi_max
+            if gamma_min is not None:
+                lost_sl |= (1 + self.px[sl]**2 + self.py[sl]**2 +
+                            self.pz[sl]**2 < gamma_min**2)
+        if self._lost is not None:
+            new_lost = lost & ~self._lost
+            lost |= self._lost
+        else:
+            new_lost = lost
+        if np.any(new_lost):
+            self.n_lost += np.count_nonzero(new_lost)
+            self.lost_charge += np.sum(self.w[new_lost]) * self.q_species
+            self.w[new_lost] = 0.
+        self._lost = lost
+        return np.count_nonzero(lost)
+
+    def remove_lost_particles(self) -> int:
+        """Remove the flagged particles from the bunch.
+
+        The coordinates, weights, tags and auxiliary arrays are compacted so
+        that they only contain the remaining particles.
+
+        Returns
+        -------
+        int
+            The number of removed particles.
+        """
+        if self._lost is None:
+            return 0
+        keep = ~self._lost
+        self._lost = None
+        n_keep = np.count_nonzero(keep)
+        n_removed = keep.shape[0] - n_keep
+        if n_removed == 0:
+            return 0
+        if self._data is not None:
+            data = self._allocate_buffer(n_keep)
+            for i in range(len(_COORDINATES)):
+                data[i] = self._data[i, keep]
+            self._data = data
+        else:
+            for name in _COORDINATES:
+                setattr(self, name, getattr(self, name)[keep])
+        if self.tags is not None:
+            self.tags = self.tags[keep]
+        # The auxiliary arrays only store temporary data, so it is enough
+        # to shrink them.
+        if self.__field_arrays_allocated:
+            (self.__e_x, self.__e_y, self.__e_z,
+             self.__b_x, self.__b_y, self.__b_z) = [
+                a[:n_keep] for a in self.get_field_arrays()]
+        if self.__rk4_arrays_allocated:
+            (self.__x_rk4, self.__y_rk4, self.__xi_rk4,
+             self.__px_rk4, self.__py_rk4, self.__pz_rk4,
+             self.__dx_rk4, self.__dy_rk4, self.__dxi_rk4,
+             self.__dpx_rk4, self.__dpy_rk4, self.__dpz_rk4,
+             self.__k_x, self.__k_y, self.__k_xi,
+             self.__k_px, self.__k_py, self.__k_pz) = [
+                a[:n_keep] for a in self.get_rk4_arrays()]
+        return n_removed
+
     def increase_prop_distance(self, dist):
         """Increases the propagation distance"""
         self.prop_distance += dist
@@ -266,7 +671,7 @@ class ParticleBunch():
             self.x, self.y, self.xi, self.px, self.py, self.pz,
             self.w * self.q_species, show=True, **kwargs)
 
-    def evolve(self, fields, t, dt, pusher='rk4'):
+    def evolve(self, fields, t, dt, pusher='rk4', tolerance=1e-3):
         """Evolve particle bunch to the next time step.
 
         Parameters
@@ -278,22 +683,49 @@ class ParticleBunch():
         dt : float
             Time step by which to evolve the bunch.
         pusher : str, optional
-            The particle pusher to use. Either 'rk4' or 'boris'. By
-            default 'rk4'.
+            The particle pusher to use. Either 'rk4', 'boris',
+            'boris_adaptive' or 'linear_focusing'. By default 'rk4'.
+        tolerance : float, optional
+            Error tolerance of the 'boris_adaptive' pusher. After each push,
+            the recommended time step for the next one is stored in
+            `dt_adaptive`.
         """
 
         if self.z_injection is not None:
             if (np.amax(self.xi) + self.prop_distance) < self.z_injection:
                 fields = []
 
+        if self.process_pool is not None:
+            # Evolve the particles in the worker processes.
+            self.process_pool.evolve(self, fields, t, dt, pusher, tolerance)
+            self.prop_distance += dt * ct.c
+            return
+
+        if self.chunk_size is not None:
+            # Evolve each chunk and keep the smallest recommended time step.
+            dt_adaptive = []
+            for chunk in self.iter_chunks():
+                chunk.evolve(fields, t, dt, pusher, tolerance)
+                dt_adaptive.append(chunk.dt_adaptive)
+            if pusher == 'boris_adaptive':
+                self.dt_adaptive = min(dt_adaptive)
+            self.prop_distance += dt * ct.c
+            return
+
         if pusher == 'rk4':
             apply_rk4_pusher(self, fields, t, dt)
         elif pusher == 'boris':
             apply_boris_pusher(self, fields, t, dt)
+        elif pusher == 'boris_adaptive':
+            self.dt_adaptive = apply_adaptive_boris_pusher(
+                self, fields, t, dt, tolerance)
+        elif pusher == 'linear_focusing':
+            apply_linear_focusing_pusher(self, fields, t, dt)
         else:
             raise ValueError(
                 f"Bunch pusher '{pusher}' not recognized. "
-                "Possible values are 'boris' and 'rk4'"
+                "Possible values are 'boris', 'boris_adaptive', 'rk4' and "
+                "'linear_focusing'"
             )
         self.prop_distance += dt * ct.c
 
@@ -303,25 +735,93 @@ class ParticleBunch():
         To improve performance, this copy won't contain copies of auxiliary
         arrays, only of the particle coordinates and properties.
         """
+        if self.is_contiguous:
+            # The data is copied into the buffer of the new bunch.
+            copy_data = np.asarray
+        else:
+            copy_data = deepcopy
         bunch_copy = ParticleBunch(
-            w=deepcopy(self.w),
-            x=deepcopy(self.x),
-            y=deepcopy(self.y),
-            xi=deepcopy(self.xi),
-            px=deepcopy(self.px),
-            py=deepcopy(self.py),
-            pz=deepcopy(self.pz),
+            w=copy_data(self.w),
+            x=copy_data(self.x),
+            y=copy_data(self.y),
+            xi=copy_data(self.xi),
+            px=copy_data(self.px),
+            py=copy_data(self.py),
+            pz=copy_data(self.pz),
             prop_distance=deepcopy(self.prop_distance),
             name=deepcopy(self.name),
             q_species=deepcopy(self.q_species),
-            m_species=deepcopy(self.m_species)
+            m_species=deepcopy(self.m_species),
+            contiguous=self.is_contiguous,
+            memmap_dir=self.memmap_dir,
+            chunk_size=self.chunk_size
         )
         bunch_copy.x_ref = self.x_ref
         bunch_copy.theta_ref = self.theta_ref
+        bunch_copy.boundaries = self.boundaries
+        bunch_copy.compaction_fraction = self.compaction_fraction
+        bunch_copy.merging = self.merging
+        bunch_copy.n_lost = self.n_lost
+        bunch_copy.lost_charge = self.lost_charge
+        if self._lost is not None:
+            bunch_copy._lost = self._lost.copy()
         return bunch_copy
 
+    def get_sub_bunch(self, indices: np.ndarray) -> ParticleBunch:
+        """Return a new bunch with a copy of a subset of the particles.
+
+        The sub-bunch keeps the storage (contiguous or memory-mapped) and the
+        chunk size of this bunch.
+
+        Parameters
+        ----------
+        indices : ndarray
+            Indices of the particles to include in the sub-bunch.
+        """
+        sub_bunch = ParticleBunch(
+            w=self.w[indices],
+            x=self.x[indices],
+            y=self.y[indices],
+            xi=self.xi[indices],
+            px=self.px[indices],
+            py=self.py[indices],
+            pz=self.pz[indices],
+            prop_distance=self.prop_distance,
+            z_injection=self.z_injection,
+            name=self.name,
+            q_species=self.q_species,
+            m_species=self.m_species,
+            contiguous=self.is_contiguous,
+            memmap_dir=self.memmap_dir,
+            chunk_size=self.chunk_size
+        )
+        return sub_bunch
+
+    def set_sub_bunch(
+        self,
+        sub_bunch: ParticleBunch,
+        indices: np.ndarray
+    ) -> None:
+        """Update a subset of the particles from a sub-bunch.
+
+        Parameters
+        ----------
+        sub_bunch : ParticleBunch
+            A sub-bunch obtained with `get_sub_bunch`.
+        indices : ndarray
+            Indices of the particles in the sub-bunch.
+        """
+        self.x[indices] = sub_bunch.x
+        self.y[indices] = sub_bunch.y
+        self.xi[indices] = sub_bunch.xi
+        self.px[indices] = sub_bunch.px
+        self.py[indices] = sub_bunch.py
+        self.pz[indices] = sub_bunch.pz
+
     def get_field_arrays(self):
         """Get the arrays where the gathered fields will be stored."""
+        if self._data is not None:
+            return _get_scratch_arrays(_N_FIELD_ARRAYS, len(self.x))
         if not self.__field_arrays_allocated:
             self.__preallocate_field_arrays()
         return (
@@ -331,6 +831,8 @@ class ParticleBunch():
 
     def get_rk4_arrays(self):
         """Get the arrays needed by the RK4 pusher."""
+        if self._data is not None:
+            return _get_scratch_arrays(_N_RK4_ARRAYS, len(self.x))
         if not self.__rk4_arrays_allocated:
             self.__preallocate_rk4_arrays()
         return (
@@ -0,0 +1,139 @@
+"""
+Contains an error-controlled version of the Boris pusher.
+
+The local error of each step is estimated by Richardson extrapolation
+(step doubling): the bunch is advanced once with the full time step and
+twice with half of it, and the difference between both results gives an
+estimate of the error. This estimate is used to choose the time step of
+the next push, as well as to split the current one into smaller substeps
+if the error is too large.
+"""
+import math
+
+import numpy as np
+from numba import prange
+
+from wake_t.utilities.numba import njit_parallel
+from .boris_pusher import apply_boris_pusher
+
+
+# Safety factor and limits for the variation of the time step.
+SAFETY_FACTOR = 0.9
+MAX_DT_INCREASE = 5.
+MIN_DT_DECREASE = 0.2
+# Maximum number of times that a step can be split into substeps.
+MAX_SPLITTING_LEVEL = 10
+
+
+def apply_adaptive_boris_pusher(bunch, fields, t, dt, tolerance):
+    """Evolve a particle bunch using the error-controlled Boris pusher.
+
+    The bunch is always evolved by `dt`. If the estimated error is larger
+    than the tolerance, the step is split into several substeps.
+
+    Parameters
+    ----------
+    bunch : ParticleBunch
+        The particle bunch to be evolved.
+    fields : list
+        List of fields within which the particle bunch will be evolved.
+    t : float
+        The current time.
+    dt : float
+        Time step by which to push the particles.
+    tolerance : float
+        Maximum allowed local error per step. The error of each particle
+        is measured relative to the RMS spread of the bunch in each
+        phase-space coordinate, and the RMS error over all particles
+        is compared to this tolerance.
+
+    Returns
+    -------
+    float
+        The recommended time step for the next push.
+    """
+    if dt <= 0.:
+        return dt
+    scales = get_error_scales(bunch)
+    return _advance(bunch, fields, t, dt, tolerance, scales, 0)
+
+
+def _advance(bunch, fields, t, dt, tolerance, scales, level):
+    """Advance the bunch by `dt`, splitting the step if needed."""
+    coords = _get_coordinates(bunch)
+    state_0 = [c.copy() for c in coords]
+
+    # Full step.
+    apply_boris_pusher(bunch, fields, t, dt)
+    state_full = [c.copy() for c in coords]
+    _set_coordinates(coords, state_0)
+
+    # Two half steps.
+    apply_boris_pusher(bunch, fields, t, dt/2)
+    apply_boris_pusher(bunch, fields, t + dt/2, dt/2)
+
+    # Estimate error (the local error of the Boris pusher scales as dt**3).
+    error = calculate_error_norm(*coords, *state_full, scales) / 3
+    error_ratio = error / tolerance
+
+    if error_ratio <= 1. or level >= MAX_SPLITTING_LEVEL:
+        # Accept step and return recommended time step.
+        if error_ratio == 0.:
+            factor = MAX_DT_INCREASE
+        else:
+            factor = SAFETY_FACTOR * error_ratio ** (-1/3)
+            factor = min(MAX_DT_INCREASE, max(MIN_DT_DECREASE, factor))
+        return dt * factor
+    else:
+        # Reject step and split it into smaller substeps.
+        _set_coordinates(coords, state_0)
+        n_sub = math.ceil((error_ratio / SAFETY_FACTOR) ** (1/3))
+        n_sub = max(n_sub, 2)
+        dt_sub = dt / n_sub
+        for i in range(n_sub):
+            dt_next = _advance(
+                bunch, fields, t + i * dt_sub, dt_sub, tolerance, scales,
+                level + 1)
+        return dt_next
+
+
+def get_error_scales(bunch):
+    """Get the scale of each coordinate used to normalize the error."""
+    scales = np.zeros(6)
+    for i, c in enumerate(_get_coordinates(bunch)):
+        scales[i] = np.std(c)
+    # Avoid a zero energy spread.
+    scales[5] = max(scales[5], 1e-3 * np.abs(np.mean(bunch.pz)))
+    # Avoid any other zero scale.
+    scales[scales == 0.] = 1.
+    return scales
+
+
+def _get_coordinates(bunch):
+    return [bunch.x, bunch.y, bunch.xi, bunch.px, bunch.py, bunch.pz]
+
+
+def _set_coordinates(coords, values):
+    for c, v in zip(coords, values):
+        c[:] = v
+
+
+@njit_parallel()
+def calculate_error_norm(x, y, xi, px, py, pz, x_2, y_2, xi_2, px_2, py_2,
+                         pz_2, scales):
+    """Calculate the RMS (over all particles) of the normalized error.
+
+    The error of each particle is the maximum normalized difference in
+    any of its coordinates.
+    """
+    n_part = x.shape[0]
+    error_2 = 0.
+    for i in prange(n_part):
+        e = abs(x[i] - x_2[i]) / scales[0]
+        e = max(e, abs(y[i] - y_2[i]) / scales[1])
+        e = max(e, abs(xi[i] - xi_2[i]) / scales[2])
+        e = max(e, abs(px[i] - px_2[i]) / scales[3])
+        e = max(e, abs(py[i] - py_2[i]) / scales[4])
+        e = max(e, abs(pz[i] - pz_2[i]) / scales[5])
+        error_2 += e * e
+    return math.sqrt(error_2 / max(n_part, 1))
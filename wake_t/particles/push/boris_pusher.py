@@ -7,7 +7,7 @@ import numpy as np
 import scipy.constants as ct
 from numba import prange
 
-from wake_t.utilities.numba import njit_parallel
+from wake_t.utilities.numba import njit_parallel, njit_serial
 from wake_t.fields.gather import gather_fields
 
 
@@ -46,17 +46,8 @@ def apply_boris_pusher(bunch, fields, t, dt):
 @njit_parallel()
 def apply_half_position_push(x, y, xi, px, py, pz, dt):
     for i in prange(x.shape[0]):
-        # Get particle momentum
-        px_i = px[i]
-        py_i = py[i]
-        pz_i = pz[i]
-
-        c_over_gamma_i = ct.c / np.sqrt(1 + (px_i**2 + py_i**2 + pz_i**2))
-
-        # Update particle position
-        x[i] += 0.5 * px_i * dt * c_over_gamma_i
-        y[i] += 0.5 * py_i * dt * c_over_gamma_i
-        xi[i] += 0.5 * (pz_i * c_over_gamma_i - ct.c) * dt
+        x[i], y[i], xi[i] = half_position_push(
+            x[i], y[i], xi[i], px[i], py[i], pz[i], dt)
 
 
 @njit_parallel()
@@ -64,36 +55,45 @@ def push_momentum(px, py, pz, ex, ey, ez, bx, by, bz, dt, q_over_mc):
     k = q_over_mc * dt / 2
 
     for i in prange(px.shape[0]):
-        # Get particle momentum and fields.
-        px_i = px[i]
-        py_i = py[i]
-        pz_i = pz[i]
-        ex_i = ex[i]
-        ey_i = ey[i]
-        ez_i = ez[i]
-        bx_i = bx[i]
-        by_i = by[i]
-        bz_i = bz[i]
-
-        p_minus_x = px_i + k * ex_i
-        p_minus_y = py_i + k * ey_i
-        p_minus_z = pz_i + k * ez_i
-        c_over_gamma_med = ct.c / \
-            np.sqrt(1 + (p_minus_x**2 + p_minus_y**2 + p_minus_z**2))
-        t_x = k * c_over_gamma_med * bx_i
-        t_y = k * c_over_gamma_med * by_i
-        t_z = k * c_over_gamma_med * bz_i
-        cons_s = 2/(1 + t_x**2 + t_y**2 + t_z**2)
-        s_x = cons_s * t_x
-        s_y = cons_s * t_y
-        s_z = cons_s * t_z
-
-        # Calculate first cross product
-        p_xc1 = p_minus_x + p_minus_y*t_z - p_minus_z*t_y
-        p_yc1 = p_minus_y + p_minus_z*t_x - p_minus_x*t_z
-        p_zc1 = p_minus_z + p_minus_x*t_y - p_minus_y*t_x
-
-        # Update particle momentum.
-        px[i] = p_minus_x + p_yc1*s_z - p_zc1*s_y + k*ex_i
-        py[i] = p_minus_y + p_zc1*s_x - p_xc1*s_z + k*ey_i
-        pz[i] = p_minus_z + p_xc1*s_y - p_yc1*s_x + k*ez_i
+        px[i], py[i], pz[i] = boris_momentum_push(
+            px[i], py[i], pz[i], ex[i], ey[i], ez[i], bx[i], by[i], bz[i], k)
+
+
+@njit_serial(inline='always')
+def half_position_push(x, y, xi, px, py, pz, dt):
+    """Advance the position of a single particle by half a time step."""
+    c_over_gamma = ct.c / np.sqrt(1 + (px**2 + py**2 + pz**2))
+
+    # Update particle position
+    x += 0.5 * px * dt * c_over_gamma
+    y += 0.5 * py * dt * c_over_gamma
+    xi += 0.5 * (pz * c_over_gamma - ct.c) * dt
+    return x, y, xi
+
+
+@njit_serial(inline='always')
+def boris_momentum_push(px, py, pz, ex, ey, ez, bx, by, bz, k):
+    """Advance the momentum of a single particle (`k = q*dt/(2*m*c)`)."""
+    p_minus_x = px + k * ex
+    p_minus_y = py + k * ey
+    p_minus_z = pz + k * ez
+    c_over_gamma_med = ct.c / \
+        np.sqrt(1 + (p_minus_x**2 + p_minus_y**2 + p_minus_z**2))
+    t_x = k * c_over_gamma_med * bx
+    t_y = k * c_over_gamma_med * by
+    t_z = k * c_over_gamma_med * bz
+    cons_s = 2/(1 + t_x**2 + t_y**2 + t_z**2)
+    s_x = cons_s * t_x
+    s_y = cons_s * t_y
+    s_z = cons_s * t_z
+
+    # Calculate first cross product
+    p_xc1 = p_minus_x + p_minus_y*t_z - p_minus_z*t_y
+    p_yc1 = p_minus_y + p_minus_z*t_x - p_minus_x*t_z
+    p_zc1 = p_minus_z + p_minus_x*t_y - p_minus_y*t_x
+
+    # Return updated particle momentum.
+    px = p_minus_x + p_yc1*s_z - p_zc1*s_y + k*ex
+    py = p_minus_y + p_zc1*s_x - p_xc1*s_z + k*ey
+    pz = p_minus_z + p_xc1*s_y - p_yc1*s_x + k*ez
+    return px, py, pz
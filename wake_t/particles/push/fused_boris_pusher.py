@@ -0,0 +1,242 @@
+"""
+Contains a Boris pusher that evolves a particle bunch through several
+consecutive time steps within a single compiled kernel.
+
+This is only possible when all fields are analytical (i.e., they do not
+depend on the particle distribution), so that each particle can be evolved
+independently of all others.
+"""
+import numpy as np
+import scipy.constants as ct
+from numba import njit
+
+from wake_t.utilities.numba import njit_serial, prange
+from wake_t.fields.analytical_field import AnalyticalField
+from .boris_pusher import half_position_push, boris_momentum_push
+
+
+# Number of particles pushed together by each thread. Small enough for the
+# particle data and gathered fields to remain in cache during all steps.
+CHUNK_SIZE = 256
+
+
+def apply_fused_boris_pusher(bunch, fields, t, dt):
+    """Evolve a particle bunch through several Boris steps in one kernel.
+
+    This is equivalent to calling `apply_boris_pusher` for each time step,
+    but all steps are carried out in a single `prange` loop over particles.
+
+    Parameters
+    ----------
+    bunch : ParticleBunch
+        The particle bunch to be evolved.
+    fields : list
+        List of `AnalyticalField`s within which the particle bunch will be
+        evolved.
+    t : ndarray
+        The initial time of each step.
+    dt : ndarray
+        The time step of each step.
+    """
+    if len(t) == 0:
+        return
+    t = np.asarray(t, dtype=np.float64)
+    dt = np.asarray(dt, dtype=np.float64)
+    # Range of `z = c*t + xi` that the particles could explore.
+    z_min = t[0] * ct.c + np.min(bunch.xi)
+    z_max = (t[-1] + dt[-1]) * ct.c + np.max(bunch.xi)
+    gather, static_constants, dynamic_constants = get_fused_gather(
+        fields, t + dt / 2, z_min, z_max)
+    q_over_mc = bunch.q_species / (bunch.m_species * ct.c)
+    push_particles_fused(
+        bunch.x, bunch.y, bunch.xi, bunch.px, bunch.py, bunch.pz, t, dt,
+        gather, static_constants, dynamic_constants, q_over_mc, CHUNK_SIZE)
+
+
+def get_fused_gather(fields, t_gather, z_min, z_max):
+    """Get a compiled function that gathers all `fields` serially.
+
+    The returned function has the signature
+    ``gather(x, y, z, t, ex, ey, ez, bx, by, bz, static_c, dynamic_c)``,
+    where ``static_c`` contains the constants that do not change in time and
+    ``dynamic_c`` those at time ``t``. These are also returned as arrays with
+    shape ``(n,)`` and ``(len(t_gather), m)``, respectively.
+
+    Parameters
+    ----------
+    fields : list
+        List of `AnalyticalField`s.
+    t_gather : ndarray
+        Times at which the fields will be gathered.
+    z_min, z_max : float
+        Range of `z = c*t + xi` that the particles could explore.
+    """
+    static_constants = []
+    dynamic_constants = []
+    n_static = 0
+    n_dynamic = 0
+    key = []
+    for field in fields:
+        check_fused_compatibility(field)
+        components, constants = field._get_serial_components(z_min, z_max)
+        if _overrides(field, '_get_constants'):
+            # Field with time-dependent constants.
+            constants = np.array([field._get_constants(t) for t in t_gather])
+            dynamic = True
+            i_start = n_dynamic
+            n_dynamic += constants.shape[1]
+            dynamic_constants.append(constants)
+        else:
+            constants = np.atleast_1d(np.asarray(constants, dtype=np.float64))
+            dynamic = False
+            i_start = n_static
+            n_static += constants.shape[0]
+            static_constants.append(constants)
+        i_end = i_start + constants.shape[-1]
+        for i_comp, component in enumerate(components):
+            if component is not None:
+                key.append((component, i_comp, dynamic, i_start, i_end))
+    # Build (or reuse) the gathering function.
+    key = tuple(key)
+    if key not in _fused_gather_functions:
+        gather = _gather_nothing
+        for component, i_comp, dynamic, i_start, i_end in key:
+            gather = _add_component(
+                gather, component, i_comp, dynamic, i_start, i_end)
+        _fused_gather_functions[key] = gather
+    gather = _fused_gather_functions[key]
+    # Join all constants.
+    if len(static_constants) > 0:
+        static_constants = np.concatenate(static_constants)
+    else:
+        static_constants = np.zeros(0)
+    if len(dynamic_constants) > 0:
+        dynamic_constants = np.ascontiguousarray(
+            np.concatenate(dynamic_constants, axis=1), dtype=np.float64)
+    else:
+        dynamic_constants = np.zeros((len(t_gather), 0))
+    return gather, static_constants, dynamic_constants
+
+
+def check_fused_compatibility(field):
+    """Check that a field can be gathered within a fused kernel."""
+    if not isinstance(field, AnalyticalField):
+        raise ValueError(
+            f'Field of type {type(field).__name__} cannot be used with fused '
+            'tracking. Only analytical fields are supported.'
+        )
+    # Fields that update their constants before each gather need to
+    # provide them in advance.
+    if (
+        _overrides(field, '_pre_gather') and not
+        (_overrides(field, '_get_constants') or
+         _overrides(field, '_get_serial_components'))
+    ):
+        raise ValueError(
+            f'Field of type {type(field).__name__} cannot be used with fused '
+            'tracking. It should implement `_get_constants` or '
+            '`_get_serial_components`.'
+        )
+
+
+def _overrides(field, method):
+    """Whether `field` overrides a method of `AnalyticalField`."""
+    return getattr(type(field), method) is not getattr(AnalyticalField, method)
+
+
+# Cache of the fused gathering functions, to avoid recompiling them.
+_fused_gather_functions = {}
+
+
+@njit_serial()
+def _gather_nothing(x, y, z, t, ex, ey, ez, bx, by, bz, s_c, d_c):
+    """Starting point of the chain of field components."""
+    pass
+
+
+def _add_component(previous, component, i_comp, dynamic, i_start, i_end):
+    """Chain a new field component to a gathering function."""
+    # Closures cannot be cached, so plain `njit` is used here.
+    @njit
+    def gather(x, y, z, t, ex, ey, ez, bx, by, bz, s_c, d_c):
+        previous(x, y, z, t, ex, ey, ez, bx, by, bz, s_c, d_c)
+        if dynamic:
+            constants = d_c[i_start:i_end]
+        else:
+            constants = s_c[i_start:i_end]
+        if i_comp == 0:
+            component(x, y, z, t, ex, constants)
+        elif i_comp == 1:
+            component(x, y, z, t, ey, constants)
+        elif i_comp == 2:
+            component(x, y, z, t, ez, constants)
+        elif i_comp == 3:
+            component(x, y, z, t, bx, constants)
+        elif i_comp == 4:
+            component(x, y, z, t, by, constants)
+        else:
+            component(x, y, z, t, bz, constants)
+    return gather
+
+
+# Not cached, since it is compiled for each gathering function and these are
+# not cached either.
+@njit(parallel=True)
+def push_particles_fused(x, y, xi, px, py, pz, t, dt, gather, static_c,
+                         dynamic_c, q_over_mc, chunk_size):
+    """Push the particles through all time steps in chunks of particles."""
+    n_part = x.shape[0]
+    n_chunks = (n_part + chunk_size - 1) // chunk_size
+    for i_chunk in prange(n_chunks):
+        i_start = i_chunk * chunk_size
+        i_end = min(i_start + chunk_size, n_part)
+        n = i_end - i_start
+
+        # Make local copy of the particle data.
+        x_c = x[i_start:i_end].copy()
+        y_c = y[i_start:i_end].copy()
+        xi_c = xi[i_start:i_end].copy()
+        px_c = px[i_start:i_end].copy()
+        py_c = py[i_start:i_end].copy()
+        pz_c = pz[i_start:i_end].copy()
+        ex = np.empty(n)
+        ey = np.empty(n)
+        ez = np.empty(n)
+        bx = np.empty(n)
+        by = np.empty(n)
+        bz = np.empty(n)
+
+        for i_step in range(t.shape[0]):
+            dt_i = dt[i_step]
+            k = q_over_mc * dt_i / 2
+
+            # Advance the particles half of one time step and reset fields.
+            for i in range(n):
+                x_c[i], y_c[i], xi_c[i] = half_position_push(
+                    x_c[i], y_c[i], xi_c[i], px_c[i], py_c[i], pz_c[i], dt_i)
+                ex[i] = 0.
+                ey[i] = 0.
+                ez[i] = 0.
+                bx[i] = 0.
+                by[i] = 0.
+                bz[i] = 0.
+
+            # Gather fields at this position.
+            gather(x_c, y_c, xi_c, t[i_step] + dt_i / 2,
+                   ex, ey, ez, bx, by, bz, static_c, dynamic_c[i_step])
+
+            # Push momentum and complete the position push.
+            for i in range(n):
+                px_c[i], py_c[i], pz_c[i] = boris_momentum_push(
+                    px_c[i], py_c[i], pz_c[i],
+                    ex[i], ey[i], ez[i], bx[i], by[i], bz[i], k)
+                x_c[i], y_c[i], xi_c[i] = half_position_push(
+                    x_c[i], y_c[i], xi_c[i], px_c[i], py_c[i], pz_c[i], dt_i)
+
+        # Store updated particle data.
+        x[i_start:i_end] = x_c
+        y[i_start:i_end] = y_c
+        xi[i_start:i_end] = xi_c
+        px[i_start:i_end] = px_c
+        py[i_start:i_end] = py_c
+        pz[i_start:i_end] = pz_c
@@ -0,0 +1,195 @@
+"""
+Contains a pusher that advances the particles analytically through linear
+focusing fields.
+
+Within each time step, the transverse force acting on each particle is
+approximated as a linear function of its position (the gradient is
+obtained by gathering the fields at slightly displaced positions) and the
+particle energy is assumed to be constant. The resulting equations of
+motion are solved exactly, so that the time step is not limited by the
+betatron period. The method is exact for the fields of plasma lenses,
+quadrupoles and blowout focusing, and remains accurate as long as the
+fields and particle energy vary slowly within one time step.
+"""
+import math
+
+import numpy as np
+import scipy.constants as ct
+
+from wake_t.utilities.numba import njit_parallel, njit_serial, prange
+from wake_t.fields.gather import gather_fields
+
+
+def apply_linear_focusing_pusher(bunch, fields, t, dt):
+    """Evolve a particle bunch using the linear-focusing pusher.
+
+    Parameters
+    ----------
+    bunch : ParticleBunch
+        The particle bunch to be evolved.
+    fields : list
+        List of fields within which the particle bunch will be evolved.
+    t : float
+        The current time.
+    dt : float
+        Time step by which to push the particles.
+    """
+    # Calculate particle species constant.
+    q_over_mc = bunch.q_species / (bunch.m_species * ct.c)
+
+    # Get the necessary arrays where the fields will be gathered. The RK4
+    # arrays are used for storing the displaced positions and the fields
+    # gathered there.
+    ex, ey, ez, bx, by, bz = bunch.get_field_arrays()
+    (x_dx, y_dy, _, _, _, _,
+     ex_dx, ey_dx, ez_dx, bx_dx, by_dx, bz_dx,
+     ex_dy, ey_dy, ez_dy, bx_dy, by_dy, bz_dy) = bunch.get_rk4_arrays()
+
+    # Displacement used for calculating the field gradients. Since the
+    # fields are assumed to be linear, its value is not critical.
+    dx = get_displacement(bunch.x)
+    dy = get_displacement(bunch.y)
+    x_dx[:] = bunch.x + dx
+    y_dy[:] = bunch.y + dy
+
+    # Gather fields at the particle position and at the displaced positions,
+    # all at the middle of the time step.
+    t_mid = t + dt / 2
+    gather_fields(fields, bunch.x, bunch.y, bunch.xi, t_mid,
+                  ex, ey, ez, bx, by, bz)
+    gather_fields(fields, x_dx, bunch.y, bunch.xi, t_mid,
+                  ex_dx, ey_dx, ez_dx, bx_dx, by_dx, bz_dx)
+    gather_fields(fields, bunch.x, y_dy, bunch.xi, t_mid,
+                  ex_dy, ey_dy, ez_dy, bx_dy, by_dy, bz_dy)
+
+    # Advance particles.
+    push_particles_linear_focusing(
+        bunch.x, bunch.y, bunch.xi, bunch.px, bunch.py, bunch.pz,
+        ex, ey, ez, bx, by, bz,
+        ex_dx, by_dx, bz_dx, ey_dy, bx_dy, bz_dy,
+        dx, dy, dt, q_over_mc)
+
+
+def get_displacement(x):
+    """Get the displacement used to compute the transverse field gradient."""
+    dx = np.std(x) if x.shape[0] > 1 else 0.
+    if dx == 0.:
+        dx = 1e-6
+    return dx
+
+
+@njit_parallel()
+def push_particles_linear_focusing(
+        x, y, xi, px, py, pz, ex, ey, ez, bx, by, bz,
+        ex_dx, by_dx, bz_dx, ey_dy, bx_dy, bz_dy, dx, dy, dt, q_over_mc):
+    """Advance the particles through linear transverse fields.
+
+    The fields `ex_dx`, `by_dx`, `bz_dx` have been gathered at `x + dx`,
+    and `ey_dy`, `bx_dy`, `bz_dy` at `y + dy`.
+    """
+    c = ct.c
+    for i in prange(x.shape[0]):
+        x_i = x[i]
+        y_i = y[i]
+        px_i = px[i]
+        py_i = py[i]
+        pz_i = pz[i]
+
+        # Initial velocity.
+        gamma_0 = math.sqrt(1. + px_i**2 + py_i**2 + pz_i**2)
+        vx = c * px_i / gamma_0
+        vy = c * py_i / gamma_0
+        vz = c * pz_i / gamma_0
+
+        # Transverse force (per unit charge) at the particle position
+        # and at the displaced positions.
+        fx = ex[i] + vy * bz[i] - vz * by[i]
+        fy = ey[i] + vz * bx[i] - vx * bz[i]
+        fx_dx = ex_dx[i] + vy * bz_dx[i] - vz * by_dx[i]
+        fy_dy = ey_dy[i] + vz * bx_dy[i] - vx * bz_dy[i]
+        dfx_dx = (fx_dx - fx) / dx
+        dfy_dy = (fy_dy - fy) / dy
+
+        # Energy gain due to the longitudinal field. The transverse motion
+        # is computed with the energy at the middle of the step.
+        dgamma_z = q_over_mc * vz / c * ez[i] * dt
+        gamma_m = gamma_0 + 0.5 * dgamma_z
+        a = c * q_over_mc / gamma_m
+
+        # Transverse motion.
+        vx_0 = c * px_i / gamma_m
+        vy_0 = c * py_i / gamma_m
+        x_f, vx_f, int_vx2 = advance_linear_oscillator(
+            x_i, vx_0, -a * dfx_dx, a * (fx - dfx_dx * x_i), dt)
+        y_f, vy_f, int_vy2 = advance_linear_oscillator(
+            y_i, vy_0, -a * dfy_dy, a * (fy - dfy_dy * y_i), dt)
+
+        # Energy gain due to the transverse electric field, assumed to vary
+        # linearly with the position.
+        delta_x = x_f - x_i
+        delta_y = y_f - y_i
+        dex_dx = (ex_dx[i] - ex[i]) / dx
+        dey_dy = (ey_dy[i] - ey[i]) / dy
+        dgamma_t = q_over_mc / c * (
+            ex[i] * delta_x + 0.5 * dex_dx * delta_x**2 +
+            ey[i] * delta_y + 0.5 * dey_dy * delta_y**2
+        )
+
+        # Final momentum.
+        gamma_f = gamma_0 + dgamma_z + dgamma_t
+        px_f = gamma_m * vx_f / c
+        py_f = gamma_m * vy_f / c
+        pz_f2 = gamma_f**2 - 1. - px_f**2 - py_f**2
+        pz_f = math.sqrt(pz_f2) if pz_f2 > 0. else 0.
+
+        # Longitudinal slippage. The longitudinal velocity is
+        # `v_z = c*sqrt(1 - eps)`, with `eps = 1/gamma^2 + v_perp^2/c^2`,
+        # and is integrated by using the average value of `eps`.
+        int_eps = dt / gamma_m**2 + (int_vx2 + int_vy2) / c**2
+        eps = min(int_eps / dt, 1.) if dt > 0. else 0.
+        dxi = - c * int_eps / (1. + math.sqrt(1. - eps))
+
+        x[i] = x_f
+        y[i] = y_f
+        xi[i] += dxi
+        px[i] = px_f
+        py[i] = py_f
+        pz[i] = pz_f
+
+
+@njit_serial(inline='always')
+def advance_linear_oscillator(x_0, v_0, kappa, a, t):
+    """Advance the solution of `x'' = -kappa * x + a` by a time `t`.
+
+    Returns the final position and velocity, as well as the time integral
+    of the squared velocity.
+    """
+    phi = kappa * t**2
+    if abs(phi) < 1e-2:
+        # Use series expansions to avoid cancellation errors.
+        cf = 1. - phi / 2. + phi**2 / 24. - phi**3 / 720.
+        sf = t * (1. - phi / 6. + phi**2 / 120. - phi**3 / 5040.)
+        df = t**2 * (0.5 - phi / 24. + phi**2 / 720. - phi**3 / 40320.)
+        int_s2 = t**3 * (
+            1. / 3. - phi / 15. + 2. * phi**2 / 315. - phi**3 / 2835.)
+    else:
+        if kappa > 0.:
+            w = math.sqrt(kappa)
+            cf = math.cos(w * t)
+            sf = math.sin(w * t) / w
+        else:
+            w = math.sqrt(-kappa)
+            cf = math.cosh(w * t)
+            sf = math.sinh(w * t) / w
+        df = (1. - cf) / kappa
+        int_s2 = (t - sf * cf) / (2. * kappa)
+    int_c2 = 0.5 * (t + sf * cf)
+    int_cs = 0.5 * sf**2
+
+    # Acceleration at t=0.
+    f = a - kappa * x_0
+
+    x = x_0 * cf + v_0 * sf + a * df
+    v = v_0 * cf + f * sf
+    int_v2 = v_0**2 * int_c2 + 2. * v_0 * f * int_cs + f**2 * int_s2
+    return x, v, int_v2
@@ -2,11 +2,17 @@
 
 import numpy as np
 
+from wake_t.utilities.numba import njit_parallel, prange
 from wake_t.physics_models.beam_optics.transfer_matrices import (
-    first_order_matrix, second_order_matrix
+    first_order_matrix, second_order_matrix, linear_focusing_matrix,
+    linear_focusing_second_order_matrix
 )
 
 
+# Number of particles processed together by each thread.
+CHUNK_SIZE = 1024
+
+
 def track_with_transfer_map(beam_matrix, z, L, theta, k1, k2, gamma_ref,
                             order=2):
     """
@@ -43,10 +49,142 @@ def track_with_transfer_map(beam_matrix, z, L, theta, k1, k2, gamma_ref,
         Indicates the order of the transport map to apply. Tracking up to
         second order is possible.
 
+    """
+    R, T = get_transfer_map(z, L, theta, k1, k2, gamma_ref, order)
+    bm_new = np.array(beam_matrix, dtype=np.float64)
+    apply_transfer_map(bm_new, R, T)
+    return bm_new
+
+
+def get_transfer_map(z, L, theta, k1, k2, gamma_ref, order=2):
+    """
+    Get the first- and second-order matrices of a transfer map.
+
+    Parameters
+    ----------
+    z, L, theta, k1, k2, gamma_ref, order
+        Same as in `track_with_transfer_map`.
+
+    Returns
+    -------
+    A tuple with the 6 x 6 first-order matrix `R` and the 6 x 6 x 6
+    second-order matrix `T` (which is zero if ``order=1``).
+
     """
     R = first_order_matrix(z, L, theta, k1, gamma_ref)
-    bm_new = np.dot(R, beam_matrix)
     if order == 2:
         T = second_order_matrix(z, L, theta, k1, k2, gamma_ref)
-        bm_new += np.einsum('ijk,j...,k...', T, beam_matrix, beam_matrix).T
-    return bm_new
+    else:
+        T = np.zeros((6, 6, 6))
+    return R, T
+
+
+def get_linear_focusing_map(z, dex_dx, dey_dy, dbx_dy, dby_dx, gamma_ref,
+                            q_over_m):
+    """
+    Get the first- and second-order matrices of the transfer map of an
+    element with linear transverse fields.
+
+    Parameters
+    ----------
+    z, dex_dx, dey_dy, dbx_dy, dby_dx, gamma_ref, q_over_m
+        Same as in `linear_focusing_matrix`.
+
+    Returns
+    -------
+    A tuple with the 6 x 6 first-order matrix `R` and the 6 x 6 x 6
+    second-order matrix `T`.
+
+    """
+    args = (z, dex_dx, dey_dy, dbx_dy, dby_dx, gamma_ref, q_over_m)
+    R = linear_focusing_matrix(*args)
+    T = linear_focusing_second_order_matrix(*args)
+    return R, T
+
+
+def compose_transfer_maps(R_1, T_1, R_2, T_2):
+    """
+    Compose two transfer maps into a single one, truncated at second order.
+
+    Parameters
+    ----------
+    R_1, T_1 : array
+        First- and second-order matrices of the first map.
+    R_2, T_2 : array
+        First- and second-order matrices of the second map, which is applied
+        after the first one.
+
+    Returns
+    -------
+    A tuple with the first- and second-order matrices of the composed map.
+
+    """
+    R = np.dot(R_2, R_1)
+    T = (np.einsum('il,ljk->ijk', R_2, T_1) +
+         np.einsum('ilm,lj,mk->ijk', T_2, R_1, R_1))
+    return R, T
+
+
+@njit_parallel()
+def apply_transfer_map(beam_matrix, R, T):
+    """
+    Apply a transfer map to a beam distribution (in place).
+
+    Each particle coordinate is updated as
+    ``x_i = sum_j R_ij x_j + sum_jk T_ijk x_j x_k``. Only the non-zero
+    elements of `R` and `T` are evaluated, and the particles are processed
+    in chunks, so that no large temporary arrays are created.
+
+    Parameters
+    ----------
+    beam_matrix : array
+        6 x N matrix with the phase-space coordinates of the bunch, as in
+        `track_with_transfer_map`.
+    R : array
+        6 x 6 first-order matrix.
+    T : array
+        6 x 6 x 6 second-order matrix.
+
+    """
+    # Get non-zero elements of the second-order matrix.
+    n_terms = 0
+    for i in range(6):
+        for j in range(6):
+            for k in range(6):
+                if T[i, j, k] != 0.:
+                    n_terms += 1
+    T_idx = np.empty((n_terms, 3), dtype=np.int64)
+    T_val = np.empty(n_terms)
+    n = 0
+    for i in range(6):
+        for j in range(6):
+            for k in range(6):
+                if T[i, j, k] != 0.:
+                    T_idx[n, 0] = i
+                    T_idx[n, 1] = j
+                    T_idx[n, 2] = k
+                    T_val[n] = T[i, j, k]
+                    n += 1
+
+    # Apply map to each chunk of particles.
+    n_part = beam_matrix.shape[1]
+    n_chunks = (n_part + CHUNK_SIZE - 1) // CHUNK_SIZE
+    for i_chunk in prange(n_chunks):
+        i_start = i_chunk * CHUNK_SIZE
+        i_end = min(i_start + CHUNK_SIZE, n_part)
+        x = beam_matrix[:, i_start:i_end].copy()
+        x_new = np.zeros_like(x)
+        for i in range(6):
+            for j in range(6):
+                r_ij = R[i, j]
+                if r_ij != 0.:
+                    for m in range(x.shape[1]):
+                        x_new[i, m] += r_ij * x[j, m]
+        for n in range(n_terms):
+            i = T_idx[n, 0]
+            j = T_idx[n, 1]
+            k = T_idx[n, 2]
+            t_ijk = T_val[n]
+            for m in range(x.shape[1]):
+                x_new[i, m] += t_ijk * x[j, m] * x[k, m]
+        beam_matrix[:, i_start:i_end] = x_new
@@ -1,4 +1,5 @@
 import numpy as np
+import scipy.constants as ct
 
 
 def first_order_matrix(z, L, theta, k1, gamma_ref):
@@ -256,3 +257,102 @@ def second_order_matrix(z, L, theta, k1, k2, gamma_ref):
     T[4, 2, 3] = -T534*2
     T[4, 3, 3] = -T544
     return T
+
+
+def linear_focusing_matrix(z, dex_dx, dey_dy, dbx_dy, dby_dx, gamma_ref,
+                           q_over_m, dp=0.):
+    """
+    Calculate the first order matrix of an element with linear transverse
+    fields (such as a plasma lens, a field quadrupole or the ion channel of
+    a blowout) for a particle with a relative momentum deviation `dp`.
+
+    Parameters
+    ----------
+    z : float
+        Longitudinal position in which to calculate the transfer matrix
+    dex_dx, dey_dy : float
+        Transverse gradient of the Ex and Ey fields in units of V/m^2.
+    dbx_dy, dby_dx : float
+        Transverse gradient of the Bx and By fields in units of T/m.
+    gamma_ref : float
+        Reference energy with respect to which the particle momentum dp is
+        calculated.
+    q_over_m : float
+        Charge-to-mass ratio of the particle species.
+    dp : float
+        Momentum deviation of the particle (see `first_order_matrix`).
+
+    """
+    kx2, ky2, r = _linear_focusing_strength(
+        dex_dx, dey_dy, dbx_dy, dby_dx, gamma_ref, q_over_m, dp)
+    cx, sx = _cos_sin(z, kx2)
+    cy, sy = _cos_sin(z, ky2)
+    r56 = -z/(gamma_ref**2 - 1)
+    u_matrix = np.array([[cx, sx*r, 0., 0., 0., 0.],
+                         [-kx2*sx/r, cx, 0., 0., 0., 0.],
+                         [0., 0., cy, sy*r, 0., 0.],
+                         [0., 0., -ky2*sy/r, cy, 0., 0.],
+                         [0., 0., 0., 0., 1., r56],
+                         [0., 0., 0., 0., 0., 1.]])
+    return u_matrix
+
+
+def linear_focusing_second_order_matrix(
+        z, dex_dx, dey_dy, dbx_dy, dby_dx, gamma_ref, q_over_m, dp_step=1e-4):
+    """
+    Calculate the second order matrix of an element with linear transverse
+    fields.
+
+    It contains the chromatic terms (i.e., the dependence of the
+    first-order matrix on `dp`), which are obtained by finite differences,
+    and the change in path length due to the transverse motion.
+
+    Parameters
+    ----------
+    z, dex_dx, dey_dy, dbx_dy, dby_dx, gamma_ref, q_over_m
+        Same as in `linear_focusing_matrix`.
+    dp_step : float
+        Step in `dp` used for the finite differences.
+
+    """
+    args = (z, dex_dx, dey_dy, dbx_dy, dby_dx, gamma_ref, q_over_m)
+    R_plus = linear_focusing_matrix(*args, dp=dp_step)
+    R_minus = linear_focusing_matrix(*args, dp=-dp_step)
+    T = np.zeros((6, 6, 6))
+    T[:4, :4, 5] = (R_plus[:4, :4] - R_minus[:4, :4]) / (2 * dp_step)
+    # Path length. The slope of the trajectory is `-k*s*x + c*r*x'`.
+    kx2, ky2, r = _linear_focusing_strength(*args[1:])
+    for i, k2 in [(0, kx2), (2, ky2)]:
+        c, s = _cos_sin(z, k2)
+        int_c2 = 0.5 * (z + s * c)
+        int_s2 = (z - s * c) / (2 * k2) if k2 != 0 else z**3 / 3
+        int_sc = 0.5 * s**2
+        T[4, i, i] = 0.5 * k2**2 * int_s2
+        T[4, i, i+1] = -k2 * r * int_sc
+        T[4, i+1, i+1] = 0.5 * r**2 * int_c2
+    return T
+
+
+def _linear_focusing_strength(dex_dx, dey_dy, dbx_dy, dby_dx, gamma_ref,
+                              q_over_m, dp=0.):
+    """
+    Get the focusing strength (in units of 1/m^2) in each plane and the
+    ratio between the reference and particle momentum, which relates x' to
+    the slope of the particle trajectory.
+    """
+    c = ct.c
+    p_ref = np.sqrt(gamma_ref**2 - 1)
+    gamma = gamma_ref + p_ref * dp
+    p = np.sqrt(gamma**2 - 1)
+    beta = p / gamma
+    kx2 = -q_over_m * (dex_dx - beta * c * dby_dx) / (p * beta * c**2)
+    ky2 = -q_over_m * (dey_dy + beta * c * dbx_dy) / (p * beta * c**2)
+    return kx2, ky2, p_ref / p
+
+
+def _cos_sin(z, k2):
+    """Get the cosine- and sine-like functions of a focusing channel."""
+    k = np.sqrt(k2 + 0.j)
+    c = np.cos(z*k).real
+    s = (np.sin(k*z)/k).real if k != 0 else z
+    return c, s
@@ -7,10 +7,12 @@ the CSR effects on the bunch are strongly based on the 1D CSR model from OCELOT
 
 """
 from typing import Optional
+from collections import OrderedDict
 
 import numpy as np
-from scipy import stats
-import scipy.constants as ct
+from scipy import signal
+
+from .csr_kernel import calculate_averaged_kernel, calculate_kernels
 
 
 class CSRCalculator():
@@ -18,16 +20,27 @@ class CSRCalculator():
 
     def __init__(self):
         self._ref_traj = None
+        self._ref_traj_signatures = []
         self._lattice_elements = []
         self._lattice_element_steps = []
         self._lattice_element_traj_steps = []
+        self._kernel_cache = OrderedDict()
+        self.kernel_cache_hits = 0
+        self.kernel_cache_misses = 0
         self.set_settings()
 
-    def set_settings(self, csr_step=0.1, csr_traj_step=0.0005, n_bins=2000):
+    def set_settings(self, csr_step=0.1, csr_traj_step=0.0005, n_bins=2000,
+                     kernel_cache_size=0, kernel_bin_tolerance=0.,
+                     kernel_gamma_tolerance=0.):
         """Set the setting for CSR calculation."""
         self._csr_step = csr_step
         self._csr_traj_step = csr_traj_step
         self._n_bins = n_bins
+        self._kernel_cache_size = kernel_cache_size
+        self._kernel_bin_tolerance = kernel_bin_tolerance
+        self._kernel_gamma_tolerance = kernel_gamma_tolerance
+        while len(self._kernel_cache) > kernel_cache_size:
+            self._kernel_cache.popitem(last=False)
 
     def add_lattice_element(self, element):
         """Add lattice element to CSR calculator"""
@@ -50,8 +63,29 @@ class CSRCalculator():
 
         """
         self._ref_traj = None
+        self._ref_traj_signatures = []
         self._lattice_elements = []
         self._lattice_element_steps = []
+        self._lattice_element_traj_steps = []
+
+    def clear_kernel_cache(self):
+        """Clear the cache of CSR kernels and reset its counters."""
+        self._kernel_cache.clear()
+        self.kernel_cache_hits = 0
+        self.kernel_cache_misses = 0
+
+    def get_kernel_cache_info(self):
+        """
+        Get the number of hits and misses of the CSR kernel cache, as well as
+        its current and maximum size.
+
+        """
+        return {
+            'hits': self.kernel_cache_hits,
+            'misses': self.kernel_cache_misses,
+            'size': len(self._kernel_cache),
+            'max_size': self._kernel_cache_size
+        }
 
     def apply_csr(self, bunch_matrix, bunch_q, gamma, element, element_pos):
         """
@@ -94,13 +128,12 @@ class CSRCalculator():
         bunch_hist, bin_edges = np.histogram(z, self._n_bins, weights=bunch_q)
 
         # Make profile smooth (important to prevent instabilities) using
-        # a Gaussian KDE. This method might be changed/optimized.
+        # a Gaussian KDE.
         bin_size = bin_edges[1] - bin_edges[0]
         n_part = len(bunch_q)
         bin_centers = bin_edges[1:] - bin_size/2
-        bunch_pdf = stats.gaussian_kde(
-            bin_centers, bw_method=n_part**(-1/5), weights=bunch_hist)
-        bunch_hist = bunch_pdf(bin_centers) * bin_size * bunch_hist.sum()
+        bunch_hist = smooth_line_charge(
+            bunch_hist, bin_centers, n_part**(-1/5))
         bin_center_0 = bin_centers[0]
 
         # Determine iteration range.
@@ -108,17 +141,13 @@ class CSRCalculator():
         idx = (np.abs(s_array - s_current)).argmin()
         idx_prev = (np.abs(s_array - (s_current - ds_csr))).argmin()
         it_range = np.arange(idx_prev, idx) + 1
-        n_iter = len(it_range)
 
         # Calculate CSR kernel.
-        K1 = 0
-        for it in it_range:
-            K1 += self._calculate_kernel(it, self._ref_traj, self._n_bins,
-                                         bin_size, gamma)
-        K1 /= n_iter
+        K1 = self._get_averaged_kernel(it_range, bin_size, gamma)
 
-        # Convolve kernel with line charge
-        lam_K1 = np.convolve(bunch_hist, K1[::-1]) / bin_size * ds_csr
+        # Convolve kernel with line charge. Depending on the number of bins,
+        # the convolution is computed directly or with FFTs.
+        lam_K1 = signal.convolve(bunch_hist, K1[::-1]) / bin_size * ds_csr
 
         # Calculate and apply energy kick
         z_norm = z * (1./bin_size) - bin_center_0/bin_size
@@ -162,6 +191,7 @@ class CSRCalculator():
         traj = np.zeros((7, n_steps))
         if self._ref_traj is None:
             self._ref_traj = np.transpose([[0, 0, 0, 0, 0, 0, 1.]])
+            self._ref_traj_signatures = [()]
         traj_start = self._ref_traj[:, [-1]]
         e1 = traj_start[4:]
         l_traj = np.linspace(ds_traj, element.length, n_steps)
@@ -190,237 +220,140 @@ class CSRCalculator():
         self._ref_traj = np.append(self._ref_traj, traj, axis=1)
         self._lattice_element_steps.append(n_steps)
 
-    def _calculate_kernel(self, i, traj, n_bins, bin_size, gamma):
+        # The trajectory up to each point is fully determined by the
+        # geometry of the elements traversed so far. Store it as a
+        # signature of each point to be used as key of the kernel cache.
+        signature = self._ref_traj_signatures[-1] + (
+            (element.length, element.theta, n_steps), )
+        self._ref_traj_signatures.extend([signature] * n_steps)
+
+    def _get_averaged_kernel(self, it_range, bin_size, gamma):
         """
-        Calculate CSR kernel.
+        Get the average CSR kernel over several trajectory points, computing
+        the kernels of each point or taking them from the kernel cache.
 
-        The implementation of this method is an adaptation of code from OCELOT
-        (https://github.com/ocelot-collab/ocelot) written by S. Tomin and
-        M. Dohlus.
+        The kernels in the cache are stored for bin sizes quantized with a
+        relative step given by the `kernel_bin_tolerance`. The kernel of the
+        quantized bin size is rescaled to the actual bin size, which is
+        exact when the tolerance is ``0``. Likewise, the kernels are
+        computed for a reference gamma quantized with a relative step given
+        by the `kernel_gamma_tolerance`.
 
         Parameters
         ----------
-        i : int
-            Iteration index.
-        traj : ndarray
-            Reference trajectory along which CSR forces are calculated
-        n_bins : int
-            Number of bins of the longitudinal bunch histogram.
-        bin_size : int
+        it_range : ndarray
+            Indices of the trajectory points.
+        bin_size : float
             Size of the histogram bins.
-        gamma: float
-            reference gamma to calculate CSR kernel.
+        gamma : float
+            Reference gamma to calculate CSR kernel.
 
         """
-
-        w_range = np.arange(-n_bins, 0) * bin_size
-
-        # Calculate long-range interactions.
-        w, KS = self._calculate_kernel_long_range(i, traj, w_range[0], gamma)
-
-        # Calculate short-range interactions.
-        w_min = np.min(w)
-        if w_range[0] < w_min:
-            m = np.where(w_range < w_min)[0][-1]
-            KS2 = self._calculate_kernel_short_range(
-                i, traj, np.append(w_range[0:m+1], w_min), gamma)
-            KS1 = KS[0]
-            KS2 = (KS2[-1] - KS2) + KS1
-            KS = np.append(KS2[0:-1], np.interp(w_range[m+1:], w, KS))
-        else:
-            KS = np.interp(w_range, w, KS)
-
-        four_pi_eps0 = 1./(1e-7*ct.c**2)
-        K1 = np.diff(np.diff(KS, append=0), append=0) / bin_size / four_pi_eps0
+        if self._kernel_cache_size == 0:
+            return calculate_averaged_kernel(
+                it_range, self._ref_traj, self._n_bins, bin_size, gamma)
+
+        # Quantize bin size and gamma.
+        bin_index, bin_size_q = quantize(
+            bin_size, self._kernel_bin_tolerance)
+        gamma_index, gamma_q = quantize(gamma, self._kernel_gamma_tolerance)
+
+        # Get kernels from cache.
+        keys = [
+            (self._ref_traj_signatures[i], i, self._n_bins, bin_index,
+             gamma_index)
+            for i in it_range
+        ]
+        kernels = []
+        missing = []
+        for n, key in enumerate(keys):
+            K1_n = self._kernel_cache.get(key)
+            if K1_n is None:
+                self.kernel_cache_misses += 1
+                missing.append(n)
+            else:
+                self.kernel_cache_hits += 1
+                self._kernel_cache.move_to_end(key)
+            kernels.append(K1_n)
+
+        # Calculate missing kernels and add them to the cache.
+        if len(missing) > 0:
+            new_kernels = calculate_kernels(
+                it_range[missing], self._ref_traj, self._n_bins, bin_size_q,
+                gamma_q)
+            for n, K1_n in zip(missing, new_kernels):
+                kernels[n] = K1_n
+                self._kernel_cache[keys[n]] = K1_n
+            while len(self._kernel_cache) > self._kernel_cache_size:
+                self._kernel_cache.popitem(last=False)
+
+        # Average kernels.
+        K1 = 0
+        for K1_n in kernels:
+            K1 += K1_n
+        K1 /= len(kernels)
+        if bin_size_q != bin_size:
+            K1 *= bin_size / bin_size_q
         return K1
 
-    def _calculate_kernel_long_range(self, i, traj, wmin, gamma):
-        """
-        The implementation of this method is an adaptation of code from OCELOT
-        (https://github.com/ocelot-collab/ocelot) written by S. Tomin and
-        M. Dohlus.
 
-        For details about the CSR model, see section 2.6 of:
-        https://www.desy.de/~dohlus/UWake/
-        Two%20Methods%20for%20the%20Calculation%20of%20CSR%20Fields.pdf
-
-        Parameters
-        ----------
-        i : int
-            Iteration index.
-        traj: ndarray
-            Reference trajectory along which CSR forces are calculated.
-        wmin: float
-            Leftmost edge of the longitudinal bunch histogram.
-        gamma: float
-            reference gamma to calculate CSR kernel.
-
-        """
-
-        # Relativistic parameters
-        gamma_sq_inv = 1. / gamma ** 2
-        beta_sq = 1. - gamma_sq_inv
-        beta = np.sqrt(beta_sq)
-
-        i_0 = self._estimate_start_index(i, traj, wmin, beta)
-        # i_0 = 0
-
-        # Reference trajectory positions with respect to the current one.
-        s = traj[0, i_0:i] - traj[0, i]
-
-        # Distance (in x, y, z) from the current to previous trajectory points.
-        n0 = traj[1, i] - traj[1, i_0:i]
-        n1 = traj[2, i] - traj[2, i_0:i]
-        n2 = traj[3, i] - traj[3, i_0:i]
-
-        # Distance from the current to previous trajectory points.
-        R = np.sqrt(n0*n0 + n1*n1 + n2*n2)
-
-        w = s + beta * R
-
-        # Indices of trajectory locations where w<wmin
-        j = np.where(w <= wmin)[0]
-        if len(j) > 0:
-            j = j[-1]
-            w = w[j:i]
-            s = s[j:i]
-            n0 = n0[j:]
-            n1 = n1[j:]
-            n2 = n2[j:]
-            R = R[j:]
-            j += i_0
-        else:
-            j = i_0
-
-        # Tangential unit vectors along trajectory until current position.
-        t4 = traj[4, j:i]
-        t5 = traj[5, j:i]
-        t6 = traj[6, j:i]
-
-        t4_i = traj[4, i]
-        t5_i = traj[5, i]
-        t6_i = traj[6, i]
-
-        # Calculate kernel
-        R_inv = 1 / R
-        n0 *= R_inv
-        n1 *= R_inv
-        n2 *= R_inv
+def quantize(value, rel_step):
+    """
+    Quantize a positive value in logarithmic steps of relative size
+    `rel_step`.
 
-        x = n0 * t4 + n1 * t5 + n2 * t6
-        K = ((beta * (x - n0 * t4_i - n1 * t5_i - n2 * t6_i) -
-              beta_sq * (1. - t4 * t4_i - t5 * t5_i - t6 * t6_i) -
-              gamma_sq_inv) * R_inv -
-             (1. - beta * x) / w * gamma_sq_inv)
+    Returns the index of the step (which can be used as a dictionary key)
+    and the quantized value. If `rel_step` is ``0``, the value is not
+    quantized and is returned as index.
+    """
+    if rel_step > 0:
+        log_step = np.log1p(rel_step)
+        index = int(np.round(np.log(value) / log_step))
+        return index, np.exp(index * log_step)
+    return value, value
 
-        # Integrate kernel
-        K[:-1] += K[1:]
-        K *= 0.5 * np.diff(s, append=0)
-        K = np.cumsum(K[::-1])[::-1]
 
-        return w, K
+def smooth_line_charge(hist, bin_centers, bw_factor):
+    """
+    Smooth a line charge histogram with a Gaussian kernel density estimate.
 
-    def _calculate_kernel_short_range(self, i, traj, w_range, gamma):
-        """
-        Calculate short-range contributions to CSR kernel.
+    The result is the same as evaluating a weighted `scipy.stats.gaussian_kde`
+    of the bin centers at the bin centers (and scaling it to the total charge
+    of the histogram). Since the bins are equally spaced, this is computed
+    as a convolution of the histogram with a Gaussian kernel, which is done
+    with FFTs when the number of bins is large.
 
-        The implementation of this method is an adaptation of code from OCELOT
-        (https://github.com/ocelot-collab/ocelot) written by S. Tomin and
-        M. Dohlus.
-
-        Parameters
-        ----------
-        i : int
-            Iteration index.
-        traj: ndarray
-            Reference trajectory along which CSR forces are calculated.
-        wrange: ndarray
-            Region of beam < w_min.
-        gamma: float
-            reference gamma to calculate CSR kernel.
+    Parameters
+    ----------
+    hist : ndarray
+        Charge in each bin of the histogram.
+    bin_centers : ndarray
+        Position of the (equally-spaced) bin centers.
+    bw_factor : float
+        Bandwidth factor of the KDE, i.e., the ratio between the width of
+        the Gaussian kernel and the (weighted) standard deviation of the
+        histogram.
+
+    Returns
+    -------
+    An array with the smoothed charge in each bin.
 
-        """
-        # Relativistic parameters
-        gamma_sq = gamma**2
-        gamma_sq_inv = 1./gamma_sq
-        beta_sq = 1. - gamma_sq_inv
-        beta = np.sqrt(beta_sq)
-
-        # winf
-        Rv1 = traj[1:4, i] - traj[1:4, 0]
-        s1 = traj[0, 0] - traj[0, i]
-        ev1 = traj[4:, 0]
-        evo = traj[4:, i]
-        winfms1 = np.dot(Rv1, ev1)
-
-        aup = -Rv1 + winfms1*ev1
-        a2 = np.dot(aup, aup)
-        a = np.sqrt(a2)
-
-        uup = aup/a if a != 0 else None
-
-        winf = s1 + winfms1
-        s = winf + gamma * (gamma * (w_range - winf) -
-                            beta * np.sqrt(gamma_sq*(w_range-winf)**2 + a2))
-        R = (w_range-s) / beta
-
-        KS = (beta * (1. - np.dot(ev1, evo)) * np.log(R[0]/R) -
-              (beta_sq * np.dot(ev1, evo) - 1.) * np.log(
-                  (winf - s + R) / (winf - s[0] + R[0])) +
-              gamma_sq_inv * np.log(w_range[0]/w_range))
-        if a2/R[1]**2 > 1e-7:
-            KS -= (beta * np.dot(uup, evo) *
-                   (np.arctan((s[0] - winf)/a) - np.arctan((s-winf)/a)))
-        return KS
-
-    def _estimate_start_index(
-            self, i, traj, w_min, beta, i_min=1000, n_test=10):
-        """
-        This method estimates the index of the first trajectory point from
-        which CSR effects should be computed.
+    """
+    n_bins = len(hist)
+    bin_size = bin_centers[1] - bin_centers[0]
 
-        This method can significantly reduce the computing time of CSR effects
-        by pre-discaring regions of the reference trajectory which do not
-        influence the CSR calculation (i.e. the points where w <= wmin). This
-        is performed by testing the w <= wmin condition for a subset of n_test
-        equally-spaced points along the reference trajectory. The index of the
-        last tested trajectory point in which w <= wmin is returned.
+    # Width of the Gaussian kernel. As in `gaussian_kde`, it is determined
+    # from the unbiased weighted variance of the histogram.
+    w = hist / np.sum(hist)
+    z_avg = np.sum(w * bin_centers)
+    z_var = np.sum(w * (bin_centers - z_avg)**2) / (1 - np.sum(w**2))
+    sigma = np.sqrt(z_var) * bw_factor
 
-        Parameters
-        ----------
-        i : int
-            Iteration index
-        traj : ndarray
-            Reference trajectory along which CSR forces are calculated.
-        w_min : float
-            Leftmost edge of the longitudinal bunch binning.
-        beta : float
-            Relativistic factor.
-        i_min : int
-            Minimum iteration index. When i<i_min, no estimation of the
-            starting index is performed (0 is returned).
-        n_test : int
-            Number of points along the trajectory in which to test whether they
-            should be taken into account for the CSR calculation.
-
-        Returns
-        -------
-        The estimated start index, which is always <= than the real one.
+    # Gaussian kernel evaluated at all possible distances between bins.
+    dz = np.arange(-n_bins + 1, n_bins) * bin_size
+    kernel = np.exp(-dz**2 / (2 * sigma**2)) / np.sqrt(2 * np.pi * sigma**2)
 
-        """
-        i_0 = 0
-        if i > i_min:
-            idx = np.linspace(0, i, n_test, dtype=np.int32)
-            s = traj[0, idx] - traj[0, i]
-            n0 = traj[1, i] - traj[1, idx]
-            n1 = traj[2, i] - traj[2, idx]
-            n2 = traj[3, i] - traj[3, idx]
-            R = np.sqrt(n0*n0 + n1*n1 + n2*n2)
-            w = s + beta * R
-            j = np.where(w <= w_min)[0]
-            if len(j) > 0:
-                i_0 = idx[j[-1]]
-        return i_0
+    return signal.convolve(hist, kernel, mode='same') * bin_size
 
 
 _csr_calculator = CSRCalculator()
@@ -434,7 +367,10 @@ def get_csr_calculator() -> CSRCalculator:
 def set_csr_settings(
     csr_step: Optional[float] = 0.1,
     csr_traj_step: Optional[float] = 0.0005,
-    n_bins: Optional[int] = 2000
+    n_bins: Optional[int] = 2000,
+    kernel_cache_size: Optional[int] = 0,
+    kernel_bin_tolerance: Optional[float] = 0.,
+    kernel_gamma_tolerance: Optional[float] = 0.
 ) -> None:
     """
     Set the setting for CSR calculation.
@@ -448,9 +384,30 @@ def set_csr_settings(
     n_bins : int
         Number of bins used for determining the longitudinal charge profile
         of the bunch.
+    kernel_cache_size : int
+        Maximum number of CSR kernels (one per point of the reference
+        trajectory) kept in memory for reuse. When full, the least recently
+        used kernel is discarded. The kernels are reused when a bunch is
+        tracked again through the same lattice (e.g., within an optimization
+        loop), even after the CSR calculator is reset. By default ``0``
+        (no cache).
+    kernel_bin_tolerance : float
+        Relative tolerance in the size of the histogram bins for reusing a
+        cached kernel. If larger than ``0``, kernels are computed for bin
+        sizes quantized with this relative step and rescaled to the actual
+        bin size, which allows them to be reused when the bunch length
+        changes slightly. By default ``0`` (exact bin size).
+    kernel_gamma_tolerance : float
+        Relative tolerance in the reference gamma of the bunch for reusing a
+        cached kernel. If larger than ``0``, kernels are computed for a
+        gamma quantized with this relative step, which allows them to be
+        reused when the bunch energy changes slightly (e.g., between
+        iterations of an optimization). By default ``0`` (exact gamma).
 
     """
-    _csr_calculator.set_settings(csr_step, csr_traj_step, n_bins)
+    _csr_calculator.set_settings(
+        csr_step, csr_traj_step, n_bins, kernel_cache_size,
+        kernel_bin_tolerance, kernel_gamma_tolerance)
 
 
 def reset_csr_calculator() -> None:
@@ -0,0 +1,329 @@
+"""
+This module contains compiled methods for calculating the CSR kernel along
+the reference trajectory.
+
+As the rest of the CSR implementation, they are an adaptation of the 1D CSR
+model from OCELOT (https://github.com/ocelot-collab/ocelot) written by
+S. Tomin and M. Dohlus. For details about the CSR model, see section 2.6 of:
+https://www.desy.de/~dohlus/UWake/
+Two%20Methods%20for%20the%20Calculation%20of%20CSR%20Fields.pdf
+
+"""
+import math
+
+import numpy as np
+import scipy.constants as ct
+
+from wake_t.utilities.numba import njit_serial, njit_parallel, prange
+
+
+@njit_parallel()
+def calculate_averaged_kernel(it_range, traj, n_bins, bin_size, gamma):
+    """
+    Calculate the average CSR kernel over several trajectory points.
+
+    Parameters
+    ----------
+    it_range : ndarray
+        Indices of the trajectory points.
+    traj : ndarray
+        Reference trajectory along which CSR forces are calculated.
+    n_bins : int
+        Number of bins of the longitudinal bunch histogram.
+    bin_size : float
+        Size of the histogram bins.
+    gamma : float
+        Reference gamma to calculate CSR kernel.
+
+    """
+    K1_all = np.empty((it_range.shape[0], n_bins))
+    for n in prange(it_range.shape[0]):
+        K1_all[n] = calculate_kernel(
+            it_range[n], traj, n_bins, bin_size, gamma)
+    K1 = np.zeros(n_bins)
+    for i in range(K1_all.shape[0]):
+        K1 += K1_all[i]
+    K1 /= K1_all.shape[0]
+    return K1
+
+
+@njit_parallel()
+def calculate_kernels(it_range, traj, n_bins, bin_size, gamma):
+    """
+    Calculate the CSR kernel at several trajectory points in parallel.
+
+    Parameters
+    ----------
+    it_range : ndarray
+        Indices of the trajectory points.
+    traj : ndarray
+        Reference trajectory along which CSR forces are calculated.
+    n_bins : int
+        Number of bins of the longitudinal bunch histogram.
+    bin_size : float
+        Size of the histogram bins.
+    gamma : float
+        Reference gamma to calculate CSR kernel.
+
+    Returns
+    -------
+    A 2D array with the kernel of each trajectory point.
+
+    """
+    K1 = np.empty((it_range.shape[0], n_bins))
+    for n in prange(it_range.shape[0]):
+        K1[n] = calculate_kernel(it_range[n], traj, n_bins, bin_size, gamma)
+    return K1
+
+
+@njit_serial()
+def calculate_kernel(i, traj, n_bins, bin_size, gamma):
+    """
+    Calculate the CSR kernel at a single trajectory point.
+
+    Parameters
+    ----------
+    i : int
+        Index of the trajectory point.
+    traj : ndarray
+        Reference trajectory along which CSR forces are calculated.
+    n_bins : int
+        Number of bins of the longitudinal bunch histogram.
+    bin_size : float
+        Size of the histogram bins.
+    gamma : float
+        Reference gamma to calculate CSR kernel.
+
+    """
+    w_range = np.arange(-n_bins, 0) * bin_size
+
+    # Calculate long-range interactions.
+    w, KS = calculate_kernel_long_range(i, traj, w_range[0], gamma)
+
+    # Calculate short-range interactions.
+    w_min = np.min(w)
+    if w_range[0] < w_min:
+        m = np.where(w_range < w_min)[0][-1]
+        w_short = np.empty(m + 2)
+        w_short[:m + 1] = w_range[:m + 1]
+        w_short[m + 1] = w_min
+        KS2 = calculate_kernel_short_range(i, traj, w_short, gamma)
+        KS_all = np.empty(n_bins)
+        KS_all[:m + 1] = (KS2[-1] - KS2[:m + 1]) + KS[0]
+        KS_all[m + 1:] = np.interp(w_range[m + 1:], w, KS)
+    else:
+        KS_all = np.interp(w_range, w, KS)
+
+    # Second derivative of the integrated kernel.
+    four_pi_eps0 = 1. / (1e-7 * ct.c**2)
+    K1 = np.empty(n_bins)
+    for k in range(n_bins):
+        dKS_k = _diff(KS_all, k)
+        if k + 1 < n_bins:
+            dKS_kp1 = _diff(KS_all, k + 1)
+        else:
+            dKS_kp1 = 0.
+        K1[k] = (dKS_kp1 - dKS_k) / bin_size / four_pi_eps0
+    return K1
+
+
+@njit_serial()
+def calculate_kernel_long_range(i, traj, w_min, gamma):
+    """
+    Calculate the long-range contributions to the CSR kernel.
+
+    Parameters
+    ----------
+    i : int
+        Index of the trajectory point.
+    traj : ndarray
+        Reference trajectory along which CSR forces are calculated.
+    w_min : float
+        Leftmost edge of the longitudinal bunch histogram.
+    gamma : float
+        Reference gamma to calculate CSR kernel.
+
+    Returns
+    -------
+    A tuple with the `w` coordinate and the integrated kernel at the
+    relevant trajectory points.
+
+    """
+    # Relativistic parameters
+    gamma_sq_inv = 1. / gamma ** 2
+    beta_sq = 1. - gamma_sq_inv
+    beta = math.sqrt(beta_sq)
+
+    i_0 = estimate_start_index(i, traj, w_min, beta)
+
+    # Find the last trajectory point where w <= w_min. Only the points
+    # after it (or after i_0, if there is none) contribute to the kernel.
+    j = i_0
+    for p in range(i - 1, i_0 - 1, -1):
+        if get_w(p, i, traj, beta) <= w_min:
+            j = p
+            break
+    n_points = i - j
+
+    # Tangential unit vector at the current position.
+    t4_i = traj[4, i]
+    t5_i = traj[5, i]
+    t6_i = traj[6, i]
+
+    # Calculate kernel
+    w = np.empty(n_points)
+    s = np.empty(n_points)
+    K = np.empty(n_points)
+    for p in range(n_points):
+        ip = j + p
+        s[p] = traj[0, ip] - traj[0, i]
+        n0 = traj[1, i] - traj[1, ip]
+        n1 = traj[2, i] - traj[2, ip]
+        n2 = traj[3, i] - traj[3, ip]
+        R = math.sqrt(n0*n0 + n1*n1 + n2*n2)
+        w[p] = s[p] + beta * R
+        R_inv = 1 / R
+        n0 *= R_inv
+        n1 *= R_inv
+        n2 *= R_inv
+        t4 = traj[4, ip]
+        t5 = traj[5, ip]
+        t6 = traj[6, ip]
+        x = n0 * t4 + n1 * t5 + n2 * t6
+        K[p] = ((beta * (x - n0 * t4_i - n1 * t5_i - n2 * t6_i) -
+                 beta_sq * (1. - t4 * t4_i - t5 * t5_i - t6 * t6_i) -
+                 gamma_sq_inv) * R_inv -
+                (1. - beta * x) / w[p] * gamma_sq_inv)
+
+    # Integrate kernel (trapezoidal rule, from the current position
+    # backwards).
+    for p in range(n_points - 1):
+        K[p] += K[p + 1]
+    for p in range(n_points - 1):
+        K[p] *= 0.5 * (s[p + 1] - s[p])
+    K[n_points - 1] *= 0.5 * (0. - s[n_points - 1])
+    for p in range(n_points - 2, -1, -1):
+        K[p] += K[p + 1]
+
+    return w, K
+
+
+@njit_serial()
+def calculate_kernel_short_range(i, traj, w_range, gamma):
+    """
+    Calculate the short-range contributions to the CSR kernel.
+
+    Parameters
+    ----------
+    i : int
+        Index of the trajectory point.
+    traj : ndarray
+        Reference trajectory along which CSR forces are calculated.
+    w_range : ndarray
+        Region of beam < w_min.
+    gamma : float
+        Reference gamma to calculate CSR kernel.
+
+    """
+    # Relativistic parameters
+    gamma_sq = gamma**2
+    gamma_sq_inv = 1./gamma_sq
+    beta_sq = 1. - gamma_sq_inv
+    beta = math.sqrt(beta_sq)
+
+    # winf
+    Rv1 = traj[1:4, i] - traj[1:4, 0]
+    s1 = traj[0, 0] - traj[0, i]
+    ev1 = traj[4:, 0].copy()
+    evo = traj[4:, i].copy()
+    winfms1 = np.sum(Rv1 * ev1)
+
+    aup = -Rv1 + winfms1*ev1
+    a2 = np.sum(aup * aup)
+    a = math.sqrt(a2)
+
+    ev1_evo = np.sum(ev1 * evo)
+
+    winf = s1 + winfms1
+    s = winf + gamma * (gamma * (w_range - winf) -
+                        beta * np.sqrt(gamma_sq*(w_range-winf)**2 + a2))
+    R = (w_range-s) / beta
+
+    KS = (beta * (1. - ev1_evo) * np.log(R[0]/R) -
+          (beta_sq * ev1_evo - 1.) * np.log(
+              (winf - s + R) / (winf - s[0] + R[0])) +
+          gamma_sq_inv * np.log(w_range[0]/w_range))
+    if a2/R[1]**2 > 1e-7:
+        uup_evo = np.sum(aup / a * evo)
+        KS -= (beta * uup_evo *
+               (np.arctan((s[0] - winf)/a) - np.arctan((s-winf)/a)))
+    return KS
+
+
+@njit_serial()
+def estimate_start_index(i, traj, w_min, beta, i_min=1000, n_test=10):
+    """
+    Estimate the index of the first trajectory point from which CSR effects
+    should be computed.
+
+    This can significantly reduce the computing time of CSR effects by
+    pre-discarding regions of the reference trajectory which do not
+    influence the CSR calculation (i.e. the points where w <= w_min). This
+    is performed by testing the w <= w_min condition for a subset of n_test
+    equally-spaced points along the reference trajectory. The index of the
+    last tested trajectory point in which w <= w_min is returned.
+
+    Parameters
+    ----------
+    i : int
+        Index of the trajectory point.
+    traj : ndarray
+        Reference trajectory along which CSR forces are calculated.
+    w_min : float
+        Leftmost edge of the longitudinal bunch binning.
+    beta : float
+        Relativistic factor.
+    i_min : int
+        Minimum iteration index. When i<i_min, no estimation of the
+        starting index is performed (0 is returned).
+    n_test : int
+        Number of points along the trajectory in which to test whether they
+        should be taken into account for the CSR calculation.
+
+    Returns
+    -------
+    The estimated start index, which is always <= than the real one.
+
+    """
+    i_0 = 0
+    if i > i_min:
+        # Equally-spaced points, as in `np.linspace(0, i, n_test)`.
+        step = i / (n_test - 1)
+        for k in range(n_test - 1, -1, -1):
+            if k == n_test - 1:
+                idx = i
+            else:
+                idx = int(k * step)
+            if get_w(idx, i, traj, beta) <= w_min:
+                i_0 = idx
+                break
+    return i_0
+
+
+@njit_serial(inline='always')
+def get_w(p, i, traj, beta):
+    """Get the `w` coordinate of trajectory point `p` as seen from `i`."""
+    s = traj[0, p] - traj[0, i]
+    n0 = traj[1, i] - traj[1, p]
+    n1 = traj[2, i] - traj[2, p]
+    n2 = traj[3, i] - traj[3, p]
+    R = math.sqrt(n0*n0 + n1*n1 + n2*n2)
+    return s + beta * R
+
+
+@njit_serial(inline='always')
+def _diff(a, k):
+    """Forward difference of `a` at `k`, with `a` padded with a 0."""
+    if k + 1 < a.shape[0]:
+        return a[k + 1] - a[k]
+    return 0. - a[k]
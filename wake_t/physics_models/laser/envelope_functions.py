@@ -0,0 +1,104 @@
+"""
+This module contains compiled functions for evaluating the envelope of the
+analytic laser pulses on a 2D (xi, r) grid.
+
+They give the same result as the `_envelope_function` of each pulse, but
+the envelope is evaluated in parallel and without creating a meshgrid or
+any other temporary array.
+"""
+
+import math
+import cmath
+
+import scipy.constants as ct
+
+from wake_t.utilities.numba import njit_parallel, njit_serial, prange
+
+
+@njit_parallel()
+def gaussian_envelope(xi, r, z_pos, xi_c, a_0, w_0, tau, z_foc, z_r,
+                      cep_phase, a_env):
+    """Add the envelope of a Gaussian pulse to `a_env`.
+
+    Parameters
+    ----------
+    xi, r : ndarray
+        1D arrays with the longitudinal and radial grid coordinates.
+    z_pos : float
+        Propagation distance of the pulse.
+    xi_c, a_0, w_0, tau, z_foc, z_r, cep_phase : float
+        Parameters of the pulse, as in `GaussianPulse`.
+    a_env : ndarray
+        2D array of shape `(len(xi), len(r))` to which the envelope is added.
+    """
+    s_z = tau * ct.c / (2 * math.sqrt(2 * math.log(2))) * math.sqrt(2)
+    for i in prange(xi.shape[0]):
+        z = xi[i] - xi_c + z_pos
+        diff_factor = 1. + 1j * (z - z_foc) / z_r
+        exp_cep = -1j * cep_phase
+        exp_z = -(xi[i] - xi_c)**2 / (2*s_z**2)
+        amplitude = a_0 / diff_factor
+        for k in range(r.shape[0]):
+            exp_r = -r[k]**2 / (w_0**2 * diff_factor)
+            a_env[i, k] += amplitude * cmath.exp(exp_cep + exp_r + exp_z)
+
+
+@njit_parallel()
+def laguerre_gauss_envelope(xi, r, z_pos, xi_c, w_0, tau, z_foc, z_r,
+                            p, a_0, cep_phase, a_env):
+    """Add the envelope of a sum of Laguerre-Gauss modes to `a_env`.
+
+    All modes share the same position, waist, duration and focus, and differ
+    in their order `p`, amplitude `a_0` and `cep_phase`, which are given
+    as arrays.
+
+    Parameters
+    ----------
+    xi, r : ndarray
+        1D arrays with the longitudinal and radial grid coordinates.
+    z_pos : float
+        Propagation distance of the pulse.
+    xi_c, w_0, tau, z_foc, z_r : float
+        Parameters shared by all modes, as in `LaguerreGaussPulse`.
+    p, a_0, cep_phase : ndarray
+        Order, amplitude and CEP phase of each mode.
+    a_env : ndarray
+        2D array of shape `(len(xi), len(r))` to which the envelope is added.
+    """
+    s_z = tau * ct.c / (2 * math.sqrt(2 * math.log(2))) * math.sqrt(2)
+    n_modes = p.shape[0]
+    for i in prange(xi.shape[0]):
+        z = xi[i] - xi_c + z_pos
+        # Diffraction factor, waist and Gouy phase.
+        diffract_factor = 1. + 1j * (z - z_foc) / z_r
+        w = w_0 * abs(diffract_factor)
+        psi = cmath.phase(diffract_factor)
+        exp_z = -(xi[i] - xi_c)**2 / (2*s_z**2)
+        for k in range(r.shape[0]):
+            scaled_radius_squared = 2 * r[k]**2 / w**2
+            exp_r = - r[k]**2 / (w_0**2 * diffract_factor)
+            a_k = 0j
+            for m in range(n_modes):
+                exp_argument = (
+                    - 1j * cep_phase[m] + exp_r + exp_z
+                    - 1j * (2 * p[m]) * psi
+                )
+                a_k += a_0[m] * (
+                    cmath.exp(exp_argument) / diffract_factor
+                    * laguerre(p[m], scaled_radius_squared)
+                )
+            a_env[i, k] += a_k
+
+
+@njit_serial(inline='always')
+def laguerre(n, x):
+    """Evaluate the Laguerre polynomial of order `n` at `x`."""
+    l_prev = 1.
+    if n == 0:
+        return l_prev
+    l_n = 1. - x
+    for k in range(1, n):
+        l_next = ((2 * k + 1 - x) * l_n - k * l_prev) / (k + 1)
+        l_prev = l_n
+        l_n = l_next
+    return l_n
@@ -14,7 +14,7 @@ from .tdma import TDMA
 from .utils import unwrap
 
 
-@njit_serial(fastmath=True)
+@njit_serial(fastmath=True, nogil=True)
 def evolve_envelope(
         a, a_old, chi, k0, kp, zmin, zmax, nz, rmax, nr, dt, nt,
         use_phase=True):
@@ -52,9 +52,17 @@ def evolve_envelope(
         Determines whether to take into account the terms related to the
         longitudinal derivative of the complex phase.
 
+    The solver runs in the precision of `a`, `a_old` and `chi`, which should
+    be either double (``complex128`` and ``float64``) or single
+    (``complex64`` and ``float32``).
+
     """
     # Preallocate arrays. a_old and a include 2 ghost cells in the z direction.
-    rhs = np.empty(nr, dtype=np.complex128)
+    # The arrays have the same precision as `a`. `row_coefs` stores the
+    # coefficients of the row being computed.
+    rhs = np.empty(nr, dtype=a.dtype)
+    d_main = np.empty(nr, dtype=a.dtype)
+    row_coefs = np.empty(3, dtype=a.dtype)
 
     # Calculate step sizes.
     dz = (zmax - zmin) * kp / (nz - 1)
@@ -72,23 +80,35 @@ def evolve_envelope(
     d_theta1 = 0.
     d_theta2 = 0.
 
-    # Calculate C^+ and C^- [Eq. (8)].
-    C_minus = (-2. * inv_dr ** 2. * 0.5 - 1j * k0_over_kp * inv_dt
-               + 1.5 * inv_dzdt - inv_dt ** 2.)
-    C_plus = (-2. * inv_dr ** 2. * 0.5 + 1j * k0_over_kp * inv_dt
-              - 1.5 * inv_dzdt - inv_dt ** 2.)
+    # Calculate C^+ and C^- [Eq. (8)]. They, and all other coefficients, are
+    # stored with the precision of `a` (and `chi`), so that all arithmetic
+    # within the grid loops is done in this precision.
+    coefs = np.empty(2, dtype=a.dtype)
+    coefs[0] = (-2. * inv_dr ** 2. * 0.5 - 1j * k0_over_kp * inv_dt
+                + 1.5 * inv_dzdt - inv_dt ** 2.)
+    coefs[1] = (-2. * inv_dr ** 2. * 0.5 + 1j * k0_over_kp * inv_dt
+                - 1.5 * inv_dzdt - inv_dt ** 2.)
+    C_minus = coefs[0]
+    C_plus = coefs[1]
+    real_coefs = np.empty(2, dtype=chi.dtype)
+    real_coefs[0] = 0.5
+    real_coefs[1] = 2 * inv_dt ** 2
+    half = real_coefs[0]
+    coef_a = real_coefs[1]
 
     # Calculate L^+ and L^-. Change wrt Benedetti - 2018: in Wake-T we use
     # cell-centered nodes in the radial direction.
     L_base = 1. / (2. * (np.arange(nr) + 0.5))
-    L_minus_over_2 = (1. - L_base) * inv_dr ** 2. * 0.5
-    L_plus_over_2 = (1. + L_base) * inv_dr ** 2. * 0.5
+    L_minus_over_2 = ((1. - L_base) * inv_dr ** 2. * 0.5).astype(chi.dtype)
+    L_plus_over_2 = ((1. + L_base) * inv_dr ** 2. * 0.5).astype(chi.dtype)
+    d_upper = L_plus_over_2[:nr - 1]
+    d_lower = L_minus_over_2[1:nr]
 
     # Loop over time iterations.
     for n in range(nt):
         # a_new_jp1 is equivalent to a_new[j+1] and a_new_jp2 to a_new[j+2].
-        a_new_jp1 = np.zeros(nr, dtype=np.complex128)
-        a_new_jp2 = np.zeros(nr, dtype=np.complex128)
+        a_new_jp1 = np.zeros(nr, dtype=a.dtype)
+        a_new_jp2 = np.zeros(nr, dtype=a.dtype)
 
         # Getting the phase of the envelope on axis.
         if use_phase:
@@ -105,27 +125,29 @@ def evolve_envelope(
             # Calculate D factor [Eq. (6)].
             D_jkn = (1.5 * d_theta1 - 0.5 * d_theta2) * inv_dz
 
-            # Calculate right-hand side of Eq (7).
+            # Calculate the coefficients of the row, converted to the
+            # precision of `a` through `row_coefs`.
+            row_coefs[0] = 1j * inv_dt * D_jkn
+            row_coefs[1] = 2 * np.exp(-1j * d_theta1) * inv_dzdt
+            row_coefs[2] = 0.5 * np.exp(-1j * (d_theta2 + d_theta1)) * inv_dzdt
+            coef_d = row_coefs[0]
+            coef_jp1 = row_coefs[1]
+            coef_jp2 = row_coefs[2]
+
+            # Calculate right-hand side of Eq (7) and main diagonal.
             for k in range(nr):
                 rhs_k = (
-                    - 2 * inv_dt ** 2 * a[j, k]
-                    - ((C_minus - chi[j, k] * 0.5 - 1j * inv_dt * D_jkn)
-                       * a_old[j, k])
-                    - (2 * np.exp(-1j * d_theta1) * inv_dzdt
-                       * (a_new_jp1[k] - a_old[j + 1, k]))
-                    + (0.5 * np.exp(-1j * (d_theta2 + d_theta1)) * inv_dzdt
-                       * (a_new_jp2[k] - a_old[j + 2, k]))
+                    - coef_a * a[j, k]
+                    - ((C_minus - chi[j, k] * half - coef_d) * a_old[j, k])
+                    - (coef_jp1 * (a_new_jp1[k] - a_old[j + 1, k]))
+                    + (coef_jp2 * (a_new_jp2[k] - a_old[j + 2, k]))
                 )
                 if k > 0:
                     rhs_k -= L_minus_over_2[k] * a_old[j, k - 1]
                 if k + 1 < nr:
                     rhs_k -= L_plus_over_2[k] * a_old[j, k + 1]
                 rhs[k] = rhs_k
-
-            # Calculate diagonals.
-            d_main = C_plus - chi[j] * 0.5 + 1j * inv_dt * D_jkn
-            d_upper = L_plus_over_2[:nr - 1]
-            d_lower = L_minus_over_2[1:nr]
+                d_main[k] = C_plus - chi[j, k] * half + coef_d
 
             # Update a_old and a at j+2 with the current values of a a_new.
             a_old[j + 2] = a[j + 2]
@@ -0,0 +1,207 @@
+"""
+This module contains a parallel version of the laser envelope solvers in
+`envelope_solver` and `envelope_solver_non_centered`.
+
+When several substeps are computed with the same `chi`, the solution of
+substep `n + 1` at row `j` only requires the solution of substep `n` at rows
+`j`, `j + 1` and `j + 2`. Therefore, substep `n + 1` can start as soon as
+substep `n` is a few rows ahead, and all substeps are computed
+simultaneously as a wavefront moving along the grid, with each thread
+solving the tridiagonal system of a different substep.
+
+Authors: Wilbert den Hertog, Ángel Ferran Pousa, Carlo Benedetti
+"""
+
+import math
+
+import numpy as np
+import scipy.constants as ct
+
+from wake_t.utilities.numba import njit_parallel, njit_serial, prange
+from .tdma import TDMA_buffered
+
+
+# Number of rows by which each substep lags behind the previous one. With
+# this lag, the rows written by one substep are never accessed by the
+# others within the same iteration of the wavefront.
+SUBSTEP_LAG = 3
+
+
+@njit_parallel(fastmath=True, nogil=True)
+def evolve_envelope_pipelined(
+        a, a_old, chi, k0, kp, zmin, zmax, nz, rmax, nr, dt, nt,
+        use_phase=True, centered=True):
+    """
+    Solve the 2D envelope equation by computing all substeps in parallel.
+
+    The result is the same as that of `evolve_envelope` (if `centered`) or
+    `evolve_envelope_non_centered` (otherwise).
+
+    Parameters
+    ----------
+    a, a_old, chi, k0, kp, zmin, zmax, nz, rmax, nr, dt, nt, use_phase
+        Same as in `evolve_envelope`. The solver runs in the precision of
+        `a` and `chi`.
+    centered : bool
+        Whether to use the centered scheme. If ``False``, the non-centered
+        scheme is used for all substeps.
+
+    """
+    # Calculate step sizes.
+    dz = (zmax - zmin) * kp / (nz - 1)
+    dr = rmax * kp / nr
+    dt = dt * ct.c * kp
+
+    # Precalculate common fractions.
+    inv_dt = 1 / dt
+    inv_dr = 1 / dr
+    inv_dz = 1 / dz
+    inv_dzdt = inv_dt * inv_dz
+    k0_over_kp = k0 / kp
+
+    # Calculate C^+ and C^- [Eq. (8)], as well as the coefficients of the
+    # right-hand side, which differ between the centered and non-centered
+    # schemes. They are stored with the precision of `a` (and `chi`), so
+    # that all arithmetic within the grid loops is done in this precision.
+    coefs = np.empty(6, dtype=a.dtype)
+    if centered:
+        coefs[0] = (-2. * inv_dr ** 2. * 0.5 - 1j * k0_over_kp * inv_dt
+                    + 1.5 * inv_dzdt - inv_dt ** 2.)
+        coefs[1] = (-2. * inv_dr ** 2. * 0.5 + 1j * k0_over_kp * inv_dt
+                    - 1.5 * inv_dzdt - inv_dt ** 2.)
+        coefs[2] = 2 * inv_dt ** 2
+        coefs[3] = 1j * inv_dt
+        coefs[4] = 2 * inv_dzdt
+        coefs[5] = 0.5 * inv_dzdt
+    else:
+        coefs[0] = (-2. * inv_dr ** 2. * 0.5 - 2j * k0_over_kp * inv_dt
+                    + 3 * inv_dzdt)
+        coefs[1] = (-2. * inv_dr ** 2. * 0.5 + 2j * k0_over_kp * inv_dt
+                    - 3 * inv_dzdt)
+        coefs[2] = 0.
+        coefs[3] = 2j * inv_dt
+        coefs[4] = 4 * inv_dzdt
+        coefs[5] = 1 * inv_dzdt
+    real_coefs = np.empty(1, dtype=chi.dtype)
+    real_coefs[0] = 0.5
+    half = real_coefs[0]
+
+    # Calculate L^+ and L^-. Change wrt Benedetti - 2018: in Wake-T we use
+    # cell-centered nodes in the radial direction.
+    L_base = 1. / (2. * (np.arange(nr) + 0.5))
+    L_minus_over_2 = ((1. - L_base) * inv_dr ** 2. * 0.5).astype(chi.dtype)
+    L_plus_over_2 = ((1. + L_base) * inv_dr ** 2. * 0.5).astype(chi.dtype)
+    d_upper = L_plus_over_2[:nr - 1]
+    d_lower = L_minus_over_2[1:nr]
+
+    # Preallocate the arrays of each substep (with the same precision as
+    # `a`). a_new_jp1 is equivalent to a_new[j+1] and a_new_jp2 to a_new[j+2].
+    # `row_coefs` stores the coefficients of the row being computed.
+    a_new_jp1 = np.zeros((nt, nr), dtype=a.dtype)
+    a_new_jp2 = np.zeros((nt, nr), dtype=a.dtype)
+    rhs = np.empty((nt, nr), dtype=a.dtype)
+    d_main = np.empty((nt, nr), dtype=a.dtype)
+    w = np.empty((nt, nr), dtype=a.dtype)
+    g = np.empty((nt, nr), dtype=a.dtype)
+    row_coefs = np.empty((nt, 3), dtype=a.dtype)
+
+    # Loop over the wavefront. At each iteration, substep n computes row
+    # j = nz - 1 - (i - n * SUBSTEP_LAG). When j = -1, the last rows
+    # of the substep are stored in `a` and `a_old`.
+    n_iter = nz + 1 + SUBSTEP_LAG * (nt - 1)
+    for i in range(n_iter):
+        n_min = max(0, -((nz - i) // SUBSTEP_LAG))
+        n_max = min(nt - 1, i // SUBSTEP_LAG)
+        for n in prange(n_min, n_max + 1):
+            j = nz - 1 - (i - n * SUBSTEP_LAG)
+            if j >= 0:
+                solve_row(
+                    a, a_old, chi, j, coefs, half, L_minus_over_2,
+                    L_plus_over_2, d_lower, d_upper, inv_dz, centered,
+                    use_phase, a_new_jp1[n], a_new_jp2[n], rhs[n], d_main[n],
+                    w[n], g[n], row_coefs[n])
+            else:
+                # When the left of the computational domain is reached,
+                # paste the last few values in the a_old and a arrays.
+                a_old[0:2] = a[0:2]
+                a[0] = a_new_jp1[n]
+                a[1] = a_new_jp2[n]
+
+
+@njit_serial(fastmath=True, inline='always')
+def solve_row(a, a_old, chi, j, coefs, half, L_minus_over_2,
+              L_plus_over_2, d_lower, d_upper, inv_dz, centered, use_phase,
+              a_new_jp1, a_new_jp2, rhs, d_main, w, g, row_coefs):
+    """Compute row `j` of one substep of the envelope solver."""
+    nr = a.shape[1]
+
+    # In the non-centered scheme, `a` takes the role of `a_old`.
+    if centered:
+        a_prev = a_old
+    else:
+        a_prev = a
+
+    # Calculate phase differences between adjacent points.
+    if use_phase:
+        d_theta1 = get_phase_difference(a[j + 1, 0], a[j, 0])
+        d_theta2 = get_phase_difference(a[j + 2, 0], a[j + 1, 0])
+    else:
+        d_theta1 = 0.
+        d_theta2 = 0.
+
+    # Calculate D factor [Eq. (6)].
+    D_jkn = (1.5 * d_theta1 - 0.5 * d_theta2) * inv_dz
+
+    # Calculate right-hand side of Eq (7). The coefficients of the row are
+    # converted to the precision of `a` through `row_coefs`.
+    row_coefs[0] = coefs[3] * D_jkn
+    row_coefs[1] = coefs[4] * np.exp(-1j * d_theta1)
+    row_coefs[2] = coefs[5] * np.exp(-1j * (d_theta2 + d_theta1))
+    C_minus = coefs[0]
+    C_plus = coefs[1]
+    coef_a = coefs[2]
+    coef_d = row_coefs[0]
+    coef_jp1 = row_coefs[1]
+    coef_jp2 = row_coefs[2]
+    for k in range(nr):
+        rhs_k = (
+            - coef_a * a[j, k]
+            - (C_minus - chi[j, k] * half - coef_d) * a_prev[j, k]
+            - coef_jp1 * (a_new_jp1[k] - a_prev[j + 1, k])
+            + coef_jp2 * (a_new_jp2[k] - a_prev[j + 2, k])
+        )
+        if k > 0:
+            rhs_k -= L_minus_over_2[k] * a_prev[j, k - 1]
+        if k + 1 < nr:
+            rhs_k -= L_plus_over_2[k] * a_prev[j, k + 1]
+        rhs[k] = rhs_k
+
+        # Calculate main diagonal.
+        d_main[k] = C_plus - chi[j, k] * half + coef_d
+
+    # Update a_old and a at j+2 with the current values of a a_new.
+    a_old[j + 2] = a[j + 2]
+    a[j + 2] = a_new_jp2
+
+    # Shift a_new[j+1] to a_new[j+2] in preparation for the next
+    # iteration.
+    a_new_jp2[:] = a_new_jp1
+
+    # Compute a_new at the current j using the TDMA method and store
+    # result in a_new_jp1 to use it in the next iteration.
+    TDMA_buffered(d_lower, d_main, d_upper, rhs, a_new_jp1, w, g)
+
+
+@njit_serial(inline='always')
+def get_phase_difference(a_2, a_1):
+    """
+    Get the phase difference between two complex values, unwrapped in the
+    same way as in `unwrap`.
+    """
+    dd = math.atan2(a_2.imag, a_2.real) - math.atan2(a_1.imag, a_1.real)
+    if abs(dd) < np.pi:
+        return dd
+    ddmod = (dd + np.pi) % (2 * np.pi) - np.pi
+    if ddmod == -np.pi and dd > 0:
+        ddmod = np.pi
+    return ddmod
@@ -8,6 +8,9 @@ profiles, as well as the SummedPulse approach is based on FBPIC
 Authors: Angel Ferran Pousa, Remi Lehe, Manuel Kirchen, Pierre Pelletier.
 
 """
+import os
+import hashlib
+import tempfile
 from typing import Optional, Union, Iterable
 
 import numpy as np
@@ -25,9 +28,17 @@ except ImportError:
 
 from .envelope_solver import evolve_envelope
 from .envelope_solver_non_centered import evolve_envelope_non_centered
+from .envelope_solver_pipelined import evolve_envelope_pipelined
+from .utils import get_active_region, get_envelope_phase_rate
+from .envelope_functions import gaussian_envelope, laguerre_gauss_envelope
 from wake_t.fields.interpolation import interpolate_rz_field
 
 
+# Minimum number of cells by which the active region of the envelope solver
+# is extended beyond the cells where the envelope is above the threshold.
+CROP_MIN_MARGIN = 4
+
+
 class LaserPulse():
     """Base class for all Laser pulses.
 
@@ -51,6 +62,7 @@ class LaserPulse():
         self.a_env = None
         self.solver_params = None
         self.n_steps = 0
+        self.nt_history = []
 
     def __add__(self, pulse_2):
         """Overload the add operator to allow summing of laser pulses."""
@@ -64,10 +76,17 @@ class LaserPulse():
         nz: int,
         nr: int,
         dt: float,
-        nt: Optional[int] = 1,
+        nt: Optional[Union[int, str]] = 1,
         subgrid_nz: Optional[int] = None,
         subgrid_nr: Optional[int] = None,
-        use_phase: Optional[bool] = True
+        use_phase: Optional[bool] = True,
+        parallel: Optional[bool] = False,
+        auto_crop: Optional[bool] = False,
+        crop_threshold: Optional[float] = 1e-4,
+        single_precision: Optional[bool] = False,
+        nt_min: Optional[int] = 1,
+        nt_max: Optional[int] = 16,
+        nt_tolerance: Optional[float] = 0.05
     ) -> None:
         """
         Set the parameters for the laser envelope solver.
@@ -89,7 +108,9 @@ class LaserPulse():
             `evolve` is called. The internal time step used by the solver is
             therefore dt/nt, so that the laser effectively advances by `dt`
             every time `evolve` is called. All these time steps are therefore
-            computed using the same `chi`.
+            computed using the same `chi`. If ``'auto'``, the number of
+            substeps is determined every time `evolve` is called (see
+            `nt_tolerance`).
         subgrid_nz, subgrid_nr : int, optional
             If specified, run laser envelope solver in a subgrid of resolution
             (subgrid_nz, subgrid_nr), which is different than the size of the
@@ -100,9 +121,47 @@ class LaserPulse():
             Determines whether to take into account the terms related to the
             longitudinal derivative of the complex phase in the envelope
             solver.
+        parallel : bool
+            Whether to use the parallel envelope solver, which computes all
+            `nt` substeps simultaneously in different threads. The results
+            are identical to those of the serial solver (up to round-off
+            errors), and the speed-up is only significant for `nt > 1`.
+        auto_crop : bool
+            Whether to evolve the envelope only within the region where
+            `|a|` is above `crop_threshold`. This region is determined
+            every time `evolve` is called and extended by a margin that
+            accounts for the diffraction and slippage of the pulse during
+            the step. The envelope is set to zero outside of it.
+        crop_threshold : float
+            Threshold of `|a|`, relative to its maximum value, used to
+            determine the active region when `auto_crop=True`.
+        single_precision : bool
+            Whether to store and evolve the envelope in single precision
+            (`complex64`). The susceptibility given to the solver (`float32`),
+            the coefficients of the solver and its work arrays (including
+            those of the tridiagonal solver) are then also in single
+            precision. This halves the memory usage and bandwidth of the
+            envelope solver.
+        nt_min, nt_max : int
+            Minimum and maximum number of substeps when ``nt='auto'``.
+        nt_tolerance : float
+            When ``nt='auto'``, the number of substeps is chosen so that the
+            phase of the envelope changes by at most this amount (in rad) in
+            each substep. This change is estimated from the plasma
+            susceptibility, the transverse curvature of the envelope and the
+            longitudinal gradient of its phase (which changes the local
+            laser wavenumber). The chosen values are stored in
+            `nt_history`.
 
         """
-        if nt < 1:
+        self.adaptive_nt = nt == 'auto'
+        if self.adaptive_nt:
+            # Keep the current number of substeps, if any.
+            if self.solver_params is not None:
+                nt = min(max(self.solver_params['nt'], nt_min), nt_max)
+            else:
+                nt = nt_min
+        if nt < 1 or nt_min < 1:
             raise ValueError(
                 'Number of laser envelope substeps cannot be smaller than 1.')
 
@@ -143,6 +202,14 @@ class LaserPulse():
             if solver_params['dt'] != self.solver_params['dt']:
                 self.n_steps = 0
         self.solver_params = solver_params
+        self.parallel_solver = parallel
+        self.auto_crop = auto_crop
+        self.crop_threshold = crop_threshold
+        self.single_precision = single_precision
+        self.active_region = None
+        self.nt_min = nt_min
+        self.nt_max = nt_max
+        self.nt_tolerance = nt_tolerance
 
     def initialize_envelope(self) -> None:
         """Initialize laser envelope arrays."""
@@ -159,10 +226,11 @@ class LaserPulse():
             dr = r_max / nr
             z = np.linspace(z_min, z_max, nz)
             r = np.linspace(dr/2, r_max-dr/2, nr)
-            ZZ, RR = np.meshgrid(z, r, indexing='ij')
-            self._a_env_old = np.zeros((nz + 2, nr), dtype=np.complex128)
-            self._a_env = np.zeros((nz + 2, nr), dtype=np.complex128)
-            self._a_env[0:-2] = self.envelope_function(ZZ, RR, 0.)
+            dtype = np.complex64 if self.single_precision else np.complex128
+            self._a_env_old = np.zeros((nz + 2, nr), dtype=dtype)
+            self._chi_single = None
+            self._a_env = np.zeros((nz + 2, nr), dtype=dtype)
+            self._a_env[0:-2] = self._envelope_function_on_grid(z, r, 0.)
             self._update_output_envelope()
 
     def get_envelope(self) -> np.ndarray:
@@ -172,7 +240,8 @@ class LaserPulse():
     def evolve(
         self,
         chi: np.ndarray,
-        n_p: float
+        n_p: float,
+        update_output: Optional[bool] = True
     ) -> None:
         """
         Evolve laser envelope to next time step.
@@ -183,6 +252,12 @@ class LaserPulse():
             A (nz x nr) array containing the plasma susceptibility.
         n_p : float
             Plasma density in SI units.
+        update_output : bool, optional
+            Whether to update the envelope array returned by
+            `get_envelope`. If ``False``, it keeps its previous value until
+            `_update_output_envelope` is called. This allows the envelope
+            to be evolved in a background thread while the previous one is
+            still in use. By default ``True``.
         """
         k_0 = 2*np.pi / self.l_0
         k_p = np.sqrt(ct.e**2 * n_p / (ct.m_e*ct.epsilon_0)) / ct.c
@@ -190,19 +265,45 @@ class LaserPulse():
         # If needed, interpolate chi to subgrid.
         if self.use_subgrid:
             chi = self._interpolate_chi_to_subgrid(chi)
+        # In single precision, copy chi into a preallocated float32 buffer.
+        if self.single_precision and chi.dtype != np.float32:
+            if self._chi_single is None or self._chi_single.shape != chi.shape:
+                self._chi_single = np.empty(chi.shape, dtype=np.float32)
+            self._chi_single[:] = chi
+            chi = self._chi_single
+
+        # Determine number of substeps.
+        if self.adaptive_nt:
+            self._update_substeps(chi, k_0, k_p)
+
+        # Get the envelope arrays and solver parameters of the region
+        # to evolve.
+        if self.auto_crop:
+            a_env, a_env_old, chi, solver_params = self._crop_active_region(
+                chi, k_0, k_p)
+        else:
+            a_env = self._a_env
+            a_env_old = self._a_env_old
+            solver_params = self.solver_params
 
         # Compute evolution.
-        if self.n_steps == 0:
+        if a_env is None:
+            # Nothing to evolve.
+            pass
+        elif self.parallel_solver:
+            evolve_envelope_pipelined(
+                a_env, a_env_old, chi, k_0, k_p,
+                centered=self.n_steps > 0, **solver_params)
+        elif self.n_steps == 0:
             evolve_envelope_non_centered(
-                self._a_env, self._a_env_old, chi, k_0, k_p,
-                **self.solver_params)
+                a_env, a_env_old, chi, k_0, k_p, **solver_params)
         else:
             evolve_envelope(
-                self._a_env, self._a_env_old, chi, k_0, k_p,
-                **self.solver_params)
+                a_env, a_env_old, chi, k_0, k_p, **solver_params)
 
         # Update arrays and step count.
-        self._update_output_envelope()
+        if update_output:
+            self._update_output_envelope()
         self.n_steps += 1
 
     def get_group_velocity(
@@ -238,6 +339,95 @@ class LaserPulse():
     def _envelope_function(self, xi, r, z_pos):
         return np.zeros_like(r)
 
+    def _envelope_function_on_grid(self, xi, r, z_pos):
+        """
+        Return the complex envelope on the grid defined by the 1D arrays
+        `xi` and `r`. Subclasses can override this method to provide a
+        faster implementation.
+        """
+        xi, r = np.meshgrid(xi, r, indexing='ij')
+        return self.envelope_function(xi, r, z_pos)
+
+    def _update_substeps(self, chi, k_0, k_p):
+        """Choose the number of substeps of the next call to `evolve`."""
+        nt = self.solver_params['nt']
+        dt = self.solver_params['dt']
+        nz = self.solver_params['nz']
+        dz = (
+            (self.solver_params['zmax'] - self.solver_params['zmin'])
+            / (nz - 1)
+        )
+        dr = self.solver_params['rmax'] / self.solver_params['nr']
+        phase_rate = get_envelope_phase_rate(
+            self._a_env, chi, nz, dz, dr, k_0, k_p)
+        nt_new = int(np.ceil(phase_rate * dt * nt / self.nt_tolerance))
+        nt_new = min(max(nt_new, self.nt_min), self.nt_max)
+        if nt_new != nt:
+            # As in `set_envelope_solver_params`, use the non-centered
+            # solver after a change of the time step.
+            self.solver_params['nt'] = nt_new
+            self.solver_params['dt'] = dt * nt / nt_new
+            self.n_steps = 0
+        self.nt_history.append(nt_new)
+
+    def _crop_active_region(self, chi, k_0, k_p):
+        """
+        Get the envelope arrays, susceptibility and solver parameters
+        restricted to the active region of the envelope.
+
+        The active region is stored in `self.active_region` as a tuple
+        `(j_start, j_end, k_end)` of grid indices, which is `None` if the
+        envelope is zero everywhere. In that case, `None` is also returned
+        for all arrays.
+        """
+        zmin = self.solver_params['zmin']
+        zmax = self.solver_params['zmax']
+        rmax = self.solver_params['rmax']
+        nz = self.solver_params['nz']
+        nr = self.solver_params['nr']
+        dz = (zmax - zmin) / (nz - 1)
+        dr = rmax / nr
+
+        # Determine cells where the envelope is above the threshold.
+        j_min, j_max, k_max = get_active_region(
+            self._a_env, self._a_env_old, nz, self.crop_threshold)
+        if k_max < 0:
+            self.active_region = None
+            return None, None, None, None
+
+        # Add margin to account for the diffraction (transverse spreading
+        # of features down to the Fresnel scale) and for the slippage of the
+        # pulse with respect to the grid due to its group velocity.
+        l_step = ct.c * self.solver_params['dt'] * self.solver_params['nt']
+        r_margin = 3 * np.sqrt(2 * l_step / k_0)
+        z_margin = l_step * k_p ** 2 / (2 * k_0 ** 2)
+        n_r = CROP_MIN_MARGIN + int(np.ceil(r_margin / dr))
+        n_z = CROP_MIN_MARGIN + int(np.ceil(z_margin / dz))
+        j_start = max(j_min - n_z, 0)
+        j_end = min(j_max + n_z + 1, nz)
+        k_end = min(k_max + n_r + 1, nr)
+        self.active_region = (j_start, j_end, k_end)
+
+        # Apply zero boundary conditions outside of the active region. This
+        # includes the two ghost rows ahead of it.
+        for a in [self._a_env, self._a_env_old]:
+            a[:j_start] = 0.
+            a[j_end:] = 0.
+            a[:, k_end:] = 0.
+
+        solver_params = dict(self.solver_params)
+        solver_params['zmin'] = zmin + j_start * dz
+        solver_params['zmax'] = zmin + (j_end - 1) * dz
+        solver_params['nz'] = j_end - j_start
+        solver_params['rmax'] = k_end * dr
+        solver_params['nr'] = k_end
+        return (
+            self._a_env[j_start:j_end + 2, :k_end],
+            self._a_env_old[j_start:j_end + 2, :k_end],
+            chi[j_start:j_end, :k_end],
+            solver_params
+        )
+
     def _create_laser_subgrid(self, nz, nr, subgrid_nz, subgrid_nr, xi_max,
                               xi_min, r_max):
         """
@@ -287,7 +477,7 @@ class LaserPulse():
             if self.a_env is None:
                 nz = self.subgrid_params['grid']['nz']
                 nr = self.subgrid_params['grid']['nr']
-                self.a_env = np.zeros((nz, nr), dtype=np.complex128)
+                self.a_env = np.zeros((nz, nr), dtype=self._a_env.dtype)
             z_min = self.subgrid_params['subgrid']['z_min']
             r_min = self.subgrid_params['subgrid']['r_min']
             dz = self.subgrid_params['subgrid']['dz']
@@ -301,7 +491,7 @@ class LaserPulse():
             if self.a_env is None:
                 nz = self.solver_params['nz']
                 nr = self.solver_params['nr']
-                self.a_env = np.zeros((nz, nr), dtype=np.complex128)
+                self.a_env = np.zeros((nz, nr), dtype=self._a_env.dtype)
             self.a_env[:] = self._a_env[0: -2]
 
     def _interpolate_chi_to_subgrid(self, chi):
@@ -348,6 +538,11 @@ class SummedPulse(LaserPulse):
         a_env_2 = self.pulse_2.envelope_function(xi, r, z_pos)
         return a_env_1 + a_env_2
 
+    def _envelope_function_on_grid(self, xi, r, z_pos):
+        a_env_1 = self.pulse_1._envelope_function_on_grid(xi, r, z_pos)
+        a_env_2 = self.pulse_2._envelope_function_on_grid(xi, r, z_pos)
+        return a_env_1 + a_env_2
+
 
 class GaussianPulse(LaserPulse):
     """Class defining a Gaussian laser pulse.
@@ -413,6 +608,13 @@ class GaussianPulse(LaserPulse):
         avg_amplitude = self.a_0
         return avg_amplitude / diff_factor * gaussian_profile
 
+    def _envelope_function_on_grid(self, xi, r, z_pos):
+        a_env = np.zeros((xi.shape[0], r.shape[0]), dtype=np.complex128)
+        gaussian_envelope(
+            xi, r, z_pos, self.xi_c, self.a_0, self.w_0, self.tau,
+            self.z_foc, self.z_r, self.cep_phase, a_env)
+        return a_env
+
 
 class LaguerreGaussPulse(LaserPulse):
     """Class defining a Laguerre-Gauss pulse.
@@ -503,6 +705,14 @@ class LaguerreGaussPulse(LaserPulse):
         a = self.a0 * profile
         return a
 
+    def _envelope_function_on_grid(self, xi, r, z_pos):
+        a_env = np.zeros((xi.shape[0], r.shape[0]), dtype=np.complex128)
+        laguerre_gauss_envelope(
+            xi, r, z_pos, self.xi_c, self.w0, self.tau, self.z_foc, self.z_r,
+            np.array([self.p]), np.array([self.a0]),
+            np.array([self.cep_phase]), a_env)
+        return a_env
+
 
 class FlattenedGaussianPulse(LaserPulse):
     """Class defining a flattened Gaussian pulse.
@@ -588,6 +798,24 @@ class FlattenedGaussianPulse(LaserPulse):
         """Complex envelope of the flattened Gaussian beam."""
         return self.summed_pulse.envelope_function(xi, r, z_pos)
 
+    def _envelope_function_on_grid(self, xi, r, z_pos):
+        # Evaluate all Laguerre-Gauss modes in a single kernel.
+        modes = self._get_laguerre_gauss_modes(self.summed_pulse)
+        mode = modes[0]
+        a_env = np.zeros((xi.shape[0], r.shape[0]), dtype=np.complex128)
+        laguerre_gauss_envelope(
+            xi, r, z_pos, mode.xi_c, mode.w0, mode.tau, mode.z_foc, mode.z_r,
+            np.array([m.p for m in modes]), np.array([m.a0 for m in modes]),
+            np.array([m.cep_phase for m in modes]), a_env)
+        return a_env
+
+    def _get_laguerre_gauss_modes(self, pulse):
+        """Get the list of Laguerre-Gauss modes within a summed pulse."""
+        if isinstance(pulse, SummedPulse):
+            return (self._get_laguerre_gauss_modes(pulse.pulse_1) +
+                    self._get_laguerre_gauss_modes(pulse.pulse_2))
+        return [pulse]
+
 
 class OpenPMDPulse(LaserPulse):
     """Read a laser pulse from an openPMD file.
@@ -630,6 +858,15 @@ class OpenPMDPulse(LaserPulse):
         sequence, or as a single number, in which case it is equal for
         all axes. By default `(5, 0)`, which only smooths along the radial
         direction.
+    cache_dir : str, optional
+        Path to a directory where the laser envelope is cached on disk. The
+        cached envelope is identified by the openPMD source (file path and
+        modification time, iteration, field, coordinate and prefix), the
+        smoothing options and the grid in which the envelope is evaluated.
+        If the same pulse is later used again on the same grid (for
+        example, in a parameter scan), it is read from the cache and
+        the openPMD data does not need to be processed again.
+        By default `None` (no caching).
 
     Notes
     -----
@@ -652,25 +889,81 @@ class OpenPMDPulse(LaserPulse):
         theta: Optional[float] = 0.,
         smooth_edges: Optional[bool] = False,
         apply_gaussian_filter: Optional[bool] = False,
-        gaussian_filter_sigma: Optional[Union[int, float, Iterable]] = (5, 0)
+        gaussian_filter_sigma: Optional[Union[int, float, Iterable]] = (5, 0),
+        cache_dir: Optional[str] = None
     ) -> None:
-        assert lasy_installed, (
-            "Using an `OpenPMDPulse` requires `lasy` to be installed. "
-            "You can do so with `pip install lasy`."
-        )
-        self.lasy_profile = FromOpenPMDProfile(
-            path=path,
-            iteration=iteration,
-            pol=(1, 0),  # dummy value, currently not needed
-            field=field,
-            coord=coord,
-            prefix=prefix,
-            theta=theta
-        )
-        super().__init__(self.lasy_profile.lambda0, 'linear')
+        self._path = path
+        self._iteration = iteration
+        self._field = field
+        self._coord = coord
+        self._prefix = prefix
+        self._theta = theta
         self._smooth_edges = smooth_edges
         self._apply_gaussian_filter = apply_gaussian_filter
         self._gaussian_filter_sigma = gaussian_filter_sigma
+        self._cache_dir = cache_dir
+        self.lasy_profile = None
+
+        # Get wavelength from cache or from the openPMD data.
+        l_0 = None
+        if cache_dir is not None:
+            l_0_file = self._get_cache_file('l_0')
+            if os.path.exists(l_0_file):
+                l_0 = float(np.load(l_0_file))
+        if l_0 is None:
+            l_0 = self._get_lasy_profile().lambda0
+            if cache_dir is not None:
+                _save_cache_file(l_0_file, l_0)
+        super().__init__(l_0, 'linear')
+
+    def _get_lasy_profile(self):
+        """Get the `lasy` profile, reading it if needed."""
+        if self.lasy_profile is None:
+            assert lasy_installed, (
+                "Using an `OpenPMDPulse` requires `lasy` to be installed. "
+                "You can do so with `pip install lasy`."
+            )
+            self.lasy_profile = FromOpenPMDProfile(
+                path=self._path,
+                iteration=self._iteration,
+                pol=(1, 0),  # dummy value, currently not needed
+                field=self._field,
+                coord=self._coord,
+                prefix=self._prefix,
+                theta=self._theta
+            )
+        return self.lasy_profile
+
+    def _get_cache_file(self, name, grid=None):
+        """Get the path of a cache file of this pulse.
+
+        The file name contains a hash of the openPMD source and options
+        and, if given, of the grid arrays.
+        """
+        path = os.path.abspath(self._path)
+        source = (
+            path, _get_modification_time(path), self._iteration,
+            self._field, self._coord, self._prefix, self._theta,
+            self._smooth_edges, self._apply_gaussian_filter,
+            np.asarray(self._gaussian_filter_sigma).tolist()
+        )
+        key = hashlib.sha1(repr(source).encode())
+        if grid is not None:
+            for array in grid:
+                key.update(np.ascontiguousarray(array).tobytes())
+        return os.path.join(
+            self._cache_dir, f'{name}_{key.hexdigest()}.npy')
+
+    def _envelope_function_on_grid(self, xi, r, z_pos):
+        if self._cache_dir is None:
+            return super()._envelope_function_on_grid(xi, r, z_pos)
+        cache_file = self._get_cache_file(
+            'a_env', grid=(xi, r, np.array([z_pos])))
+        if os.path.exists(cache_file):
+            return np.load(cache_file)
+        a_env = super()._envelope_function_on_grid(xi, r, z_pos)
+        _save_cache_file(cache_file, a_env)
+        return a_env
 
     def _envelope_function(self, xi, r, z_pos):
         # Create laser
@@ -686,7 +979,7 @@ class OpenPMDPulse(LaserPulse):
             lo=(r_min, t_min),
             hi=(r_max, t_max),
             npoints=(xi.shape[1], xi.shape[0]),
-            profile=self.lasy_profile,
+            profile=self._get_lasy_profile(),
             n_azimuthal_modes=1
         )
         a_env = field_to_vector_potential(laser.grid, laser.profile.omega0)
@@ -700,7 +993,41 @@ class OpenPMDPulse(LaserPulse):
 
         # Smooth radial edges of profile.
         if self._smooth_edges:
-            r_smooth = min(np.max(self.lasy_profile.axes['r']), np.max(r))
+            r_smooth = min(
+                np.max(self._get_lasy_profile().axes['r']), np.max(r))
             a_env *= np.exp(- 2 * (r / (r_smooth * 0.85)) ** 8)
 
         return a_env
+
+
+def _save_cache_file(cache_file, array):
+    """Save an array to a cache file.
+
+    The array is first written to a temporary file in the same folder, which
+    is then renamed to `cache_file`. This makes sure that other processes
+    sharing the cache (e.g., in a parameter scan) never read an incomplete
+    file.
+    """
+    cache_dir = os.path.dirname(cache_file)
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_file = tempfile.mkstemp(dir=cache_dir, suffix='.npy.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp_file, cache_file)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+
+
+def _get_modification_time(path):
+    """Get the latest modification time of a file or of a folder content."""
+    if not os.path.exists(path):
+        return None
+    if os.path.isdir(path):
+        return max(
+            [os.path.getmtime(path)] +
+            [os.path.getmtime(entry.path) for entry in os.scandir(path)]
+        )
+    return os.path.getmtime(path)
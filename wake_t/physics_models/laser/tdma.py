@@ -28,17 +28,21 @@ def TDMA(a, b, c, d, p):
     d : array
         Solution vector. Dimension: nr.
 
+    The system is solved in the precision of the arrays, which should all
+    have the same precision (single or double).
+
     """
     n = len(d)
-    w = np.empty(n - 1, dtype=np.complex128)
-    g = np.empty(n, dtype=np.complex128)
+    w = np.empty(n - 1, dtype=d.dtype)
+    g = np.empty(n, dtype=d.dtype)
 
     w[0] = c[0] / b[0]  # MAKE SURE THAT b[0]!=0
     g[0] = d[0] / b[0]
 
     for i in range(1, n - 1):
         a_im1 = a[i - 1]
-        inv_coef = 1. / (b[i] - a_im1 * w[i - 1])
+        # Unlike `1. / x`, `np.reciprocal` keeps single precision.
+        inv_coef = np.reciprocal(b[i] - a_im1 * w[i - 1])
         g[i] = (d[i] - a_im1 * g[i - 1]) * inv_coef
         w[i] = c[i] * inv_coef
 
@@ -48,3 +52,36 @@ def TDMA(a, b, c, d, p):
     p[-1] = g[-1]
     for i in range(n - 1, 0, -1):
         p[i - 1] = g[i - 1] - w[i - 1] * p[i]
+
+
+@njit_serial(fastmath=True)
+def TDMA_buffered(a, b, c, d, p, w, g):
+    """Same as `TDMA`, but using the preallocated buffers `w` and `g`.
+
+    Parameters
+    ----------
+    a, b, c, d, p : array
+        Same as in `TDMA`.
+    w, g : array
+        Work arrays of dimension nr (at least).
+
+    """
+    n = len(d)
+
+    w[0] = c[0] / b[0]
+    g[0] = d[0] / b[0]
+
+    for i in range(1, n - 1):
+        a_im1 = a[i - 1]
+        # Unlike `1. / x`, `np.reciprocal` keeps single precision.
+        inv_coef = np.reciprocal(b[i] - a_im1 * w[i - 1])
+        g[i] = (d[i] - a_im1 * g[i - 1]) * inv_coef
+        w[i] = c[i] * inv_coef
+
+    g[n - 1] = ((d[n - 1] - a[n - 2] * g[n - 2])
+                / (b[n - 1] - a[n - 2] * w[n - 2]))
+
+    # Fill in output array.
+    p[n - 1] = g[n - 1]
+    for i in range(n - 1, 0, -1):
+        p[i - 1] = g[i - 1] - w[i - 1] * p[i]
@@ -1,5 +1,6 @@
 """Utilities for the laser envelope solver."""
 import numpy as np
+import scipy.constants as ct
 from wake_t.utilities.numba import njit_serial
 
 
@@ -57,3 +58,104 @@ def unwrap(p, discont=None, axis=-1, period=6.283185307179586):
         p_new[i] = up
 
     return p_new.reshape(init_shape)
+
+
+@njit_serial(nogil=True)
+def get_active_region(a, a_old, nz, threshold):
+    """Get the region where the envelope is above a threshold.
+
+    Parameters
+    ----------
+    a, a_old : ndarray
+        The current and previous envelope arrays (including the 2 ghost
+        cells at the end of the z direction).
+    nz : int
+        Number of grid points in the z direction.
+    threshold : float
+        Threshold of `|a|`, relative to its maximum value.
+
+    Returns
+    -------
+    tuple
+        The first and last index along z and the last index along r
+        where `|a|` or `|a_old|` are above the threshold. If the envelope
+        is zero everywhere, -1 is returned for all of them.
+    """
+    nr = a.shape[1]
+    a2_max = 0.
+    for j in range(nz):
+        for k in range(nr):
+            a2_max = max(a2_max, a[j, k].real ** 2 + a[j, k].imag ** 2,
+                         a_old[j, k].real ** 2 + a_old[j, k].imag ** 2)
+    if a2_max == 0.:
+        return -1, -1, -1
+    a2_threshold = threshold ** 2 * a2_max
+    j_min = nz
+    j_max = -1
+    k_max = -1
+    for j in range(nz):
+        for k in range(nr):
+            a2 = max(a[j, k].real ** 2 + a[j, k].imag ** 2,
+                     a_old[j, k].real ** 2 + a_old[j, k].imag ** 2)
+            if a2 > a2_threshold:
+                j_min = min(j_min, j)
+                j_max = max(j_max, j)
+                k_max = max(k_max, k)
+    return j_min, j_max, k_max
+
+
+@njit_serial(nogil=True)
+def get_envelope_phase_rate(a, chi, nz, dz, dr, k0, kp):
+    """Estimate the maximum rate of change of the envelope phase.
+
+    The envelope equation is approximately
+    ``2i*k_eff*da/dt = c*(kp**2*chi - nabla_tr**2)*a``, where
+    ``k_eff = k0 + dtheta/dxi`` is the local wavenumber of the laser
+    (including the longitudinal gradient of the envelope phase). The
+    phase of the envelope therefore changes at a rate
+    ``c*(kp**2*|chi| + |nabla_tr**2 a / a|) / (2*k_eff)``.
+
+    Parameters
+    ----------
+    a : ndarray
+        The envelope array (including the 2 ghost cells at the end of the
+        z direction).
+    chi : ndarray
+        The (normalized) plasma susceptibility.
+    nz : int
+        Number of grid points in the z direction.
+    dz, dr : float
+        Longitudinal and radial grid spacing in SI units.
+    k0, kp : float
+        Laser and plasma wavenumbers in SI units.
+
+    Returns
+    -------
+    float
+        The rate of change of the phase in rad/s.
+    """
+    chi_max = np.max(np.abs(chi))
+
+    # Only consider regions where the laser has a significant amplitude.
+    a_max = 0.
+    for j in range(nz):
+        a_max = max(a_max, abs(a[j, 0]))
+    if a_max == 0.:
+        return 0.
+
+    # Maximum transverse curvature and minimum local wavenumber on axis.
+    curvature_max = 0.
+    dtheta_min = 0.
+    for j in range(nz):
+        a_j = abs(a[j, 0])
+        if a_j > 0.1 * a_max:
+            # At the axis, nabla_tr**2 a = 2 * (a[1] - a[0]) / dr**2 with
+            # cell-centered radial nodes.
+            curvature = 2 * abs(a[j, 1] - a[j, 0]) / (dr ** 2 * a_j)
+            curvature_max = max(curvature_max, curvature)
+            if abs(a[j + 1, 0]) > 0.1 * a_max:
+                dtheta = np.angle(a[j + 1, 0]) - np.angle(a[j, 0])
+                dtheta = (dtheta + np.pi) % (2 * np.pi) - np.pi
+                dtheta_min = min(dtheta_min, dtheta / dz)
+    k_eff = max(k0 + dtheta_min, 0.5 * k0)
+    return ct.c * (kp ** 2 * chi_max + curvature_max) / (2 * k_eff)
@@ -58,7 +58,10 @@ class CustomBlowoutWakefield(AnalyticalField):
         super().__init__(e_x=e_x, e_y=e_y, e_z=e_z)
 
     def _pre_gather(self, x, y, xi, t):
+        self.constants = self._get_constants(t)
+
+    def _get_constants(self, t):
         n_p = self.density(t*ct.c)
         b_w = self.laser.get_group_velocity(n_p)
-        self.constants = np.array(
+        return np.array(
             [self.k, self.e_z_0, self.e_z_p, self.xi_fields, b_w])
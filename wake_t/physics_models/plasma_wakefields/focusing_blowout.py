@@ -2,7 +2,7 @@ import numpy as np
 import scipy.constants as ct
 
 from wake_t.fields.analytical_field import AnalyticalField
-from wake_t.utilities.numba import prange
+from wake_t.utilities.numba import prange, njit_serial
 
 
 class FocusingBlowoutField(AnalyticalField):
@@ -21,7 +21,48 @@ class FocusingBlowoutField(AnalyticalField):
 
     def _pre_gather(self, x, y, xi, t):
         z = t*ct.c + xi
+        self.constants = self._get_focusing_strength(z)
+
+    def _get_focusing_strength(self, z):
         n_p = self.density(z)
         w_p = np.sqrt(n_p*ct.e**2/(ct.m_e*ct.epsilon_0))
-        k = (ct.m_e/(2*ct.e*ct.c))*w_p**2
-        self.constants = k
+        return (ct.m_e/(2*ct.e*ct.c))*w_p**2
+
+    def _get_serial_components(self, z_min, z_max, n_points=10000):
+        # The focusing strength depends on the position of each particle.
+        # Since the density function cannot be called from a compiled
+        # kernel, tabulate it along the range of `z` explored by the
+        # particles. The first two constants are `z_min` and `dz`.
+        z = np.linspace(z_min, z_max, n_points)
+        dz = z[1] - z[0] if z_max > z_min else 1.
+        k = self._get_focusing_strength(z)
+        constants = np.concatenate(([z_min, dz], k))
+        components = (e_x_tabulated, e_y_tabulated, None, None, None, None)
+        return components, constants
+
+
+@njit_serial(inline='always')
+def interpolate_focusing_strength(z, constants):
+    """Linearly interpolate the tabulated focusing strength at `z`."""
+    n_points = constants.shape[0] - 2
+    u = (z - constants[0]) / constants[1]
+    u = min(max(u, 0.), n_points - 1.)
+    i = min(int(u), n_points - 2)
+    w = u - i
+    return (1. - w) * constants[2 + i] + w * constants[3 + i]
+
+
+@njit_serial()
+def e_x_tabulated(x, y, xi, t, ex, constants):
+    """Ex component using a tabulated focusing strength."""
+    for i in range(x.shape[0]):
+        k = interpolate_focusing_strength(t * ct.c + xi[i], constants)
+        ex[i] = ct.c * k * x[i]
+
+
+@njit_serial()
+def e_y_tabulated(x, y, xi, t, ey, constants):
+    """Ey component using a tabulated focusing strength."""
+    for i in range(x.shape[0]):
+        k = interpolate_focusing_strength(t * ct.c + xi[i], constants)
+        ey[i] = ct.c * k * y[i]
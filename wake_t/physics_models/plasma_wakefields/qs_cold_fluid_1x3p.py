@@ -1,13 +1,13 @@
-from typing import Optional, Callable
+from typing import Optional, Callable, Union
+import math
 
 import numpy as np
 import scipy.constants as ct
 import aptools.plasma_accel.general_equations as ge
 
 from wake_t.particles.deposition import deposit_3d_distribution
-from wake_t.particles.interpolation import (
-    gather_field_cyl_linear)
 from wake_t.fields.rz_wakefield import RZWakefield
+from wake_t.utilities.numba import njit_serial, njit_parallel, prange
 from wake_t.physics_models.laser.laser_pulse import LaserPulse
 
 
@@ -58,6 +58,17 @@ class NonLinearColdFluidWakefield(RZWakefield):
         the simulation window advances by 10 micron. By default, if not
         specified, the value of `dz_fields` will be `xi_max-xi_min`, i.e.,
         the length the simulation box.
+        If ``'auto'``, the distance to the next update is determined
+        after each update from the relative change of the fields (and of
+        the laser envelope) since the previous update, and from the
+        relative change of the plasma density expected until the next one.
+    dz_fields_min, dz_fields_max : float, optional
+        Minimum and maximum value of `dz_fields` when
+        `dz_fields='auto'`. By default, 0.1 and 10 times the length of
+        the simulation box, respectively.
+    dz_fields_tolerance : float, optional
+        Maximum relative change of the fields between updates when
+        `dz_fields='auto'`. By default `0.05`.
     beam_wakefields : bool, optional
         Whether to take into account beam-driven wakefields (False by
         default). This should be set to True for any beam-driven case or
@@ -72,10 +83,13 @@ class NonLinearColdFluidWakefield(RZWakefield):
         If True (default), the laser pulse is evolved
         using a laser envelope model. If False, the pulse envelope stays
         unchanged throughout the computation.
-    laser_envelope_substeps : int, optional
+    laser_envelope_substeps : int or str, optional
         Number of substeps of the laser envelope solver per `dz_fields`.
         The time step of the envelope solver is therefore
         `dz_fields / c / laser_envelope_substeps`.
+        If ``'auto'``, the number of substeps is determined at each update
+        from an estimate of the change of the envelope phase (see
+        ``laser_envelope_substeps_tolerance``).
     laser_envelope_nxi, laser_envelope_nr : int, optional
         If given, the laser envelope will run in a grid of size
         (`laser_envelope_nxi`, `laser_envelope_nr`) instead
@@ -87,6 +101,43 @@ class NonLinearColdFluidWakefield(RZWakefield):
         Determines whether to take into account the terms related to the
         longitudinal derivative of the complex phase in the envelope
         solver.
+    laser_envelope_parallel : bool, optional
+        If ``True``, the substeps of the laser envelope solver are computed
+        in parallel as a wavefront along the grid. Only useful when
+        ``laser_envelope_substeps > 1`` and several threads are available.
+        By default ``False``.
+    laser_envelope_auto_crop : bool, optional
+        If ``True``, the laser envelope is only evolved within the region
+        where its amplitude is above ``1e-4`` times its maximum value (plus
+        a safety margin), and set to zero outside of it. This reduces the
+        cost of the envelope solver in large simulation boxes.
+        By default ``False``.
+    laser_envelope_single_precision : bool, optional
+        If ``True``, the laser envelope is stored and evolved in single
+        precision (``complex64``), which halves the memory footprint and
+        bandwidth of the envelope solver. By default ``False``.
+    laser_envelope_substeps_min, laser_envelope_substeps_max : int, optional
+        Minimum and maximum number of substeps when
+        ``laser_envelope_substeps='auto'``. By default ``1`` and ``16``.
+    laser_envelope_substeps_tolerance : float, optional
+        When ``laser_envelope_substeps='auto'``, the number of substeps is
+        chosen at each update so that the estimated change of the envelope
+        phase in each substep is below this value (in rad). By default
+        ``0.05``.
+    laser_envelope_concurrent : bool, optional
+        If ``True``, the evolution of the laser envelope until the next
+        update is computed in a background thread right after each update,
+        while the particle bunches are being pushed. The result is the same
+        as without this option. When combined with
+        ``laser_envelope_parallel=True``, a thread-safe numba threading
+        layer (``'tbb'`` or ``'omp'``) is required. By default ``False``.
+    field_time_interpolation : str, optional
+        If ``'linear'`` or ``'quadratic'``, the fields of the last two or
+        three updates are kept and the fields gathered by the particles are
+        interpolated (or extrapolated after the last update) in time using
+        a polynomial of that order. This allows for a larger ``dz_fields``
+        at the same accuracy. If ``None`` (default), the fields are kept
+        constant between updates.
 
     See Also
     --------
@@ -107,15 +158,26 @@ class NonLinearColdFluidWakefield(RZWakefield):
         xi_max: float,
         n_r: int,
         n_xi: int,
-        dz_fields: Optional[float] = None,
+        dz_fields: Optional[Union[float, str]] = None,
         beam_wakefields: Optional[bool] = False,
         p_shape: Optional[str] = 'linear',
         laser: Optional[LaserPulse] = None,
         laser_evolution: Optional[bool] = True,
-        laser_envelope_substeps: Optional[int] = 1,
+        laser_envelope_substeps: Optional[Union[int, str]] = 1,
         laser_envelope_nxi: Optional[int] = None,
         laser_envelope_nr: Optional[int] = None,
         laser_envelope_use_phase: Optional[bool] = True,
+        field_time_interpolation: Optional[str] = None,
+        dz_fields_min: Optional[float] = None,
+        dz_fields_max: Optional[float] = None,
+        dz_fields_tolerance: Optional[float] = 0.05,
+        laser_envelope_parallel: Optional[bool] = False,
+        laser_envelope_auto_crop: Optional[bool] = False,
+        laser_envelope_single_precision: Optional[bool] = False,
+        laser_envelope_substeps_min: Optional[int] = 1,
+        laser_envelope_substeps_max: Optional[int] = 16,
+        laser_envelope_substeps_tolerance: Optional[float] = 0.05,
+        laser_envelope_concurrent: Optional[bool] = False,
     ) -> None:
         self.beam_wakefields = beam_wakefields
         self.p_shape = p_shape
@@ -127,22 +189,28 @@ class NonLinearColdFluidWakefield(RZWakefield):
             n_r=n_r,
             n_xi=n_xi,
             dz_fields=dz_fields,
+            dz_fields_min=dz_fields_min,
+            dz_fields_max=dz_fields_max,
+            dz_fields_tolerance=dz_fields_tolerance,
             laser=laser,
             laser_evolution=laser_evolution,
             laser_envelope_substeps=laser_envelope_substeps,
             laser_envelope_nxi=laser_envelope_nxi,
             laser_envelope_nr=laser_envelope_nr,
             laser_envelope_use_phase=laser_envelope_use_phase,
+            laser_envelope_parallel=laser_envelope_parallel,
+            laser_envelope_auto_crop=laser_envelope_auto_crop,
+            laser_envelope_single_precision=(
+                laser_envelope_single_precision),
+            laser_envelope_substeps_min=laser_envelope_substeps_min,
+            laser_envelope_substeps_max=laser_envelope_substeps_max,
+            laser_envelope_substeps_tolerance=(
+                laser_envelope_substeps_tolerance),
+            laser_envelope_concurrent=laser_envelope_concurrent,
+            field_time_interpolation=field_time_interpolation,
             model_name='cold_fluid_1d'
         )
 
-    def __wakefield_ode_system(self, u_1, u_2, laser_a0, n_beam):
-        if self.beam_wakefields:
-            return np.array(
-                [u_2, (1+laser_a0**2)/(2*(1+u_1)**2) - n_beam - 1/2])
-        else:
-            return np.array([u_2, (1+laser_a0**2)/(2*(1+u_1)**2) - 1/2])
-
     def _calculate_wakefield(self, bunches):
         # Get laser envelope
         if self.laser is not None:
@@ -166,14 +234,9 @@ class NonLinearColdFluidWakefield(RZWakefield):
         # Get charge distribution and remove guard cells.
         beam_hist = np.zeros((self.n_xi+4, self.n_r+4))
         for bunch in bunches:
-            x = bunch.x
-            y = bunch.y
-            xi = bunch.xi
-            w = bunch.w * (bunch.q_species / ct.e)
-            deposit_3d_distribution(
-                xi/s_d, x/s_d, y/s_d, w, self.xi_min/s_d, r_fld[0],
-                self.n_xi, self.n_r, dz, dr, beam_hist, p_shape=self.p_shape,
-                use_ruyten=True)
+            bunch.deposit(
+                deposit_beam_distribution, beam_hist, s_d, self.xi_min/s_d,
+                r_fld[0], self.n_xi, self.n_r, dz, dr, self.p_shape)
         beam_hist = beam_hist[2:-2, 2:-2]
 
         n = np.arange(self.n_r)
@@ -184,37 +247,10 @@ class NonLinearColdFluidWakefield(RZWakefield):
         u_2 = np.zeros((n_iter + 1, len(r_fld)))
         z_fld = self.xi_fld / s_d
 
-        for i in np.arange(n_iter):
-            z_i = z_fld[-1 - i]
-            # get laser a0 at z, z+dz/2 and z+dz
-            if self.laser is not None:
-                x = r_fld
-                y = np.zeros_like(r_fld)
-                z = np.full_like(r_fld, z_i)
-                a0_0 = gather_field_cyl_linear(
-                    a_rz, self.xi_min/s_d, self.xi_max/s_d, r_fld[0],
-                    r_fld[-1], dz, dr, x, y, z)
-                a0_1 = gather_field_cyl_linear(
-                    a_rz, self.xi_min/s_d, self.xi_max/s_d, r_fld[0],
-                    r_fld[-1], dz, dr, x, y, z - dz/2)
-                a0_2 = gather_field_cyl_linear(
-                    a_rz, self.xi_min/s_d, self.xi_max/s_d, r_fld[0],
-                    r_fld[-1], dz, dr, x, y, z - dz)
-            else:
-                a0_0 = np.zeros(r_fld.shape[0])
-                a0_1 = np.zeros(r_fld.shape[0])
-                a0_2 = np.zeros(r_fld.shape[0])
-            # perform runge-kutta
-            A = dz*self.__wakefield_ode_system(
-                u_1[-1-i], u_2[-1-i], a0_0, beam_hist[-i-1])
-            B = dz*self.__wakefield_ode_system(
-                u_1[-1-i] + A[0]/2, u_2[-1-i] + A[1]/2, a0_1, beam_hist[-i-1])
-            C = dz*self.__wakefield_ode_system(
-                u_1[-1-i] + B[0]/2, u_2[-1-i] + B[1]/2, a0_1, beam_hist[-i-1])
-            D = dz*self.__wakefield_ode_system(
-                u_1[-1-i] + C[0], u_2[-1-i] + C[1], a0_2, beam_hist[-i-1])
-            u_1[-2-i] = u_1[-1-i] + 1/6*(A[0] + 2*B[0] + 2*C[0] + D[0])
-            u_2[-2-i] = u_2[-1-i] + 1/6*(A[1] + 2*B[1] + 2*C[1] + D[1])
+        # Integrate the fluid equations along xi in each radial column.
+        calculate_fluid_response(
+            u_1, u_2, a_rz, beam_hist, z_fld, r_fld, self.xi_min/s_d,
+            self.xi_max/s_d, dz, dr, self.beam_wakefields)
         E_z = -np.gradient(u_1, dz, axis=0, edge_order=2)
         W_r = -np.gradient(u_1, dr, axis=1, edge_order=2)
         E_0 = ge.plasma_cold_non_relativisct_wave_breaking_field(
@@ -240,3 +276,110 @@ class NonLinearColdFluidWakefield(RZWakefield):
         self.b_t[2:-2, 2:-2] = B_theta * E_0 / ct.c
         self.e_r[2:-2, 2:-2] = E_r * E_0
         self.e_z[2:-2, 2:-2] = E_z * E_0
+
+
+def deposit_beam_distribution(chunk, beam_hist, s_d, z_min, r_min, n_xi,
+                              n_r, dz, dr, p_shape):
+    """Deposit the charge of a chunk of beam particles (in units of the
+    elementary charge) on the normalized `beam_hist` grid."""
+    w = chunk.w * (chunk.q_species / ct.e)
+    deposit_3d_distribution(
+        chunk.xi/s_d, chunk.x/s_d, chunk.y/s_d, w, z_min, r_min, n_xi, n_r,
+        dz, dr, beam_hist, p_shape=p_shape, use_ruyten=True)
+
+
+@njit_parallel()
+def calculate_fluid_response(u_1, u_2, a_rz, beam_hist, z_fld, r_fld, z_min,
+                             z_max, dz, dr, beam_wakefields):
+    """Integrate the 1D fluid equations from the front to the back of the
+    grid using a 4th order Runge-Kutta method.
+
+    Each radial column is independent from the others, so they are
+    integrated in parallel. `u_1` and `u_2` are updated in place.
+
+    Parameters
+    ----------
+    u_1, u_2 : ndarray
+        Arrays of size (n_xi, n_r) where the normalized potential and its
+        derivative will be stored.
+    a_rz : ndarray
+        Laser envelope amplitude, including two guard cells on each side.
+    beam_hist : ndarray
+        Normalized beam density.
+    z_fld, r_fld : ndarray
+        Normalized longitudinal and radial position of the grid nodes.
+    z_min, z_max : float
+        Normalized longitudinal boundaries of the grid.
+    dz, dr : float
+        Normalized grid spacing.
+    beam_wakefields : bool
+        Whether to take into account the beam density.
+    """
+    n_xi, n_r = u_1.shape
+    r_min = r_fld[0]
+    r_max = r_fld[-1]
+    for j in prange(n_r):
+        r = r_fld[j]
+        for i in range(n_xi - 1):
+            k = n_xi - 1 - i
+            z_i = z_fld[k]
+            # Get laser a0 at z, z-dz/2 and z-dz.
+            a0_0 = interpolate_a0(a_rz, z_min, z_max, r_min, r_max, dz, dr,
+                                  r, z_i)
+            a0_1 = interpolate_a0(a_rz, z_min, z_max, r_min, r_max, dz, dr,
+                                  r, z_i - dz/2)
+            a0_2 = interpolate_a0(a_rz, z_min, z_max, r_min, r_max, dz, dr,
+                                  r, z_i - dz)
+            n_beam = beam_hist[k, j] if beam_wakefields else 0.
+            u_1_i = u_1[k, j]
+            u_2_i = u_2[k, j]
+            # Perform Runge-Kutta step.
+            a_1 = dz*u_2_i
+            a_2 = dz*fluid_force(u_1_i, a0_0, n_beam)
+            b_1 = dz*(u_2_i + a_2/2)
+            b_2 = dz*fluid_force(u_1_i + a_1/2, a0_1, n_beam)
+            c_1 = dz*(u_2_i + b_2/2)
+            c_2 = dz*fluid_force(u_1_i + b_1/2, a0_1, n_beam)
+            d_1 = dz*(u_2_i + c_2)
+            d_2 = dz*fluid_force(u_1_i + c_1, a0_2, n_beam)
+            u_1[k-1, j] = u_1_i + 1/6*(a_1 + 2*b_1 + 2*c_1 + d_1)
+            u_2[k-1, j] = u_2_i + 1/6*(a_2 + 2*b_2 + 2*c_2 + d_2)
+
+
+@njit_serial(inline='always')
+def fluid_force(u_1, a0, n_beam):
+    """Right-hand side of the equation for the derivative of `u_1`."""
+    return (1+a0**2)/(2*(1+u_1)**2) - n_beam - 1/2
+
+
+@njit_serial(inline='always')
+def interpolate_a0(a_rz, z_min, z_max, r_min, r_max, dz, dr, r, z):
+    """Interpolate the laser amplitude at (z, r). Equivalent to
+    `gather_field_cyl_linear` for a single point."""
+    r = math.sqrt(r**2)
+    if z >= z_min and z <= z_max and r <= r_max:
+        # Position in cell units.
+        r_cell = (r - r_min)/dr + 2.
+        z_cell = (z - z_min)/dz + 2.
+
+        # Indices of upper and lower cells in r and z.
+        ir_lower = int(math.floor(r_cell))
+        ir_upper = ir_lower + 1
+        iz_lower = int(math.floor(z_cell))
+        iz_upper = iz_lower + 1
+
+        # If lower r cell is below axis, assume same value as first cell.
+        if ir_lower < 2:
+            ir_lower = 2
+
+        # Interpolate in z.
+        dz_u = iz_upper - z_cell
+        dz_l = z_cell - iz_lower
+        a_z_1 = dz_u*a_rz[iz_lower, ir_lower] + dz_l*a_rz[iz_upper, ir_lower]
+        a_z_2 = dz_u*a_rz[iz_lower, ir_upper] + dz_l*a_rz[iz_upper, ir_upper]
+
+        # Interpolate in r.
+        dr_u = ir_upper - r_cell
+        dr_l = 1 - dr_u
+        return dr_u*a_z_1 + dr_l*a_z_2
+    return 0.
@@ -476,18 +476,12 @@ def calculate_beam_source(
     # Plasma skin depth.
     s_d = ge.plasma_skin_depth(n_p / 1e6)
 
-    # Get and normalize particle coordinate arrays.
-    xi_n = bunch.xi / s_d
-    x_n = bunch.x / s_d
-    y_n = bunch.y / s_d
-
-    # Calculate particle weights.
-    w = bunch.q / ct.e / (2 * np.pi * dr * dxi * s_d ** 3 * n_p)
-
     # Obtain charge distribution (using cubic particle shape by default).
+    # The bunch is deposited chunk by chunk, if needed.
     q_dist = np.zeros((n_xi + 4, n_r + 4))
-    deposit_3d_distribution(xi_n, x_n, y_n, w, xi_min, r_min, n_xi, n_r, dxi,
-                            dr, q_dist, p_shape=p_shape, use_ruyten=True)
+    bunch.deposit(
+        deposit_beam_charge, q_dist, s_d, n_p, n_r, n_xi, r_min, xi_min, dr,
+        dxi, p_shape)
 
     # Remove guard cells.
     q_dist = q_dist[2:-2, 2:-2]
@@ -509,3 +503,23 @@ def calculate_beam_source(
         (np.cumsum(q_dist, axis=1) - subs) * dr / np.abs(r_grid_g))
 
     return b_t
+
+
+def deposit_beam_charge(
+        chunk, q_dist, s_d, n_p, n_r, n_xi, r_min, xi_min, dr, dxi, p_shape):
+    """
+    Deposit the normalized charge of a chunk of beam particles on the
+    `q_dist` grid.
+
+    """
+    # Get and normalize particle coordinate arrays.
+    xi_n = chunk.xi / s_d
+    x_n = chunk.x / s_d
+    y_n = chunk.y / s_d
+
+    # Calculate particle weights.
+    w = chunk.q / ct.e / (2 * np.pi * dr * dxi * s_d ** 3 * n_p)
+
+    deposit_3d_distribution(
+        xi_n, x_n, y_n, w, xi_min, r_min, n_xi, n_r, dxi, dr, q_dist,
+        p_shape=p_shape, use_ruyten=True)
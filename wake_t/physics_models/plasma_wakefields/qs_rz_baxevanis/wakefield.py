@@ -1,4 +1,4 @@
-from typing import Optional, Callable
+from typing import Optional, Callable, Union
 
 import numpy as np
 import scipy.constants as ct
@@ -62,6 +62,17 @@ class Quasistatic2DWakefield(RZWakefield):
         only updated every time the simulation window advances by
         10 micron. By default ``dz_fields=xi_max-xi_min``, i.e., the
         length the simulation box.
+        If ``'auto'``, the distance to the next update is determined
+        after each update from the relative change of the fields (and of
+        the laser envelope) since the previous update, and from the
+        relative change of the plasma density expected until the next one.
+    dz_fields_min, dz_fields_max : float, optional
+        Minimum and maximum value of ``dz_fields`` when
+        ``dz_fields='auto'``. By default, 0.1 and 10 times the length of
+        the simulation box, respectively.
+    dz_fields_tolerance : float, optional
+        Maximum relative change of the fields between updates when
+        ``dz_fields='auto'``. By default ``0.05``.
     r_max_plasma : float, optional
         Maximum radial extension of the plasma column. If ``None``, the
         plasma extends up to the ``r_max`` boundary of the simulation box.
@@ -91,10 +102,13 @@ class Quasistatic2DWakefield(RZWakefield):
         If True (default), the laser pulse is evolved
         using a laser envelope model. If ``False``, the pulse envelope
         stays unchanged throughout the computation.
-    laser_envelope_substeps : int, optional
+    laser_envelope_substeps : int or str, optional
         Number of substeps of the laser envelope solver per ``dz_fields``.
         The time step of the envelope solver is therefore
         ``dz_fields / c / laser_envelope_substeps``.
+        If ``'auto'``, the number of substeps is determined at each update
+        from an estimate of the change of the envelope phase (see
+        ``laser_envelope_substeps_tolerance``).
     laser_envelope_nxi, laser_envelope_nr : int, optional
         If given, the laser envelope will run in a grid of size
         (``laser_envelope_nxi``, ``laser_envelope_nr``) instead
@@ -106,6 +120,43 @@ class Quasistatic2DWakefield(RZWakefield):
         Determines whether to take into account the terms related to the
         longitudinal derivative of the complex phase in the envelope
         solver.
+    laser_envelope_parallel : bool, optional
+        If ``True``, the substeps of the laser envelope solver are computed
+        in parallel as a wavefront along the grid. Only useful when
+        ``laser_envelope_substeps > 1`` and several threads are available.
+        By default ``False``.
+    laser_envelope_auto_crop : bool, optional
+        If ``True``, the laser envelope is only evolved within the region
+        where its amplitude is above ``1e-4`` times its maximum value (plus
+        a safety margin), and set to zero outside of it. This reduces the
+        cost of the envelope solver in large simulation boxes.
+        By default ``False``.
+    laser_envelope_single_precision : bool, optional
+        If ``True``, the laser envelope is stored and evolved in single
+        precision (``complex64``), which halves the memory footprint and
+        bandwidth of the envelope solver. By default ``False``.
+    laser_envelope_substeps_min, laser_envelope_substeps_max : int, optional
+        Minimum and maximum number of substeps when
+        ``laser_envelope_substeps='auto'``. By default ``1`` and ``16``.
+    laser_envelope_substeps_tolerance : float, optional
+        When ``laser_envelope_substeps='auto'``, the number of substeps is
+        chosen at each update so that the estimated change of the envelope
+        phase in each substep is below this value (in rad). By default
+        ``0.05``.
+    laser_envelope_concurrent : bool, optional
+        If ``True``, the evolution of the laser envelope until the next
+        update is computed in a background thread right after each update,
+        while the particle bunches are being pushed. The result is the same
+        as without this option. When combined with
+        ``laser_envelope_parallel=True``, a thread-safe numba threading
+        layer (``'tbb'`` or ``'omp'``) is required. By default ``False``.
+    field_time_interpolation : str, optional
+        If ``'linear'`` or ``'quadratic'``, the fields of the last two or
+        three updates are kept and the fields gathered by the particles are
+        interpolated (or extrapolated after the last update) in time using
+        a polynomial of that order. This allows for a larger ``dz_fields``
+        at the same accuracy. If ``None`` (default), the fields are kept
+        constant between updates.
 
     References
     ----------
@@ -125,7 +176,7 @@ class Quasistatic2DWakefield(RZWakefield):
         n_r: int,
         n_xi: int,
         ppc: Optional[int] = 2,
-        dz_fields: Optional[float] = None,
+        dz_fields: Optional[Union[float, str]] = None,
         r_max_plasma: Optional[float] = None,
         parabolic_coefficient: Optional[float] = 0.,
         p_shape: Optional[str] = 'cubic',
@@ -133,10 +184,21 @@ class Quasistatic2DWakefield(RZWakefield):
         plasma_pusher: Optional[str] = 'rk4',
         laser: Optional[LaserPulse] = None,
         laser_evolution: Optional[bool] = True,
-        laser_envelope_substeps: Optional[int] = 1,
+        laser_envelope_substeps: Optional[Union[int, str]] = 1,
         laser_envelope_nxi: Optional[int] = None,
         laser_envelope_nr: Optional[int] = None,
         laser_envelope_use_phase: Optional[bool] = True,
+        field_time_interpolation: Optional[str] = None,
+        dz_fields_min: Optional[float] = None,
+        dz_fields_max: Optional[float] = None,
+        dz_fields_tolerance: Optional[float] = 0.05,
+        laser_envelope_parallel: Optional[bool] = False,
+        laser_envelope_auto_crop: Optional[bool] = False,
+        laser_envelope_single_precision: Optional[bool] = False,
+        laser_envelope_substeps_min: Optional[int] = 1,
+        laser_envelope_substeps_max: Optional[int] = 16,
+        laser_envelope_substeps_tolerance: Optional[float] = 0.05,
+        laser_envelope_concurrent: Optional[bool] = False,
     ) -> None:
         self.ppc = ppc
         self.r_max_plasma = r_max_plasma
@@ -153,12 +215,25 @@ class Quasistatic2DWakefield(RZWakefield):
             n_r=n_r,
             n_xi=n_xi,
             dz_fields=dz_fields,
+            dz_fields_min=dz_fields_min,
+            dz_fields_max=dz_fields_max,
+            dz_fields_tolerance=dz_fields_tolerance,
             laser=laser,
             laser_evolution=laser_evolution,
             laser_envelope_substeps=laser_envelope_substeps,
             laser_envelope_nxi=laser_envelope_nxi,
             laser_envelope_nr=laser_envelope_nr,
             laser_envelope_use_phase=laser_envelope_use_phase,
+            laser_envelope_parallel=laser_envelope_parallel,
+            laser_envelope_auto_crop=laser_envelope_auto_crop,
+            laser_envelope_single_precision=(
+                laser_envelope_single_precision),
+            laser_envelope_substeps_min=laser_envelope_substeps_min,
+            laser_envelope_substeps_max=laser_envelope_substeps_max,
+            laser_envelope_substeps_tolerance=(
+                laser_envelope_substeps_tolerance),
+            laser_envelope_concurrent=laser_envelope_concurrent,
+            field_time_interpolation=field_time_interpolation,
             model_name='quasistatic_2d'
         )
 
@@ -167,7 +242,10 @@ class Quasistatic2DWakefield(RZWakefield):
 
         # Get square of laser envelope
         if self.laser is not None:
-            a_env_2 = np.abs(self.laser.get_envelope()) ** 2
+            # Computed directly from the real and imaginary parts, which
+            # also keeps the precision of the envelope.
+            a_env = self.laser.get_envelope()
+            a_env_2 = a_env.real ** 2 + a_env.imag ** 2
             # If linearly polarized, divide by 2 so that the ponderomotive
             # force on the plasma particles is correct.
             if self.laser.polarization == 'linear':
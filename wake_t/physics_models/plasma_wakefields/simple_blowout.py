@@ -40,6 +40,9 @@ class SimpleBlowoutWakefield(AnalyticalField):
         super().__init__(e_x=e_x, e_y=e_y, e_z=e_z)
 
     def _pre_gather(self, x, y, xi, t):
+        self.constants = self._get_constants(t)
+
+    def _get_constants(self, t):
         n_p = self.density(t*ct.c)
         w_p = ge.plasma_frequency(n_p*1e-6)
         l_p = 2*np.pi*ct.c / w_p
@@ -47,5 +50,5 @@ class SimpleBlowoutWakefield(AnalyticalField):
         e_z_p = w_p**2/2 * ct.m_e / ct.e
         l_c = self.laser.xi_c
         b_w = self.laser.get_group_velocity(n_p)
-        self.constants = np.array(
+        return np.array(
             [g_x, e_z_p, l_p, l_c, self.field_offset, b_w])
@@ -0,0 +1,523 @@
+"""
+This module contains the pool of worker processes that evolve and deposit
+the particles of the bunches in parallel.
+
+The particle data of the bunches and the field grids needed to gather the
+numerical fields are stored in shared memory, so that each process can
+evolve its share of the particles in place, without copying them.
+"""
+import pickle
+import weakref
+import traceback
+import multiprocessing
+from multiprocessing.shared_memory import SharedMemory
+from typing import Optional, Callable, List, Dict, Tuple
+
+import numpy as np
+from numba import cloudpickle
+
+from wake_t.particles.particle_bunch import ParticleBunch
+from wake_t.particles.push.fused_boris_pusher import apply_fused_boris_pusher
+from wake_t.fields.base import Field
+from wake_t.fields.numerical_field import NumericalField
+from wake_t.utilities.numba import num_threads, set_num_threads
+
+
+class ParticleProcessPool():
+    """Pool of worker processes in which the particle bunches are evolved.
+
+    The particles of each bunch are divided into `n_processes` contiguous
+    slices, each of them evolved (or deposited) by a different process. The
+    data of the bunches is moved to shared memory, so that the processes
+    modify it in place. The processes are started (with the ``'spawn'``
+    method) when the pool is created, and receive a copy of the `fields`.
+    The analytical fields are assumed not to change afterwards, while the
+    grids of the numerical fields are broadcast to the processes through
+    shared memory every time `update_field` is called.
+
+    Processes are spawned instead of forked because the threading layers
+    of numba (TBB and OpenMP) cannot be safely used across a fork. As with
+    any other use of `multiprocessing`, the main code of the scripts using
+    the pool should thus be protected by ``if __name__ == '__main__':``.
+
+    Parameters
+    ----------
+    n_processes : int
+        Number of worker processes. Each of them uses the number of numba
+        threads set by Wake-T.
+    fields : list
+        List of `Field`s in which the bunches will be evolved.
+
+    """
+
+    def __init__(
+        self,
+        n_processes: int,
+        fields: List[Field]
+    ) -> None:
+        if n_processes < 2:
+            raise ValueError(
+                'The process pool needs at least 2 processes, not {}.'.format(
+                    n_processes))
+        for field in fields:
+            check_multiprocess_compatibility(field)
+        context = multiprocessing.get_context('spawn')
+        # The fields can contain locally-defined functions (e.g., density
+        # profiles), which cannot be sent with the standard pickle.
+        fields_data = cloudpickle.dumps(fields)
+        self.n_processes = n_processes
+        self.fields = fields
+        self.bunches = []
+        # Shared arrays of the bunches, the field grids and the grids onto
+        # which the processes deposit their particles.
+        self._bunch_arrays = []
+        self._field_arrays = [{} for field in fields]
+        self._deposition_array = None
+        self._connections = []
+        self._processes = []
+        for i in range(n_processes):
+            connection, worker_connection = context.Pipe()
+            process = context.Process(
+                target=_run_worker,
+                args=(worker_connection, fields_data, i, n_processes),
+                daemon=True)
+            process.start()
+            worker_connection.close()
+            self._connections.append(connection)
+            self._processes.append(process)
+        # Make sure that the processes are stopped and the shared memory is
+        # released even if `close` is not called.
+        self._shared_arrays = {}
+        self._finalizer = weakref.finalize(
+            self, _shutdown, self._connections, self._processes,
+            self._shared_arrays)
+
+    def share_bunch(self, bunch: ParticleBunch) -> None:
+        """Move the data of a bunch to shared memory.
+
+        The bunch is evolved by the pool until `close` is called.
+
+        Parameters
+        ----------
+        bunch : ParticleBunch
+            The particle bunch.
+        """
+        if bunch.memmap_dir is not None:
+            raise ValueError(
+                'Memory-mapped bunches cannot be evolved with several '
+                'processes.')
+        bunch.make_contiguous()
+        self.bunches.append(bunch)
+        self._bunch_arrays.append(None)
+        self._share_bunch_data(len(self.bunches) - 1)
+        bunch.process_pool = self
+
+    def update_field(self, field: Field) -> None:
+        """Broadcast the current grids of a numerical field to the processes.
+
+        Parameters
+        ----------
+        field : Field
+            The field, which should have just been updated. Fields other than
+            numerical fields are not broadcast.
+        """
+        if not isinstance(field, NumericalField):
+            return
+        i_field = self._get_field_index(field)
+        arrays, values = field._get_gather_state()
+        shared_arrays = self._field_arrays[i_field]
+        # Release the arrays that are no longer needed.
+        for name in list(shared_arrays):
+            shared = shared_arrays[name]
+            if (
+                name not in arrays or shared.shape != arrays[name].shape or
+                shared.dtype != arrays[name].dtype
+            ):
+                self._release(shared_arrays.pop(name))
+        # Copy the arrays into shared memory.
+        array_specs = {}
+        for name, array in arrays.items():
+            if name not in shared_arrays:
+                shared_arrays[name] = self._allocate(array.shape, array.dtype)
+            shared = shared_arrays[name]
+            shared.array[...] = array
+            array_specs[name] = shared.spec
+        self._run('update_field', i_field, array_specs, values)
+
+    def evolve(
+        self,
+        bunch: ParticleBunch,
+        fields: List[Field],
+        t: float,
+        dt: float,
+        pusher: str,
+        tolerance: float
+    ) -> None:
+        """Evolve a bunch to the next time step (see `ParticleBunch.evolve`).
+
+        With the ``'boris_adaptive'`` pusher, the error of the particles of
+        each process is controlled separately, and the smallest recommended
+        time step is stored in the `dt_adaptive` attribute of the bunch.
+        """
+        i_bunch = self._sync_bunch(bunch)
+        field_indices = [self._get_field_index(field) for field in fields]
+        dt_adaptive = self._run(
+            'evolve', i_bunch, self._get_bunch_properties(bunch),
+            field_indices, t, dt, pusher, tolerance)
+        if pusher == 'boris_adaptive':
+            dt_adaptive = [dt for dt in dt_adaptive if dt is not None]
+            bunch.dt_adaptive = min(dt_adaptive, default=None)
+
+    def apply_fused_boris_pusher(
+        self,
+        bunch: ParticleBunch,
+        fields: List[Field],
+        t: List[float],
+        dt: List[float]
+    ) -> None:
+        """Evolve a bunch through several Boris steps in one kernel (see
+        `apply_fused_boris_pusher`)."""
+        i_bunch = self._sync_bunch(bunch)
+        field_indices = [self._get_field_index(field) for field in fields]
+        self._run(
+            'apply_fused_boris_pusher', i_bunch,
+            self._get_bunch_properties(bunch), field_indices, t, dt)
+
+    def deposit(
+        self,
+        bunch: ParticleBunch,
+        function: Callable,
+        grid: np.ndarray,
+        *args
+    ) -> None:
+        """Deposit the particles of a bunch on a grid (see
+        `ParticleBunch.deposit`).
+
+        Each process deposits its particles on its own copy of the grid,
+        and the result of all processes is added to `grid`.
+        """
+        i_bunch = self._sync_bunch(bunch)
+        shape = (self.n_processes, *grid.shape)
+        shared = self._deposition_array
+        if shared is None or shared.shape != shape:
+            if shared is not None:
+                self._release(shared)
+            shared = self._allocate(shape, np.float64)
+            self._deposition_array = shared
+        self._run(
+            'deposit', i_bunch, self._get_bunch_properties(bunch),
+            function, shared.spec, args)
+        grid += np.sum(shared.array, axis=0)
+
+    def close(self) -> None:
+        """Move the data of the bunches back to private memory, stop the
+        processes and release the shared memory."""
+        for bunch in self.bunches:
+            data = bunch._allocate_buffer(bunch._data.shape[1])
+            data[:] = bunch._data
+            bunch._data = data
+            bunch.process_pool = None
+        self.bunches = []
+        self._bunch_arrays = []
+        self._field_arrays = []
+        self._deposition_array = None
+        self._finalizer()
+
+    def _share_bunch_data(self, i_bunch):
+        """Copy the data of a bunch into a new shared array."""
+        bunch = self.bunches[i_bunch]
+        shared = self._allocate(bunch._data.shape, np.float64)
+        shared.array[:] = bunch._data
+        bunch._data = shared.array
+        self._run('share_bunch', i_bunch, shared.spec)
+        if self._bunch_arrays[i_bunch] is not None:
+            self._release(self._bunch_arrays[i_bunch])
+        self._bunch_arrays[i_bunch] = shared
+
+    def _sync_bunch(self, bunch):
+        """Get the index of a bunch in the pool, sharing its data again if
+        it has been reallocated (e.g., after removing lost particles)."""
+        i_bunch = _index(self.bunches, bunch)
+        if i_bunch is None:
+            raise ValueError(
+                'Bunch {} is not shared with the process pool.'.format(
+                    bunch.name))
+        if bunch._data is not self._bunch_arrays[i_bunch].array:
+            self._share_bunch_data(i_bunch)
+        return i_bunch
+
+    def _get_field_index(self, field):
+        """Get the index of a field in the pool."""
+        i_field = _index(self.fields, field)
+        if i_field is None:
+            raise ValueError(
+                'Field of type {} is not known to the process pool.'.format(
+                    type(field).__name__))
+        return i_field
+
+    def _get_bunch_properties(self, bunch):
+        """Get the properties needed to evolve the slices of a bunch."""
+        return {
+            'prop_distance': bunch.prop_distance,
+            'name': bunch.name,
+            'q_species': bunch.q_species,
+            'm_species': bunch.m_species,
+            'chunk_size': bunch.chunk_size
+        }
+
+    def _allocate(self, shape, dtype):
+        """Allocate a new shared array."""
+        shared = _SharedArray(shape, dtype)
+        self._shared_arrays[shared.name] = shared
+        return shared
+
+    def _release(self, shared):
+        """Release a shared array owned by the pool."""
+        del self._shared_arrays[shared.name]
+        shared.release(unlink=True)
+
+    def _run(self, command, *args):
+        """Run a command in all processes and get their results."""
+        for connection in self._connections:
+            connection.send((command, args))
+        try:
+            results = [connection.recv() for connection in self._connections]
+        except (EOFError, ConnectionError):
+            raise RuntimeError('A worker process terminated unexpectedly.')
+        for result in results:
+            if isinstance(result, _WorkerError):
+                raise RuntimeError(
+                    'Error in worker process:\n{}'.format(result.traceback))
+        return results
+
+
+def check_multiprocess_compatibility(field: Field) -> None:
+    """Check that a field can be gathered in the worker processes."""
+    if isinstance(field, NumericalField) and (
+        type(field)._get_gather_state is NumericalField._get_gather_state
+    ):
+        raise ValueError(
+            f'Field of type {type(field).__name__} cannot be used with '
+            'several processes. It should implement `_get_gather_state` and '
+            '`_set_gather_state`.'
+        )
+
+
+class _SharedArray():
+    """Array stored in a block of shared memory.
+
+    If `name` is given, the existing block with this name is attached.
+    Otherwise, a new block is created.
+    """
+
+    def __init__(
+        self,
+        shape: Tuple[int],
+        dtype: np.dtype,
+        name: Optional[str] = None
+    ) -> None:
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        if name is None:
+            size = max(int(np.prod(self.shape)) * self.dtype.itemsize, 1)
+            self.shm = SharedMemory(create=True, size=size)
+        else:
+            self.shm = SharedMemory(name=name)
+        self.name = self.shm.name
+        self.array = np.ndarray(self.shape, self.dtype, buffer=self.shm.buf)
+
+    @property
+    def spec(self):
+        """Information needed by other processes to attach the array."""
+        return self.name, self.shape, self.dtype.str
+
+    def release(self, unlink=False):
+        """Close (and, optionally, unlink) the block of shared memory."""
+        self.array = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # Some views of the array are still in use. The memory is freed
+            # once they are deleted.
+            pass
+        if unlink:
+            self.shm.unlink()
+
+
+class _WorkerError():
+    """Error raised while running a command in a worker process."""
+
+    def __init__(self, traceback):
+        self.traceback = traceback
+
+
+def _run_worker(connection, fields_data, i_process, n_processes):
+    """Start a worker process."""
+    set_num_threads(num_threads)
+    fields = pickle.loads(fields_data)
+    _Worker(connection, fields, i_process, n_processes).run()
+
+
+class _Worker():
+    """Evolves and deposits a slice of the particles of each bunch.
+
+    Parameters
+    ----------
+    connection : Connection
+        Connection to the main process, from which the commands are
+        received.
+    fields : list
+        The fields of the pool.
+    i_process, n_processes : int
+        Index of the process in the pool and total number of processes.
+    """
+
+    def __init__(self, connection, fields, i_process, n_processes):
+        self.connection = connection
+        self.fields = fields
+        self.i_process = i_process
+        self.n_processes = n_processes
+
+    def run(self):
+        """Run the commands received from the main process."""
+        # Shared arrays of the bunches, fields and deposition grid.
+        self.bunch_arrays = {}
+        self.field_arrays = [{} for field in self.fields]
+        self.deposition_array = None
+        while True:
+            try:
+                command, args = self.connection.recv()
+            except EOFError:
+                break
+            if command is None:
+                break
+            try:
+                result = getattr(self, command)(*args)
+            except Exception:
+                result = _WorkerError(traceback.format_exc())
+            self.connection.send(result)
+        for shared in self.bunch_arrays.values():
+            shared.release()
+        for shared_arrays in self.field_arrays:
+            for shared in shared_arrays.values():
+                shared.release()
+        if self.deposition_array is not None:
+            self.deposition_array.release()
+
+    def share_bunch(self, i_bunch, spec):
+        """Attach the shared data of a bunch."""
+        if i_bunch in self.bunch_arrays:
+            self.bunch_arrays[i_bunch].release()
+        self.bunch_arrays[i_bunch] = _attach(spec)
+
+    def update_field(self, i_field, array_specs, values):
+        """Attach the shared grids of a field and set its state."""
+        shared_arrays = self.field_arrays[i_field]
+        names = [spec[0] for spec in array_specs.values()]
+        for name in list(shared_arrays):
+            if name not in names:
+                shared_arrays.pop(name).release()
+        arrays = {}
+        for key, spec in array_specs.items():
+            if spec[0] not in shared_arrays:
+                shared_arrays[spec[0]] = _attach(spec)
+            arrays[key] = shared_arrays[spec[0]].array
+        self.fields[i_field]._set_gather_state(arrays, values)
+
+    def evolve(self, i_bunch, properties, field_indices, t, dt, pusher,
+               tolerance):
+        """Evolve the slice of a bunch. Returns the recommended time step
+        of the adaptive pusher, if any."""
+        bunch = self.get_bunch_slice(i_bunch, properties)
+        if bunch is None:
+            return None
+        fields = [self.fields[i] for i in field_indices]
+        bunch.evolve(fields, t, dt, pusher, tolerance)
+        return bunch.dt_adaptive
+
+    def apply_fused_boris_pusher(self, i_bunch, properties, field_indices,
+                                 t, dt):
+        """Evolve the slice of a bunch with the fused Boris pusher."""
+        bunch = self.get_bunch_slice(i_bunch, properties)
+        if bunch is None:
+            return
+        fields = [self.fields[i] for i in field_indices]
+        for chunk in bunch.iter_chunks():
+            apply_fused_boris_pusher(chunk, fields, t, dt)
+
+    def deposit(self, i_bunch, properties, function, spec, args):
+        """Deposit the slice of a bunch on the grid of this process."""
+        if (
+            self.deposition_array is None or
+            self.deposition_array.name != spec[0]
+        ):
+            if self.deposition_array is not None:
+                self.deposition_array.release()
+            self.deposition_array = _attach(spec)
+        grid = self.deposition_array.array[self.i_process]
+        grid[:] = 0.
+        bunch = self.get_bunch_slice(i_bunch, properties)
+        if bunch is not None:
+            bunch.deposit(function, grid, *args)
+
+    def get_bunch_slice(self, i_bunch, properties):
+        """Get a bunch whose data is a view of the slice of the particles
+        of this process, or `None` if the slice is empty."""
+        data = self.bunch_arrays[i_bunch].array
+        i_start, i_end = get_process_slice(
+            data.shape[1], self.i_process, self.n_processes)
+        if i_end == i_start:
+            return None
+        chunk_size = properties.pop('chunk_size')
+        bunch = ParticleBunch(w=None, **properties)
+        bunch._data = data[:, i_start:i_end]
+        bunch.set_chunk_size(chunk_size)
+        return bunch
+
+
+def get_process_slice(
+    n_part: int,
+    i_process: int,
+    n_processes: int
+) -> Tuple[int, int]:
+    """Get the first and last (excluded) index of the particles evolved by
+    a process."""
+    i_start = n_part * i_process // n_processes
+    i_end = n_part * (i_process + 1) // n_processes
+    return i_start, i_end
+
+
+def _attach(spec):
+    """Attach an existing shared array from its `spec`."""
+    name, shape, dtype = spec
+    return _SharedArray(shape, dtype, name=name)
+
+
+def _index(objects, obj):
+    """Get the index of `obj` in a list, by identity."""
+    for i, other in enumerate(objects):
+        if other is obj:
+            return i
+    return None
+
+
+def _shutdown(
+    connections: List,
+    processes: List,
+    shared_arrays: Dict[str, _SharedArray]
+) -> None:
+    """Stop the worker processes and release all shared memory."""
+    for connection in connections:
+        try:
+            connection.send((None, ()))
+        except OSError:
+            pass
+    for process in processes:
+        process.join(timeout=10)
+        if process.is_alive():
+            process.terminate()
+    for connection in connections:
+        connection.close()
+    for shared in shared_arrays.values():
+        shared.release(unlink=True)
+    shared_arrays.clear()
@@ -1,14 +1,20 @@
 """ This module contains the Tracker class. """
-from typing import Optional, Callable, List, Literal
+from typing import Optional, Callable, List, Literal, Tuple
 
 import numpy as np
 import scipy.constants as ct
 
-from wake_t.particles.particle_bunch import ParticleBunch
+from wake_t.particles.particle_bunch import (
+    ParticleBunch, clear_scratch_pool)
 from wake_t.fields.base import Field
 from wake_t.fields.analytical_field import AnalyticalField
 from wake_t.fields.numerical_field import NumericalField
 from wake_t.diagnostics.openpmd_diag import OpenPMDDiagnostics
+from wake_t.particles.push.fused_boris_pusher import (
+    apply_fused_boris_pusher, check_fused_compatibility
+)
+from wake_t.utilities.particle_merging import merge_macroparticles
+from .process_pool import ParticleProcessPool
 from wake_t.utilities.numba import (
     num_threads, set_num_threads, get_num_threads
 )
@@ -60,7 +66,11 @@ class Tracker():
         solely a `ParticleBunch` as argument.
     bunch_pusher : str, optional
         The particle pusher used to evolve the bunches. Possible values
-        are `'boris'` or `'rk4'`.
+        are `'boris'`, `'boris_adaptive'`, `'rk4'` or `'linear_focusing'`.
+        With `'boris_adaptive'`, the local error of each push is estimated
+        and, for bunches with an `'auto'` time step, used to determine the
+        next time step. In this case, `auto_dt_bunch_f` only determines
+        the initial time step.
     push_bunches_before_diags : bool, optional
         Whether to push the bunches before saving them to the diagnostics.
         Since the time step of the diagnostics can be different from that
@@ -80,6 +90,52 @@ class Tracker():
     section_name : str, optional
         Name of the section to be tracked. This will be appended to the
         beginning of the progress bar.
+    fused_tracking : bool, optional
+        Whether to evolve each bunch between diagnostics in a single compiled
+        kernel, where all time steps are carried out for each particle
+        before moving to the next one. This avoids the overhead of launching
+        several kernels per time step and keeps the particle data in cache.
+        Only possible when all fields are analytical and the ``'boris'``
+        pusher is used. Adaptive time steps are evaluated only once, at the
+        beginning of the tracking, since the bunches are not evolved
+        step by step. By default ``False``.
+    pusher_tolerance : float, optional
+        Error tolerance of the `'boris_adaptive'` pusher. The local error of
+        each particle is normalized to the RMS spread of the bunch in each
+        phase-space coordinate. By default ``1e-3``.
+    n_energy_classes : int, optional
+        Number of energy classes into which the particles of the bunches
+        with an `'auto'` time step are grouped. Each class spans a factor 4
+        in energy (i.e., a factor 2 in betatron period), starting from the
+        lowest-energy particle, and is evolved with its own time step,
+        given by `auto_dt_bunch_f`. The bunch is pushed with the time step
+        of the highest-energy class, and all other classes are sub-cycled
+        within each push, so that all particles are synchronized at the
+        field updates and diagnostics. This avoids evolving the whole
+        bunch with the time step required by its lowest-energy particles.
+        By default ``1`` (i.e., no sub-cycling).
+    n_processes : int, optional
+        Number of processes in which to evolve the particles of the
+        bunches. If larger than ``1``, the particles of each bunch are
+        divided into `n_processes` slices, which are evolved and deposited
+        in parallel by a pool of worker processes (see
+        `ParticleProcessPool`). The bunch data is moved to shared memory
+        during the tracking, and the grids of the numerical fields are
+        broadcast to the processes after each update. This allows the
+        particle push to scale beyond the threads of a single process
+        (e.g., across several sockets). With the ``'boris_adaptive'``
+        pusher, the error of each slice is controlled separately. Not
+        supported with `n_energy_classes` > 1. Since the processes are
+        spawned, the main code of the scripts should be protected by
+        ``if __name__ == '__main__':``. By default ``1``.
+
+    Particles beyond the boundaries of a bunch (see
+    `ParticleBunch.set_particle_boundaries`) are flagged as lost after each
+    push and removed from the bunch once they reach its
+    `compaction_fraction`, as well as before generating diagnostics.
+    Bunches with macroparticle merging enabled (see
+    `ParticleBunch.set_macroparticle_merging`) are merged at the beginning
+    of the tracking.
 
     """
 
@@ -92,10 +148,15 @@ class Tracker():
         n_diags: Optional[int] = 0,
         opmd_diags: Optional[OpenPMDDiagnostics] = None,
         auto_dt_bunch_f: Optional[Callable[[ParticleBunch], float]] = None,
-        bunch_pusher: Optional[Literal['boris', 'rk4']] = 'boris',
+        bunch_pusher: Optional[Literal[
+            'boris', 'boris_adaptive', 'rk4', 'linear_focusing']] = 'boris',
         push_bunches_before_diags: Optional[bool] = True,
         show_progress_bar: Optional[bool] = True,
-        section_name: Optional[str] = 'Simulation'
+        section_name: Optional[str] = 'Simulation',
+        fused_tracking: Optional[bool] = False,
+        pusher_tolerance: Optional[float] = 1e-3,
+        n_energy_classes: Optional[int] = 1,
+        n_processes: Optional[int] = 1,
     ) -> None:
         self.t_final = t_final
         self.bunches = bunches
@@ -108,6 +169,11 @@ class Tracker():
         self.push_bunches_before_diags = push_bunches_before_diags
         self.show_progress_bar = show_progress_bar
         self.section_name = section_name
+        self.fused_tracking = fused_tracking
+        self.pusher_tolerance = pusher_tolerance
+        self.n_energy_classes = n_energy_classes
+        self.n_processes = n_processes
+        self.process_pool = None
 
         # Get all numerical fields and their time steps.
         self.num_fields = [f for f in fields if isinstance(f, NumericalField)]
@@ -125,6 +191,11 @@ class Tracker():
             if dt == 'auto':
                 self.auto_dt_bunches.append(self.bunches[i])
 
+        # Discard any time step recommended by the adaptive pusher in a
+        # previous tracking.
+        for bunch in self.bunches:
+            bunch.dt_adaptive = None
+
         # If needed, add diagnostics to objects to track.
         if self.n_diags > 0:
             self.objects_to_track.append('diags')
@@ -137,6 +208,41 @@ class Tracker():
         # Initialize tracking time.
         self.t_tracking = 0.
 
+        # Check that fused tracking is possible.
+        if self.fused_tracking:
+            if self.bunch_pusher != 'boris':
+                raise ValueError(
+                    "Fused tracking is only supported with the 'boris' "
+                    "pusher."
+                )
+            for field in self.fields:
+                check_fused_compatibility(field)
+            for bunch in self.bunches:
+                if bunch.z_injection is not None:
+                    raise ValueError(
+                        'Fused tracking does not support bunches with '
+                        '`z_injection`.'
+                    )
+            # Time steps of each bunch not yet applied.
+            self.pending_steps = [([], []) for bunch in self.bunches]
+
+        # Check that multi-rate tracking is possible.
+        if self.n_energy_classes > 1:
+            if self.fused_tracking:
+                raise ValueError(
+                    'Energy classes are not supported with fused tracking.')
+            if self.bunch_pusher == 'boris_adaptive':
+                raise ValueError(
+                    "Energy classes are not supported with the "
+                    "'boris_adaptive' pusher."
+                )
+            if self.n_processes > 1:
+                raise ValueError(
+                    'Energy classes are not supported when tracking with '
+                    'several processes.')
+        # Energy classes of each bunch, determined after each push.
+        self.energy_classes = [None for bunch in self.bunches]
+
     def do_tracking(self) -> List[List[ParticleBunch]]:
         """Do the tracking.
 
@@ -159,93 +265,119 @@ class Tracker():
             disable=not self.show_progress_bar,
         )
 
-        # Calculate fields at t=0.
-        for field in self.num_fields:
-            field.update(self.bunches)
-
-        # Generate initial diagnostics.
-        self.generate_diagnostics()
-
-        # Allocate arrays containing the time step and current time of all
-        # objects during tracking.
-        t_objects = np.zeros(len(self.dt_objects))
-        dt_objects = np.zeros(len(self.dt_objects))
-
-        # Fill up time steps.
-        for i, dt in enumerate(self.dt_objects):
-            if dt == 'auto':
-                dt_objects[i] = self.auto_dt_bunch_f(self.bunches[i])
-            else:
-                dt_objects[i] = dt
-
-        # Start tracking loop.
-        while True:
-
-            # Calculate next time of all objects.
-            t_next_objects = t_objects + dt_objects
-
-            # Get index of the object with smallest next time.
-            # float32 is used to avoid precision issues. Since
-            # `t_next_objects` is calculated by repeatedly adding dt_objects,
-            # it can happen that two objects that are supposed to have exactly
-            # the same `t_next_objects` do not have it due to precision issues.
-            # Going from float64 to float32 reduces the number of decimals,
-            # thus making sure that two "almost identical" numbers at float64
-            # are actually identical as float32.
-            i_next = np.argmin(t_next_objects.astype(np.float32))
-
-            # Get next object and its corresponding time and time step.
-            obj_next = self.objects_to_track[i_next]
-            dt_next = dt_objects[i_next]
-            t_next = t_next_objects[i_next]
-            t_current = t_objects[i_next]
-
-            # If the next time of the object is beyond `t_final`, the tracking
-            # is finished.
-            if np.float32(t_next) > np.float32(self.t_final):
-                break
-
-            # Advance tracking time.
-            self.t_tracking = t_next
-
-            # If next object is a ParticleBunch, update it.
-            if isinstance(obj_next, ParticleBunch):
-                self.evolve_bunch(
-                    bunch=obj_next,
-                    t_current=t_current,
-                    t_next=t_next,
-                    dt_next=dt_next,
-                    i_next=i_next,
-                    dt_objects=dt_objects,
-                )
-
-            # If next object is a NumericalField, update it.
-            elif isinstance(obj_next, NumericalField):
-                obj_next.update(self.bunches)
-
-            # If next object are the diagnostics, generate them.
-            elif obj_next == 'diags':
-                # Evolve all bunches to the diagnostics time.
-                if self.push_bunches_before_diags:
-                    for i, obj in enumerate(self.objects_to_track):
-                        if isinstance(obj, ParticleBunch):
-                            dt_bunch = t_next - t_objects[i]
-                            self.evolve_bunch(
-                                bunch=obj,
-                                t_current=t_objects[i],
-                                t_next=t_next,
-                                dt_next=dt_bunch,
-                                i_next=i,
-                                dt_objects=dt_objects,
-                            )
-                            t_objects[i] += dt_bunch
-                self.generate_diagnostics()
-
-            # Advance current time of the update object.
-            t_objects[i_next] += dt_next
-
-            # Update progress bar.
-            progress_bar.update(self.t_tracking*ct.c - progress_bar.n)
+        # Reduce the number of macroparticles if needed.
+        self.merge_macroparticles()
+
+        # Start the worker processes, if needed, and make sure that they
+        # are stopped even if an error occurs during tracking.
+        self.start_process_pool()
+        try:
+            # Calculate fields at t=0.
+            for field in self.num_fields:
+                self.update_field(field)
+            self.update_dt_fields()
+
+            # Generate initial diagnostics.
+            self.generate_diagnostics()
+
+            # Allocate arrays containing the time step and current time of
+            # all objects during tracking.
+            t_objects = np.zeros(len(self.dt_objects))
+            dt_objects = np.zeros(len(self.dt_objects))
+
+            # Fill up time steps.
+            for i, dt in enumerate(self.dt_objects):
+                if dt == 'auto':
+                    dt_objects[i] = self.get_auto_dt(self.bunches[i])
+                elif isinstance(self.objects_to_track[i], NumericalField):
+                    dt_objects[i] = self.objects_to_track[i].dt_update
+                else:
+                    dt_objects[i] = dt
+
+            # Start tracking loop.
+            while True:
+
+                # Calculate next time of all objects.
+                t_next_objects = t_objects + dt_objects
+
+                # Get index of the object with smallest next time.
+                # float32 is used to avoid precision issues. Since
+                # `t_next_objects` is calculated by repeatedly adding
+                # dt_objects, it can happen that two objects that are supposed
+                # to have exactly the same `t_next_objects` do not have it due
+                # to precision issues. Going from float64 to float32 reduces
+                # the number of decimals, thus making sure that two "almost
+                # identical" numbers at float64 are actually identical as
+                # float32.
+                i_next = np.argmin(t_next_objects.astype(np.float32))
+
+                # Get next object and its corresponding time and time step.
+                obj_next = self.objects_to_track[i_next]
+                dt_next = dt_objects[i_next]
+                t_next = t_next_objects[i_next]
+                t_current = t_objects[i_next]
+
+                # If the next time of the object is beyond `t_final`, the
+                # tracking is finished.
+                if np.float32(t_next) > np.float32(self.t_final):
+                    break
+
+                # Advance tracking time.
+                self.t_tracking = t_next
+
+                # If next object is a ParticleBunch, update it.
+                if isinstance(obj_next, ParticleBunch):
+                    self.evolve_bunch(
+                        bunch=obj_next,
+                        t_current=t_current,
+                        t_next=t_next,
+                        dt_next=dt_next,
+                        i_next=i_next,
+                        dt_objects=dt_objects,
+                    )
+
+                # If next object is a NumericalField, update it.
+                elif isinstance(obj_next, NumericalField):
+                    self.update_field(obj_next)
+                    # The update period might have changed.
+                    self.update_dt_fields()
+                    dt_objects[i_next] = obj_next.dt_update
+
+                # If next object are the diagnostics, generate them.
+                elif obj_next == 'diags':
+                    # Evolve all bunches to the diagnostics time.
+                    if self.push_bunches_before_diags:
+                        for i, obj in enumerate(self.objects_to_track):
+                            if isinstance(obj, ParticleBunch):
+                                dt_bunch = t_next - t_objects[i]
+                                self.evolve_bunch(
+                                    bunch=obj,
+                                    t_current=t_objects[i],
+                                    t_next=t_next,
+                                    dt_next=dt_bunch,
+                                    i_next=i,
+                                    dt_objects=dt_objects,
+                                )
+                                t_objects[i] += dt_bunch
+                    self.generate_diagnostics()
+
+                # Advance current time of the update object.
+                t_objects[i_next] += dt_next
+
+                # Update progress bar.
+                progress_bar.update(self.t_tracking*ct.c - progress_bar.n)
+
+            # Apply any remaining steps.
+            if self.fused_tracking:
+                self.apply_pending_steps()
+        finally:
+            # Stop the worker processes and any background work of the
+            # fields.
+            self.stop_process_pool()
+            for field in self.num_fields:
+                field.finalize()
+            # Release the scratch arrays of the particle pushers.
+            clear_scratch_pool()
 
         # Finalize tracking by increasing z position of diagnostics.
         if self.opmd_diags is not None:
@@ -287,10 +419,34 @@ class Tracker():
         dt_objects : List
             The time steps of all objects to track.
         """
-        bunch.evolve(self.fields, t_current, dt_next, self.bunch_pusher)
+        # If all particles have been lost, there is nothing to push and the
+        # time step of the bunch is kept.
+        is_empty = len(bunch.x) == 0
+        if is_empty:
+            bunch.prop_distance += dt_next * ct.c
+        elif self.fused_tracking:
+            # Store step, it will be applied before the next diagnostics.
+            t_steps, dt_steps = self.pending_steps[self.bunches.index(bunch)]
+            t_steps.append(t_current)
+            dt_steps.append(dt_next)
+        elif self.energy_classes[self.bunches.index(bunch)] is not None:
+            self.evolve_bunch_multi_rate(bunch, t_current, dt_next)
+        else:
+            bunch.evolve(self.fields, t_current, dt_next, self.bunch_pusher,
+                         self.pusher_tolerance)
+        # Flag and, if needed, remove the lost particles.
+        if not (self.fused_tracking or is_empty):
+            self.check_particle_losses(bunch)
         # Update the time step if set to `'auto'`.
-        if bunch in self.auto_dt_bunches:
-            dt_objects[i_next] = self.auto_dt_bunch_f(bunch)
+        if (
+            bunch in self.auto_dt_bunches and not self.fused_tracking and
+            len(bunch.x) > 0
+        ):
+            if bunch.dt_adaptive is not None:
+                dt_objects[i_next] = self.get_adaptive_dt(
+                    bunch, dt_next, dt_objects[i_next])
+            else:
+                dt_objects[i_next] = self.get_auto_dt(bunch)
         # Determine if this was the last push.
         final_push = np.float32(t_next) == np.float32(self.t_final)
         # Determine if next push brings the bunch beyond `t_final`.
@@ -301,10 +457,208 @@ class Tracker():
         if not final_push and next_push_beyond_final_time:
             dt_objects[i_next] = self.t_final - t_next
 
+    def check_particle_losses(self, bunch: ParticleBunch) -> None:
+        """Flag the lost particles of a bunch and compact its arrays if the
+        fraction of flagged particles reaches its `compaction_fraction`.
+
+        Parameters
+        ----------
+        bunch : ParticleBunch
+            The particle bunch.
+        """
+        n_flagged = bunch.flag_lost_particles()
+        if n_flagged > 0 and (
+                n_flagged >= bunch.compaction_fraction * len(bunch.x)):
+            bunch.remove_lost_particles()
+
+    def merge_macroparticles(self) -> None:
+        """Merge the macroparticles of the bunches that have more than
+        allowed by their merging settings."""
+        for bunch in self.bunches:
+            if bunch.merging is None:
+                continue
+            n_part_max, method, tolerance = bunch.merging
+            n_part = len(bunch.x)
+            if n_part > n_part_max:
+                bunch.merging_errors = merge_macroparticles(
+                    bunch, n_part / n_part_max, method, tolerance)
+
+    def start_process_pool(self) -> None:
+        """Start the pool of worker processes and share the bunches with
+        it, if more than one process is used."""
+        if self.n_processes > 1:
+            self.process_pool = ParticleProcessPool(
+                self.n_processes, self.fields)
+            for bunch in self.bunches:
+                self.process_pool.share_bunch(bunch)
+
+    def stop_process_pool(self) -> None:
+        """Stop the pool of worker processes, if any."""
+        if self.process_pool is not None:
+            self.process_pool.close()
+            self.process_pool = None
+
+    def update_field(self, field: NumericalField) -> None:
+        """Update a numerical field and, if needed, broadcast it to the
+        worker processes.
+
+        Parameters
+        ----------
+        field : NumericalField
+            The field to update.
+        """
+        field.update(self.bunches)
+        if self.process_pool is not None:
+            self.process_pool.update_field(field)
+
+    def update_dt_fields(self) -> None:
+        """Get the current update period of all numerical fields."""
+        self.dt_fields = [f.dt_update for f in self.num_fields]
+
+    def get_auto_dt(self, bunch: ParticleBunch) -> float:
+        """Get the next time step of a bunch with an `'auto'` time step.
+
+        If energy classes are used, the particles are also grouped into
+        classes, and the time step of the highest-energy class is returned.
+
+        Parameters
+        ----------
+        bunch : ParticleBunch
+            The particle bunch.
+        """
+        # A bunch without particles (e.g., all of them were lost in a
+        # previous element) is not pushed, so a single step is enough.
+        if len(bunch.x) == 0:
+            return self.t_final
+        if self.n_energy_classes == 1:
+            return self.auto_dt_bunch_f(bunch)
+        classes = self.get_energy_classes(bunch)
+        self.energy_classes[self.bunches.index(bunch)] = classes
+        dt = max(dt_class for _, _, dt_class in classes)
+        # Make sure that the bunch does not skip any field update.
+        if len(self.dt_fields) > 0:
+            dt = min(dt, min(self.dt_fields))
+        return dt
+
+    def get_energy_classes(
+        self,
+        bunch: ParticleBunch,
+    ) -> List[Tuple[np.ndarray, ParticleBunch, float]]:
+        """Group the particles of a bunch into energy classes.
+
+        Parameters
+        ----------
+        bunch : ParticleBunch
+            The particle bunch.
+
+        Returns
+        -------
+        list
+            A list with the indices of the particles in each non-empty
+            class, a sub-bunch containing these particles and the time step
+            of the class.
+        """
+        if len(bunch.x) == 0:
+            return []
+        gamma = np.sqrt(1 + bunch.px**2 + bunch.py**2 + bunch.pz**2)
+        i_class = np.floor(np.log(gamma / np.min(gamma)) / np.log(4))
+        i_class = np.minimum(i_class, self.n_energy_classes - 1)
+        classes = []
+        for i in range(self.n_energy_classes):
+            indices = np.nonzero(i_class == i)[0]
+            if len(indices) > 0:
+                sub_bunch = bunch.get_sub_bunch(indices)
+                dt_class = self.auto_dt_bunch_f(sub_bunch)
+                classes.append((indices, sub_bunch, dt_class))
+        return classes
+
+    def evolve_bunch_multi_rate(
+        self,
+        bunch: ParticleBunch,
+        t_current: float,
+        dt_next: float,
+    ) -> None:
+        """Evolve each energy class of a bunch with its own time step.
+
+        Parameters
+        ----------
+        bunch : ParticleBunch
+            The particle bunch to evolve.
+        t_current : float
+            The current time of the simulation.
+        dt_next : float
+            The time step by which to advance the bunch.
+        """
+        classes = self.energy_classes[self.bunches.index(bunch)]
+        for indices, sub_bunch, dt_class in classes:
+            # float32 avoids an additional substep due to rounding errors.
+            n_sub = max(int(np.ceil(np.float32(dt_next / dt_class))), 1)
+            dt_sub = dt_next / n_sub
+            for i in range(n_sub):
+                sub_bunch.evolve(
+                    self.fields, t_current + i * dt_sub, dt_sub,
+                    self.bunch_pusher)
+            bunch.set_sub_bunch(sub_bunch, indices)
+        bunch.prop_distance += dt_next * ct.c
+
+    def get_adaptive_dt(
+        self,
+        bunch: ParticleBunch,
+        dt_last: float,
+        dt_scheduled: float,
+    ) -> float:
+        """Get next time step from the error estimate of the last push.
+
+        Parameters
+        ----------
+        bunch : ParticleBunch
+            The particle bunch that has been evolved.
+        dt_last : float
+            The time step of the last push.
+        dt_scheduled : float
+            The time step that was scheduled for the bunch. It can be
+            larger than `dt_last` if the push was shortened to reach the
+            time of the diagnostics.
+        """
+        dt = bunch.dt_adaptive
+        # A push shortened to reach the diagnostics should not reduce the
+        # time step, unless required by the error.
+        if dt_last < dt_scheduled and dt >= dt_last:
+            dt = dt_scheduled
+        # Make sure that the bunch does not skip any field update.
+        if len(self.dt_fields) > 0:
+            dt = min(dt, min(self.dt_fields))
+        return dt
+
+    def apply_pending_steps(self) -> None:
+        """Evolve the bunches through the steps stored in fused tracking."""
+        for bunch, (t_steps, dt_steps) in zip(
+                self.bunches, self.pending_steps):
+            if bunch.process_pool is not None:
+                bunch.process_pool.apply_fused_boris_pusher(
+                    bunch, self.fields, t_steps, dt_steps)
+            else:
+                for chunk in bunch.iter_chunks():
+                    apply_fused_boris_pusher(
+                        chunk, self.fields, t_steps, dt_steps)
+            for dt in dt_steps:
+                bunch.prop_distance += dt * ct.c
+            if len(dt_steps) > 0:
+                self.check_particle_losses(bunch)
+            t_steps.clear()
+            dt_steps.clear()
+
     def generate_diagnostics(self) -> None:
         """Generate tracking diagnostics."""
-        # Make copy of current bunches and store in output list.
+        if self.fused_tracking:
+            self.apply_pending_steps()
+        # Remove lost particles and make copy of current bunches and store in
+        # output list. The energy classes of the bunches need to be updated
+        # after removing particles.
         for i, bunch in enumerate(self.bunches):
+            if bunch.remove_lost_particles() > 0:
+                if self.energy_classes[i] is not None:
+                    self.energy_classes[i] = self.get_energy_classes(bunch)
             self.bunch_list[i].append(bunch.copy())
 
         # If needed, write also the openPMD diagnostics.
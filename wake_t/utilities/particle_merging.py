@@ -0,0 +1,215 @@
+"""
+This module contains methods for reducing the number of macroparticles of a
+particle bunch while conserving its total charge and the average and
+covariance of its phase-space coordinates.
+"""
+from typing import Optional, Dict
+
+import numpy as np
+
+
+def merge_macroparticles(
+    bunch,
+    factor: float,
+    method: Optional[str] = 'cells',
+    tolerance: Optional[float] = 1e-6
+) -> Dict[str, float]:
+    """Reduce the number of macroparticles of a bunch.
+
+    The bunch is modified in place. Since the new macroparticles do not
+    correspond to the original ones, the particle tags are discarded.
+
+    Parameters
+    ----------
+    bunch : ParticleBunch
+        The particle bunch.
+    factor : float
+        Factor by which to reduce the number of macroparticles. The final
+        number of macroparticles is only approximately ``N/factor``.
+    method : str, optional
+        Either ``'cells'`` (default) or ``'resample'``. With ``'cells'``,
+        the phase space is divided into cells, each of them containing about
+        `factor` particles, which are merged into a single macroparticle
+        with their total weight and average coordinates. The cells are
+        defined by quantiles of the decorrelated (whitened) coordinates.
+        This conserves the total charge and the average of all coordinates,
+        but not the spread within each cell. With ``'resample'``, ``N/factor``
+        particles are drawn with a probability proportional to their weight
+        (systematic resampling), which also gives equal weights to
+        macroparticles of initially uneven weight. Repeated particles are
+        combined into one.
+    tolerance : float, optional
+        Maximum relative error of the charge, average and covariance of the
+        coordinates (see `get_moment_errors`). If the errors of the merged
+        bunch are larger, the new macroparticles are displaced by a linear
+        transformation that restores the original average and covariance. If
+        ``None``, no correction is applied. By default ``1e-6``.
+
+    Returns
+    -------
+    dict
+        The relative errors of the charge, average and covariance of the
+        final bunch with respect to the original one (see
+        `get_moment_errors`).
+
+    """
+    if factor <= 1:
+        raise ValueError(
+            'The reduction factor must be larger than 1, not {}.'.format(
+                factor))
+    w = bunch.w
+    bunch_mat = bunch.get_6D_matrix()
+    n_target = max(int(len(w) / factor), 1)
+    mean, cov = get_moments(bunch_mat, w)
+    if method == 'cells':
+        new_mat, new_w = _merge_in_cells(bunch_mat, w, mean, cov, n_target)
+    elif method == 'resample':
+        new_mat, new_w = _resample(bunch_mat, w, n_target)
+    else:
+        raise ValueError(
+            "Merging method '{}' not recognized. ".format(method) +
+            "Possible values are 'cells' and 'resample'.")
+    errors = get_moment_errors(new_mat, new_w, np.sum(w), mean, cov)
+    if tolerance is not None and max(errors.values()) > tolerance:
+        new_mat = _correct_moments(new_mat, new_w, mean, cov)
+        errors = get_moment_errors(new_mat, new_w, np.sum(w), mean, cov)
+    bunch.set_phase_space(
+        new_mat[0], new_mat[2], new_mat[4], new_mat[1], new_mat[3],
+        new_mat[5], w=new_w)
+    bunch.tags = None
+    return errors
+
+
+def get_moments(bunch_mat, w):
+    """Get the weighted average and covariance of the coordinates.
+
+    Parameters
+    ----------
+    bunch_mat : ndarray
+        6 x N matrix with the particle coordinates.
+    w : ndarray
+        Weights of the particles.
+
+    Returns
+    -------
+    A tuple with the average and the covariance matrix.
+    """
+    mean = np.average(bunch_mat, axis=1, weights=w)
+    cov = np.cov(bunch_mat, aweights=w, bias=True)
+    return mean, cov
+
+
+def get_moment_errors(bunch_mat, w, q_ref, mean_ref, cov_ref):
+    """Get the errors of the charge and moments of a bunch with respect to
+    a reference.
+
+    The error of the average of each coordinate is normalized to its RMS
+    spread in the reference, and the error of each element of the
+    covariance matrix to the product of the corresponding spreads.
+
+    Parameters
+    ----------
+    bunch_mat : ndarray
+        6 x N matrix with the particle coordinates.
+    w : ndarray
+        Weights of the particles.
+    q_ref : float
+        Reference total weight.
+    mean_ref, cov_ref : ndarray
+        Reference average and covariance of the coordinates.
+
+    Returns
+    -------
+    dict
+        A dictionary with the relative error of the total charge
+        (``'charge'``) and the maximum normalized error of the average
+        (``'mean'``) and the covariance (``'covariance'``).
+    """
+    mean, cov = get_moments(bunch_mat, w)
+    s = _get_scale(cov_ref)
+    return {
+        'charge': abs(np.sum(w) - q_ref) / abs(q_ref),
+        'mean': np.max(np.abs(mean - mean_ref) / s),
+        'covariance': np.max(np.abs(cov - cov_ref) / np.outer(s, s))
+    }
+
+
+def _merge_in_cells(bunch_mat, w, mean, cov, n_target):
+    """Merge the particles within each cell of the whitened phase space."""
+    n_part = w.shape[0]
+    # Whiten the coordinates, so that all dimensions are uncorrelated and
+    # the cells are evenly populated.
+    s = _get_scale(cov)
+    u = (bunch_mat - mean[:, np.newaxis]) / s[:, np.newaxis]
+    vals, vecs = np.linalg.eigh(cov / np.outer(s, s))
+    active = vals > 1e-12 * np.max(vals)
+    u = np.dot(vecs[:, active].T, u)
+
+    # Number of bins in each dimension, such that the total number of cells
+    # is as close as possible to (but not above) `n_target`.
+    n_dims = u.shape[0]
+    n_base = max(int(n_target ** (1 / max(n_dims, 1))), 1)
+    n_bins = np.full(n_dims, n_base)
+    for i in range(n_dims):
+        if np.prod(n_bins) / n_base * (n_base + 1) > n_target:
+            break
+        n_bins[i] += 1
+
+    # Assign each particle to a cell, using equally-populated bins.
+    cell = np.zeros(n_part, dtype=np.int64)
+    for i in range(n_dims):
+        rank = np.empty(n_part, dtype=np.int64)
+        rank[np.argsort(u[i], kind='stable')] = np.arange(n_part)
+        cell = cell * n_bins[i] + rank * n_bins[i] // n_part
+
+    # Merge particles in each cell.
+    _, cell_index = np.unique(cell, return_inverse=True)
+    new_w = np.bincount(cell_index, weights=w)
+    filled = new_w > 0
+    new_w = new_w[filled]
+    new_mat = np.empty((6, new_w.shape[0]))
+    for i in range(6):
+        new_mat[i] = np.bincount(
+            cell_index, weights=w * bunch_mat[i])[filled] / new_w
+    return new_mat, new_w
+
+
+def _resample(bunch_mat, w, n_target):
+    """Resample the particles with a probability proportional to `w`."""
+    w_cumsum = np.cumsum(w)
+    w_tot = w_cumsum[-1]
+    u = (np.arange(n_target) + np.random.rand()) * w_tot / n_target
+    i_part = np.minimum(np.searchsorted(w_cumsum, u), w.shape[0] - 1)
+    # Combine repeated particles.
+    i_part, counts = np.unique(i_part, return_counts=True)
+    return bunch_mat[:, i_part], counts * w_tot / n_target
+
+
+def _correct_moments(bunch_mat, w, mean, cov):
+    """Apply a linear transformation to the particle coordinates so that
+    their average and covariance are `mean` and `cov`."""
+    mean_new, cov_new = get_moments(bunch_mat, w)
+    s = _get_scale(cov)
+    u = (bunch_mat - mean_new[:, np.newaxis]) / s[:, np.newaxis]
+    A = np.dot(
+        _matrix_power(cov / np.outer(s, s), 0.5),
+        _matrix_power(cov_new / np.outer(s, s), -0.5))
+    return mean[:, np.newaxis] + s[:, np.newaxis] * np.dot(A, u)
+
+
+def _matrix_power(a, p):
+    """Power of a symmetric positive semi-definite matrix. For negative
+    powers, the (pseudo)inverse is computed in the subspace of non-zero
+    eigenvalues."""
+    vals, vecs = np.linalg.eigh(a)
+    nonzero = vals > 1e-12 * np.max(vals)
+    vals_p = np.zeros_like(vals)
+    vals_p[nonzero] = vals[nonzero] ** p
+    return np.dot(vecs * vals_p, vecs.T)
+
+
+def _get_scale(cov):
+    """Get the RMS spread of each coordinate, or 1 where it is zero."""
+    s = np.sqrt(np.diag(cov))
+    s[s == 0] = 1.
+    return s